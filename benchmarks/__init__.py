@@ -0,0 +1,13 @@
+"""
+Benchmarks of the jetset hot paths, run with airspeed velocity (asv), that
+tracks them across the commits::
+
+    asv run                      # benchmarks the last commit
+    asv continuous master HEAD   # compares two commits
+    asv publish; asv preview     # browses the history
+
+The `time_` benchmarks report the wall time, the `peakmem_` ones the peak
+resident memory of the process. The work places are in no-work-directory
+mode (see :class:`jetset.output.WorkPlace`), only the temporal evolution
+writes its files, to a temporary directory.
+"""
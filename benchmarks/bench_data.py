@@ -0,0 +1,25 @@
+from __future__ import absolute_import, division, print_function
+
+from jetset.data_loader import Data, ObsData
+from jetset.test_data_helper import test_SEDs
+
+
+class SEDData(object):
+    """
+    loading and grouping of the test SEDs
+    """
+    params = list(range(len(test_SEDs)))
+    param_names = ['test_SED']
+
+    def setup(self, test_SED):
+        self.data = Data.from_file(test_SEDs[test_SED])
+
+    def time_load(self, test_SED):
+        ObsData(data_table=Data.from_file(test_SEDs[test_SED]))
+
+    def peakmem_load(self, test_SED):
+        ObsData(data_table=Data.from_file(test_SEDs[test_SED]))
+
+    def time_group_data(self, test_SED):
+        # group_data changes the data, hence each run groups a new ObsData
+        ObsData(data_table=self.data).group_data(bin_width=0.2)
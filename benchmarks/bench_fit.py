@@ -0,0 +1,100 @@
+from __future__ import absolute_import, division, print_function
+
+import pickle
+
+from jetset.data_loader import Data, ObsData
+from jetset.test_data_helper import test_SEDs
+from jetset.sed_shaper import SEDShape
+from jetset.obs_constrain import ObsConstrain
+from jetset.model_manager import FitModel
+from jetset.minimizer import fit_SED
+from jetset.mcmc import McmcSampler
+from jetset.output import WorkPlace
+
+WorkPlace.no_work_dir = True
+
+
+def get_sed_data():
+    data = Data.from_file(test_SEDs[2])
+    sed_data = ObsData(data_table=data)
+    sed_data.group_data(bin_width=0.2)
+    sed_data.add_systematics(0.1, [10. ** 6, 10. ** 29])
+    return sed_data
+
+
+def get_prefit_jet(sed_data):
+    # SSC model constrained from the SED shape, as in jetset/tests/test_functions.py
+    my_shape = SEDShape(sed_data)
+    my_shape.eval_indices(silent=True)
+    my_shape.sync_fit(check_host_gal_template=False, Ep_start=None, minimizer='lsb', silent=True, fit_range=[10, 21])
+    my_shape.IC_fit(fit_range=[23, 29], minimizer='lsb', silent=True)
+
+    sed_obspar = ObsConstrain(beaming=25,
+                              B_range=[0.001, 0.1],
+                              distr_e='lppl',
+                              t_var_sec=3 * 86400,
+                              nu_cut_IR=1E11,
+                              SEDShape=my_shape)
+
+    prefit_jet = sed_obspar.constrain_SSC_model(electron_distribution_log_values=False, silent=True)
+    prefit_jet.set_gamma_grid_size(200)
+    return prefit_jet
+
+
+def get_fit_model(prefit_jet_state):
+    fit_model = FitModel(jet=pickle.loads(prefit_jet_state), name='SSC-best-fit')
+    fit_model.freeze('z_cosm')
+    fit_model.freeze('R_H')
+    fit_model.parameters.beam_obj.fit_range = [5, 50]
+    fit_model.parameters.R.fit_range = [10 ** 15.5, 10 ** 17.5]
+    fit_model.parameters.gmax.fit_range = [1E4, 1E8]
+    return fit_model
+
+
+class FitSED(object):
+    """
+    fit_SED of the SSC model, starting from the constrained model
+    """
+    params = ['lsb', 'minuit']
+    param_names = ['minimizer']
+    # each run starts from the constrained model
+    number = 1
+    repeat = 3
+    timeout = 600
+
+    def setup_cache(self):
+        return pickle.dumps(get_prefit_jet(get_sed_data()))
+
+    def setup(self, prefit_jet_state, minimizer):
+        self.sed_data = get_sed_data()
+        self.fit_model = get_fit_model(prefit_jet_state)
+
+    def time_fit_SED(self, prefit_jet_state, minimizer):
+        fit_SED(self.fit_model, self.sed_data, 10.0 ** 11, 10 ** 29.0, fitname='SSC-best-fit', minimizer=minimizer, silent=True)
+
+    def peakmem_fit_SED(self, prefit_jet_state, minimizer):
+        fit_SED(self.fit_model, self.sed_data, 10.0 ** 11, 10 ** 29.0, fitname='SSC-best-fit', minimizer=minimizer, silent=True)
+
+
+class Sampler(object):
+    """
+    McmcSampler.run_sampler, a few steps starting from the best fit
+    """
+    number = 1
+    repeat = 3
+    timeout = 600
+
+    def setup_cache(self):
+        sed_data = get_sed_data()
+        fit_model = get_fit_model(pickle.dumps(get_prefit_jet(sed_data)))
+        model_minimizer, best_fit = fit_SED(fit_model, sed_data, 10.0 ** 11, 10 ** 29.0, fitname='SSC-best-fit', minimizer='lsb', silent=True)
+        return pickle.dumps(model_minimizer)
+
+    def setup(self, model_minimizer_state):
+        self.mcmc = McmcSampler(pickle.loads(model_minimizer_state))
+
+    def time_run_sampler(self, model_minimizer_state):
+        self.mcmc.run_sampler(nwalkers=20, steps=5, burnin=0, threads=1)
+
+    def peakmem_run_sampler(self, model_minimizer_state):
+        self.mcmc.run_sampler(nwalkers=20, steps=5, burnin=0, threads=1)
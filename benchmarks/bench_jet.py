@@ -0,0 +1,88 @@
+from __future__ import absolute_import, division, print_function
+
+import tempfile
+import shutil
+
+from jetset.jet_model import Jet, TempEvol
+from jetset.jetkernel_models_dic import available_N_distr
+from jetkernel import jetkernel as BlazarSED
+from jetset.output import WorkPlace
+
+WorkPlace.no_work_dir = True
+
+#stages evaluated by each spectral component, see jetkernel_src/src/stages.c
+component_stages = {'Sync': BlazarSED.STAGE_SYNC,
+                    'SSC': BlazarSED.STAGE_SSC,
+                    'EC_Disk': BlazarSED.STAGE_EXT | BlazarSED.STAGE_EC,
+                    'EC_BLR': BlazarSED.STAGE_EXT | BlazarSED.STAGE_EC,
+                    'EC_DT': BlazarSED.STAGE_EXT | BlazarSED.STAGE_EC,
+                    'EC_CMB': BlazarSED.STAGE_EXT | BlazarSED.STAGE_EC}
+
+
+def eval_stages(jet, stages=BlazarSED.STAGE_ALL):
+    # the unchanged stages are not evaluated again by Jet.eval, hence the
+    # stages to time are marked
+    jet._blob.dirty_stages = stages
+    jet.eval()
+
+
+class JetEval(object):
+    """
+    Jet.eval for each electron distribution
+    """
+    params = list(available_N_distr)
+    param_names = ['electron_distribution']
+
+    def setup(self, electron_distribution):
+        self.jet = Jet(electron_distribution=electron_distribution)
+        self.jet.eval()
+
+    def time_eval(self, electron_distribution):
+        eval_stages(self.jet)
+
+    def peakmem_eval(self, electron_distribution):
+        eval_stages(self.jet)
+
+
+class SpectralComponents(object):
+    """
+    Jet.eval of a single spectral component, with the others up to date
+    """
+    params = list(component_stages)
+    param_names = ['component']
+
+    def setup(self, component):
+        self.jet = Jet(electron_distribution='lppl')
+        if component == 'Sync':
+            self.jet.spectral_components.SSC.state = 'off'
+        elif component != 'SSC':
+            self.jet.add_EC_component([component])
+        self.jet.eval()
+
+    def time_eval(self, component):
+        eval_stages(self.jet, component_stages[component])
+
+    def peakmem_eval(self, component):
+        eval_stages(self.jet, component_stages[component])
+
+
+class TempEvolution(object):
+    """
+    Run_temp_evolution, with a shorter time grid than the default one
+    """
+    timeout = 300
+
+    def setup(self):
+        self.out_dir = tempfile.mkdtemp()
+        self.jet = Jet(electron_distribution='pl')
+        self.temp_ev = TempEvol(out_dir=self.out_dir)
+        self.temp_ev.build_TempEv(T_SIZE=500, NUM_SET=5)
+
+    def teardown(self):
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def time_run(self):
+        self.temp_ev.run(self.jet)
+
+    def peakmem_run(self):
+        self.temp_ev.run(self.jet)
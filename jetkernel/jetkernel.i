@@ -2,8 +2,311 @@
  %module jetkernel
  %{
  /* Put header files here or function declarations like below */
+ #include <setjmp.h>
  #include "../jetkernel_src/include/Blazar_SED.h"
+
+ static void raise_kernel_error(struct spettro *pt){
+     if (pt->error_code == KERNEL_INDEX_ERROR) {
+         PyErr_SetString(PyExc_IndexError, pt->error_msg);
+     }
+     else if (pt->error_code == KERNEL_MEMORY_ERROR) {
+         PyErr_SetString(PyExc_MemoryError, pt->error_msg);
+     }
+     else {
+         PyErr_SetString(PyExc_RuntimeError, pt->error_msg);
+     }
+ }
  %}
 
+ /* Kernel errors are raised as Python exceptions (see errors.c): the wrapper
+    sets the jump buffer of the blob, kernel_error jumps back to it, and the
+    error stored in the blob is raised as IndexError, MemoryError or RuntimeError */
+ %define KERNEL_ERRORS(function, blob)
+ %exception function {
+     jmp_buf kernel_jmp_env;
+     void * kernel_prev_jmp_env;
+     if (blob == NULL) {
+         PyErr_SetString(PyExc_ValueError, "blob is NULL");
+         SWIG_fail;
+     }
+     kernel_prev_jmp_env = kernel_error_enter(blob, &kernel_jmp_env);
+     if (setjmp(kernel_jmp_env) == 0) {
+         $action
+     }
+     kernel_error_exit(blob, kernel_prev_jmp_env);
+     if (blob->error_code != 0) {
+         raise_kernel_error(blob);
+         SWIG_fail;
+     }
+ }
+ %enddef
+
+ /* as KERNEL_ERRORS, releasing the GIL, so that different blobs can be
+    evaluated concurrently from Python threads. The same blob must not be
+    used by two threads at the same time */
+ %define KERNEL_ERRORS_NOGIL(function, blob)
+ %exception function {
+     jmp_buf kernel_jmp_env;
+     void * kernel_prev_jmp_env;
+     if (blob == NULL) {
+         PyErr_SetString(PyExc_ValueError, "blob is NULL");
+         SWIG_fail;
+     }
+     Py_BEGIN_ALLOW_THREADS
+     kernel_prev_jmp_env = kernel_error_enter(blob, &kernel_jmp_env);
+     if (setjmp(kernel_jmp_env) == 0) {
+         $action
+     }
+     kernel_error_exit(blob, kernel_prev_jmp_env);
+     Py_END_ALLOW_THREADS
+     if (blob->error_code != 0) {
+         raise_kernel_error(blob);
+         SWIG_fail;
+     }
+ }
+ %enddef
+
+ KERNEL_ERRORS_NOGIL(Run_SED, arg1);
+ KERNEL_ERRORS_NOGIL(Init, arg1);
+ KERNEL_ERRORS_NOGIL(InitNe, arg1);
+ KERNEL_ERRORS_NOGIL(MakeNe, arg1);
+ KERNEL_ERRORS_NOGIL(Run_temp_evolution, arg1);
+ KERNEL_ERRORS_NOGIL(spectra_External_Fields, arg2);
+ KERNEL_ERRORS(EnergeticOutput, arg1);
+ KERNEL_ERRORS(EvalU_e, arg1);
+ KERNEL_ERRORS(Power_Sync_Electron, arg1);
+ KERNEL_ERRORS(Lum_Sync_at_nu, arg1);
+ KERNEL_ERRORS(SetBeaming, arg1);
+ KERNEL_ERRORS(build_Ne_custom, arg1);
+ KERNEL_ERRORS(get_spectral_array, arg2);
+ KERNEL_ERRORS(get_elec_array, arg2);
+ KERNEL_ERRORS(set_elec_custom_array, arg2);
+
+ /* The Bessel and KN tables are shared by all the blobs */
+ %immutable spettro::bessel_table;
+ %immutable spettro::KN_A_table;
+
+ /* The snapshot of the last run, used to find the stages to recompute */
+ %immutable spettro::stage_snapshot;
+
+ %ignore kernel_error;
+ %ignore kernel_error_enter;
+ %ignore kernel_error_exit;
+
+ /* Internal, see _eval_batch, _get_blob_state, _blob_from_state and the %extend below */
+ %ignore eval_batch;
+ %ignore copy_photons;
+ %ignore photons_state_size;
+ %ignore write_photons_state;
+ %ignore read_photons_state;
+ %ignore BlobStateSize;
+ %ignore GetBlobState;
+ %ignore BlobFromState;
+ %ignore get_par_field;
+
+ /* Deep copy of the blob (see blob_state.c), owned by Python */
+ %newobject CloneBlob;
+ %exception CloneBlob {
+     $action
+     if (result == NULL) {
+         PyErr_NoMemory();
+         SWIG_fail;
+     }
+ }
+
  /* Parse the header file to generate wrappers */
- %include "../jetkernel_src/include/Blazar_SED.h"
\ No newline at end of file
+ %include "../jetkernel_src/include/Blazar_SED.h"
+
+ /* The spectral and electron buffers are freed with the blob. The blob is
+    pickled by its state, with the computed arrays, and deep copied by CloneBlob */
+ %extend spettro {
+     ~spettro() {
+         FreeBlob($self);
+         free($self);
+     }
+ %pythoncode %{
+    def __reduce__(self):
+        return _blob_from_state, (_get_blob_state(self),)
+
+    def __deepcopy__(self, memo):
+        return CloneBlob(self)
+ %}
+ }
+
+ /* Byte state of the blob (see blob_state.c) */
+ %newobject _blob_from_state;
+ %exception _blob_from_state {
+     $action
+     if (result == NULL) {
+         SWIG_fail;
+     }
+ }
+
+ %inline %{
+ PyObject * _get_blob_state(struct spettro * pt){
+     PyObject * state;
+
+     if (pt == NULL) {
+         PyErr_SetString(PyExc_ValueError, "blob is NULL");
+         return NULL;
+     }
+     state = PyBytes_FromStringAndSize(NULL, BlobStateSize(pt));
+     if (state != NULL) {
+         GetBlobState(pt, PyBytes_AS_STRING(state));
+     }
+     return state;
+ }
+
+ struct spettro * _blob_from_state(PyObject * state){
+     struct spettro * pt;
+     Py_buffer view;
+
+     if (PyObject_GetBuffer(state, &view, PyBUF_SIMPLE) != 0) {
+         return NULL;
+     }
+     pt = BlobFromState((char *) view.buf, (unsigned long) view.len);
+     PyBuffer_Release(&view);
+     if (pt == NULL) {
+         PyErr_SetString(PyExc_ValueError, "invalid blob state, or blob allocation failed");
+     }
+     return pt;
+ }
+ %}
+
+ /* Read-only buffers sharing the memory of the struct spettro arrays */
+ %inline %{
+ PyObject * _array_buffer(double * arr, unsigned long size, unsigned long max_size){
+     if (arr == NULL) {
+         PyErr_SetString(PyExc_ValueError, "array not allocated");
+         return NULL;
+     }
+     if (size > max_size) {
+         PyErr_SetString(PyExc_IndexError, "exceeded array size");
+         return NULL;
+     }
+     return PyMemoryView_FromMemory((char *) arr, size * sizeof(double), PyBUF_READ);
+ }
+ %}
+
+ /* Batch evaluation (see batch.c) on the buffers of numpy arrays, the buffers
+    have to be contiguous and of the expected size */
+ %inline %{
+ PyObject * _eval_batch(struct spettro * pt, PyObject * par_index, PyObject * par_vals, PyObject * dist,
+                        PyObject * nu_grid, PyObject * nuFnu_sum){
+     PyObject * objs[5] = {par_index, par_vals, dist, nu_grid, nuFnu_sum};
+     Py_buffer views[5];
+     int n_views;
+     unsigned long n_pars, n_samples;
+     jmp_buf kernel_jmp_env;
+     void * kernel_prev_jmp_env;
+
+     if (pt == NULL) {
+         PyErr_SetString(PyExc_ValueError, "blob is NULL");
+         return NULL;
+     }
+     //nu_grid and nuFnu_sum are the outputs
+     for (n_views = 0; n_views < 5; n_views++) {
+         if (PyObject_GetBuffer(objs[n_views], &views[n_views], PyBUF_C_CONTIGUOUS | (n_views >= 3 ? PyBUF_WRITABLE : 0)) != 0) {
+             break;
+         }
+     }
+     if (n_views == 5) {
+         n_pars = views[0].len / sizeof(int);
+         n_samples = views[2].len / sizeof(double);
+         if (views[0].itemsize != sizeof(int) || views[1].itemsize != sizeof(double)
+             || views[2].itemsize != sizeof(double) || views[3].itemsize != sizeof(double)
+             || views[4].itemsize != sizeof(double)
+             || (unsigned long) views[1].len != n_samples * n_pars * sizeof(double)
+             || (unsigned long) views[3].len != pt->nu_grid_size * sizeof(double)
+             || (unsigned long) views[4].len != n_samples * pt->nu_grid_size * sizeof(double)) {
+             PyErr_SetString(PyExc_ValueError, "wrong buffer size");
+         }
+         else {
+             Py_BEGIN_ALLOW_THREADS
+             kernel_prev_jmp_env = kernel_error_enter(pt, &kernel_jmp_env);
+             if (setjmp(kernel_jmp_env) == 0) {
+                 eval_batch(pt, n_samples, n_pars, (int *) views[0].buf, (double *) views[1].buf,
+                            (double *) views[2].buf, (double *) views[3].buf, (double *) views[4].buf);
+             }
+             kernel_error_exit(pt, kernel_prev_jmp_env);
+             Py_END_ALLOW_THREADS
+             if (pt->error_code != 0) {
+                 raise_kernel_error(pt);
+             }
+         }
+     }
+     while (n_views > 0) {
+         PyBuffer_Release(&views[--n_views]);
+     }
+     if (PyErr_Occurred()) {
+         return NULL;
+     }
+     Py_RETURN_NONE;
+ }
+ %}
+
+ %pythoncode %{
+import numpy as _np
+
+
+class _ArrayOwner(object):
+    # base of the array views, keeps the owner of the C array alive
+    def __init__(self, buffer, owner):
+        self.__array_interface__ = _np.frombuffer(buffer, dtype=_np.float64).__array_interface__
+        self._buffer = buffer
+        self._owner = owner
+
+
+def get_array_view(arr, size, max_size, owner=None):
+    """
+    returns a read-only numpy array of `size` elements sharing the memory of the
+    C array `arr`, no data are copied. The view keeps a reference to `owner`,
+    e.g. the blob of the array, and it is valid as long as the underlying C
+    array is neither freed nor reallocated.
+    """
+    return _np.asarray(_ArrayOwner(_array_buffer(arr, size, max_size), owner))
+
+
+def get_spectral_array_view(arr, pt, size=None):
+    """
+    read-only view of a `struct spettro` spectral array, by default
+    `nu_grid_size` elements long, and at most as long as the allocated
+    size of its group of arrays (see `build_photons`).
+    The group is reallocated when its grid size changes, at the next
+    `Init` or `Run_SED`, and the view is not valid anymore: copy it
+    (`np.array`) to keep it across evaluations.
+    """
+    if size is None:
+        size = pt.nu_grid_size
+    return get_array_view(arr, size, get_photons_alloc_size(pt, arr), pt)
+
+
+def get_elec_array_view(arr, pt, size=None):
+    """
+    read-only view of a `struct spettro` electron array, by default
+    `gamma_grid_size` elements long, and at most as long as the allocated
+    size of the array (see `build_Ne` and `build_Ne_custom`).
+    As for the spectral views, the view is not valid anymore when the
+    array is reallocated, i.e. when the electron distribution is built again.
+    """
+    if size is None:
+        size = pt.gamma_grid_size
+    return get_array_view(arr, size, get_elec_alloc_size(pt, arr), pt)
+ 
+
+def eval_batch(pt, par_index, par_vals, dist):
+    """
+    evaluates the model for each row of `par_vals`, setting the parameters
+    with index `par_index` (see `get_par_index`), and using the luminosity
+    distances `dist` (negative to evaluate it from `z_cosm`).
+    Returns the frequency grid and the (n_samples, `nu_grid_size`) array
+    of the summed spectra.
+    """
+    par_index = _np.ascontiguousarray(par_index, dtype=_np.intc)
+    dist = _np.ascontiguousarray(dist, dtype=_np.float64)
+    par_vals = _np.ascontiguousarray(par_vals, dtype=_np.float64).reshape(dist.size, par_index.size)
+    nu_grid = _np.zeros(pt.nu_grid_size)
+    nuFnu_sum = _np.zeros((dist.size, pt.nu_grid_size))
+    _eval_batch(pt, par_index, par_vals, dist, nu_grid, nuFnu_sum)
+    return nu_grid, nuFnu_sum
+ %}
@@ -49,11 +49,33 @@
 #define three_by_four 0.75 /* 4/3 */
 #define fake_nu_err 1.0
 #define fake_flux_err 1.0
-#define static_spec_arr_size 1000 /* num elementi dei vettori */
 #define static_bess_table_size 1000 /* num elementi tabelle di Bessel */
 #define Bessel_MAX 500.0
+#define static_KN_table_size 4097 /* num elementi tabella kernel KN */
 #define ELEMENTI_GAMMA_Contr_Comp 100
 #define static_file_name_max_legth 512
+#define static_error_msg_max_length 512
+#define KERNEL_ERROR 1 /* error codes, see errors.c */
+#define KERNEL_INDEX_ERROR 2
+#define KERNEL_MEMORY_ERROR 3
+#define STAGE_ELEC 1 /* evaluation stages, see stages.c */
+#define STAGE_SYNC 2
+#define STAGE_SSC 4
+#define STAGE_EXT 8
+#define STAGE_EC 16
+#define STAGE_ALL 31
+#define PROFILE_INIT_NE 0 /* stages of the evaluation profile, see profile.c */
+#define PROFILE_BESSEL 1
+#define PROFILE_SYNC 2
+#define PROFILE_SSC 3
+#define PROFILE_EXT_FIELDS 4
+#define PROFILE_EC_DISK 5
+#define PROFILE_EC_BLR 6
+#define PROFILE_EC_DT 7
+#define PROFILE_EC_STAR 8
+#define PROFILE_EC_CMB 9
+#define PROFILE_SUM 10
+#define PROFILE_N_STAGES 11
 #define LIM_LOSS_KN 1.0
 #define min(a,b) (a<b) ? a:b;
 #define max(a,b) (a>b) ? a:b;
@@ -69,9 +91,50 @@
 /************ ENV VARIBLE *************************/
 
 /********************************     STRUTTURA BASE    ************************************/
+//--- Tabelle Bessel
+// computed once per process and shared read-only by all the blobs
+struct bessel_table {
+    double F_Sync_x[static_bess_table_size];
+    double F_ave_Sync_x[static_bess_table_size];
+    double F_Sync_y[static_bess_table_size];
+    double F_ave_Sync_y[static_bess_table_size];
+    double log_F_Sync_x[static_bess_table_size];
+    double log_F_Sync_y[static_bess_table_size];
+    double log_F_ave_Sync_x[static_bess_table_size];
+    double log_F_ave_Sync_y[static_bess_table_size];
+    double x_Bessel_min, x_Bessel_max;
+    double x_ave_Bessel_min, x_ave_Bessel_max;
+    double log_x_Bessel_min, log_x_Bessel_max;
+    double log_x_ave_Bessel_min, log_x_ave_Bessel_max;
+};
+
+//--- profile of the last evaluation, see profile.c
+struct eval_profile {
+    double time[PROFILE_N_STAGES];
+    unsigned long calls[PROFILE_N_STAGES];
+    unsigned long n_Sync_integrand;
+    unsigned long n_IC_integrand;
+    unsigned long n_IC_rate;
+    unsigned long n_interp;
+};
+
 struct spettro {
     int verbose;
     int BESSEL_TABLE_DONE;
+    int KN_TABLE_DONE;
+
+    //--- kernel errors, see errors.c
+    int error_code;
+    char error_msg[static_error_msg_max_length];
+    void * error_jmp_env;
+
+    //--- stages to recompute, see stages.c
+    int dirty_stages;
+    struct spettro * stage_snapshot;
+
+    //--- timers (if do_profile) and counters of the last evaluation, see profile.c
+    int do_profile;
+    struct eval_profile profile;
 
     int CICCIO;
 
@@ -88,10 +151,18 @@ struct spettro {
     int SSC, EC, TOT;
     int WRITE_TO_FILE;
 
+    //do_IC: 0 off, 1 exact KN kernel, 2 tabulated KN kernel
     int do_Sync, do_SSC,do_IC,Sync_kernel;
+    //number of threads for the frequency loops (see parallel.c)
+    int n_threads;
     //int attesa_Sync_cooling, attesa_compton_cooling;
 
+    //size of the largest spectral buffer, and allocated size of each
+    //group of buffers (see build_photons)
     unsigned long spec_array_size;
+    unsigned long nu_grid_size_alloc;
+    unsigned long nu_seed_size_alloc;
+    unsigned long nu_IC_size_alloc;
 
     int disk;
     double emiss_lim;
@@ -117,20 +188,20 @@ struct spettro {
     double nu_start_grid;
     double nu_stop_grid;
 
-    double nu_grid[static_spec_arr_size];
-    double nuFnu_sum_grid[static_spec_arr_size];
+    double * nu_grid;
+    double * nuFnu_sum_grid;
 
-    double nuFnu_Sync_grid[static_spec_arr_size];
-    double nuFnu_SSC_grid[static_spec_arr_size];
-    double nuFnu_Disk_grid[static_spec_arr_size];
-    double nuFnu_DT_grid[static_spec_arr_size];
-    double nuFnu_Star_grid[static_spec_arr_size];
-    double nuFnu_EC_CMB_grid[static_spec_arr_size];
+    double * nuFnu_Sync_grid;
+    double * nuFnu_SSC_grid;
+    double * nuFnu_Disk_grid;
+    double * nuFnu_DT_grid;
+    double * nuFnu_Star_grid;
+    double * nuFnu_EC_CMB_grid;
     //double nuFnu_EC_CMB_stat_grid[static_spec_arr_size];
-    double nuFnu_EC_BLR_grid[static_spec_arr_size];
-    double nuFnu_EC_DT_grid[static_spec_arr_size];
-    double nuFnu_EC_Disk_grid[static_spec_arr_size];
-    double nuFnu_EC_Star_grid[static_spec_arr_size];
+    double * nuFnu_EC_BLR_grid;
+    double * nuFnu_EC_DT_grid;
+    double * nuFnu_EC_Disk_grid;
+    double * nuFnu_EC_Star_grid;
 
     //-----------Sync --------------//
     //--- CONST
@@ -159,28 +230,16 @@ struct spettro {
 	double nuFnu_peak_Sync_obs;
 
 	//--- FREQ/FLUX array
-    double j_Sync[static_spec_arr_size];
-    double alfa_Sync[static_spec_arr_size];
-    double I_nu_Sync[static_spec_arr_size];
-    double nu_Sync[static_spec_arr_size];
-    double nu_Sync_obs[static_spec_arr_size];
-    double n_Sync[static_spec_arr_size];
-    double nuF_nu_Sync_obs[static_spec_arr_size];
-
-    //--- Tabelle Bessel
-    double F_Sync_x[static_bess_table_size];
-    double F_ave_Sync_x[static_bess_table_size];
-    double F_Sync_y[static_bess_table_size];
-    double F_ave_Sync_y[static_bess_table_size];
-    double log_F_Sync_x[static_bess_table_size];
-    double log_F_Sync_y[static_bess_table_size];
-    double log_F_ave_Sync_x[static_bess_table_size];
-    double log_F_ave_Sync_y[static_bess_table_size];
-    double t_Bessel_min, t_Bessel_max;
-    double x_Bessel_min, x_Bessel_max;
-    double x_ave_Bessel_min, x_ave_Bessel_max;
-    double log_x_Bessel_min, log_x_Bessel_max;
-    double log_x_ave_Bessel_min, log_x_ave_Bessel_max;
+    double * j_Sync;
+    double * alfa_Sync;
+    double * I_nu_Sync;
+    double * nu_Sync;
+    double * nu_Sync_obs;
+    double * n_Sync;
+    double * nuF_nu_Sync_obs;
+
+    //--- Tabelle Bessel, shared by all the blobs (see tabella_Bessel)
+    struct bessel_table * bessel_table;
 
     //--------------------------------//
 
@@ -194,9 +253,9 @@ struct spettro {
     unsigned long NU_INT_STOP_PP;
 
     //--- FREQ/FLUX array
-    double j_pp[static_spec_arr_size];
-    double nu_pp[static_spec_arr_size];
-    double nuF_nu_pp_obs[static_spec_arr_size];
+    double * j_pp;
+    double * nu_pp;
+    double * nuF_nu_pp_obs;
 
     //
     int set_pp_racc_gamma, set_pp_racc_elec;
@@ -218,6 +277,8 @@ struct spettro {
     int ord_comp;
     int adaptive_e_binning;
     double COST_IC_K1,COST_IC_COOLING ;
+    //--- tabulated KN kernel, used for do_IC=2, shared by all the blobs (see tabella_KN)
+    double * KN_A_table;
 
     //--- FREQ BOUNDARIES
 
@@ -238,12 +299,14 @@ struct spettro {
     double * n_seed;
 
     //--- FREQ/FLUX array
-    double q_comp[static_spec_arr_size];
-    double j_comp[static_spec_arr_size];
-    double j_EC[static_spec_arr_size];
-    double nu_SSC[static_spec_arr_size];
-    double nu_SSC_obs[static_spec_arr_size];
-    double nuF_nu_SSC_obs[static_spec_arr_size];
+    double * q_comp;
+    double * j_comp;
+    //SSC rates of the last run, reused when the SSC stage is clean
+    double * q_comp_SSC;
+    double * j_EC;
+    double * nu_SSC;
+    double * nu_SSC_obs;
+    double * nuF_nu_SSC_obs;
 
     //--- FREQ/FLUX scalars
     double nu_peak_SSC_blob;
@@ -299,18 +362,18 @@ struct spettro {
     unsigned long NU_INT_MAX_Star;
 	unsigned long NU_INT_STOP_EC_Star;
 	//-FREQ/FLUX arrays
-	double I_nu_Star[static_spec_arr_size];
-	double J_nu_Star_disk_RF[static_spec_arr_size];
-	double I_nu_Star_disk_RF[static_spec_arr_size];
-	double nu_Star[static_spec_arr_size];
-	double nu_Star_obs[static_spec_arr_size];
-	double nu_Star_disk_RF[static_spec_arr_size];
-	double nuF_nu_Star_obs[static_spec_arr_size];
-	double nu_EC_Star[static_spec_arr_size];
-	double nu_EC_Star_obs[static_spec_arr_size];
-	double nuF_nu_EC_Star_obs[static_spec_arr_size];
-	double n_Star[static_spec_arr_size];
-    double n_Star_DRF[static_spec_arr_size];
+	double * I_nu_Star;
+	double * J_nu_Star_disk_RF;
+	double * I_nu_Star_disk_RF;
+	double * nu_Star;
+	double * nu_Star_obs;
+	double * nu_Star_disk_RF;
+	double * nuF_nu_Star_obs;
+	double * nu_EC_Star;
+	double * nu_EC_Star_obs;
+	double * nuF_nu_EC_Star_obs;
+	double * n_Star;
+    double * n_Star_DRF;
 
     //--- CMB
 	//-PARAMTERS
@@ -326,16 +389,16 @@ struct spettro {
     double nu_stop_CMB_DRF;
     unsigned long NU_INT_MAX_CMB,NU_INT_STOP_EC_CMB;
     //-FREQ/FLUX arrays
-	double I_nu_CMB[static_spec_arr_size];
-	double I_nu_CMB_disk_RF[static_spec_arr_size];
-	double nu_CMB[static_spec_arr_size];
-	double nu_CMB_disk_RF[static_spec_arr_size];
+	double * I_nu_CMB;
+	double * I_nu_CMB_disk_RF;
+	double * nu_CMB;
+	double * nu_CMB_disk_RF;
 
-	double nu_EC_CMB[static_spec_arr_size];
-	double nu_EC_CMB_obs[static_spec_arr_size];
-	double nuF_nu_EC_CMB_obs[static_spec_arr_size];
-    double n_CMB[static_spec_arr_size];
-    double n_CMB_DRF[static_spec_arr_size];
+	double * nu_EC_CMB;
+	double * nu_EC_CMB_obs;
+	double * nuF_nu_EC_CMB_obs;
+    double * n_CMB;
+    double * n_CMB_DRF;
 
     //TODO REMOVE UNSUED FROM THE CODE
     //--- CMB stat
@@ -392,19 +455,19 @@ struct spettro {
     unsigned long NU_INT_STOP_EC_Disk;
 
     //-FREQ/FLUX arrays
-    double L_nu_Disk_disk_RF[static_spec_arr_size];
-    double I_nu_Disk[static_spec_arr_size];
+    double * L_nu_Disk_disk_RF;
+    double * I_nu_Disk;
     //double J_nu_Disk_disk_RF[static_spec_arr_size];
-    double I_nu_Disk_disk_RF[static_spec_arr_size];
-    double nu_Disk[static_spec_arr_size];
-    double nu_Disk_obs[static_spec_arr_size];
-    double nu_Disk_disk_RF[static_spec_arr_size];
-    double nuF_nu_Disk_obs[static_spec_arr_size];
-    double nu_EC_Disk[static_spec_arr_size];
-    double nu_EC_Disk_obs[static_spec_arr_size];
-    double nuF_nu_EC_Disk_obs[static_spec_arr_size];
-    double n_Disk[static_spec_arr_size];
-    double n_Disk_DRF[static_spec_arr_size];
+    double * I_nu_Disk_disk_RF;
+    double * nu_Disk;
+    double * nu_Disk_obs;
+    double * nu_Disk_disk_RF;
+    double * nuF_nu_Disk_obs;
+    double * nu_EC_Disk;
+    double * nu_EC_Disk_obs;
+    double * nuF_nu_EC_Disk_obs;
+    double * n_Disk;
+    double * n_Disk_DRF;
 
     //--- FREQ/FLUX scalars
 
@@ -439,16 +502,16 @@ struct spettro {
     unsigned long NU_INT_STOP_EC_BLR;
     
     //-FREQ/FLUX arrays
-    double I_nu_BLR[static_spec_arr_size];
-    double Lnu_BLR_disk_RF[static_spec_arr_size];
-    double nu_BLR[static_spec_arr_size];
-    double I_nu_BLR_disk_RF[static_spec_arr_size];
-    double nuF_nu_EC_BLR_obs[static_spec_arr_size];
-    double nu_EC_BLR[static_spec_arr_size];
-    double nu_EC_BLR_obs[static_spec_arr_size];
-    double nu_BLR_disk_RF[static_spec_arr_size];
-    double n_BLR[static_spec_arr_size];
-    double n_BLR_DRF[static_spec_arr_size];
+    double * I_nu_BLR;
+    double * Lnu_BLR_disk_RF;
+    double * nu_BLR;
+    double * I_nu_BLR_disk_RF;
+    double * nuF_nu_EC_BLR_obs;
+    double * nu_EC_BLR;
+    double * nu_EC_BLR_obs;
+    double * nu_BLR_disk_RF;
+    double * n_BLR;
+    double * n_BLR_DRF;
 
     //--- DT
     //-PARAMETERS
@@ -479,18 +542,18 @@ struct spettro {
     unsigned long NU_INT_STOP_EC_DT;
 
     //-FREQ/FLUX arrays
-    double I_nu_DT[static_spec_arr_size];
-    double I_nu_DT_disk_RF[static_spec_arr_size];
-    double nu_DT_obs[static_spec_arr_size];
-    double nu_DT[static_spec_arr_size];
-    double nu_DT_disk_RF[static_spec_arr_size];
-    double nuF_nu_EC_DT_obs[static_spec_arr_size];
-    double n_DT[static_spec_arr_size];
-    double n_DT_DRF[static_spec_arr_size];
-    double L_nu_DT_disk_RF[static_spec_arr_size];
-    double nuF_nu_DT_obs[static_spec_arr_size];
-    double nu_EC_DT[static_spec_arr_size];
-    double nu_EC_DT_obs[static_spec_arr_size];
+    double * I_nu_DT;
+    double * I_nu_DT_disk_RF;
+    double * nu_DT_obs;
+    double * nu_DT;
+    double * nu_DT_disk_RF;
+    double * nuF_nu_EC_DT_obs;
+    double * n_DT;
+    double * n_DT_DRF;
+    double * L_nu_DT_disk_RF;
+    double * nuF_nu_DT_obs;
+    double * nu_EC_DT;
+    double * nu_EC_DT_obs;
 
 
     //--- FREQ/FLUX scalars
@@ -521,6 +584,9 @@ struct spettro {
     //----------- INTEGRATION MESH--------------//
     unsigned long nu_seed_size;
     unsigned long nu_IC_size;
+    //tolerance (dex) of the adaptive SSC/EC frequency grids,
+    //0 for uniform grids (see adaptive_grids.c)
+    double IC_adaptive_tol;
 
     //unsigned long mesh_intComp;
     //unsigned long mesh_intComp1;
@@ -543,6 +609,9 @@ struct spettro {
     double *Ne_stat;
     double *Np;
     unsigned long gamma_grid_size;
+    //allocated size of the electron arrays (see build_Ne and build_Ne_custom)
+    unsigned long gamma_grid_size_alloc;
+    unsigned long gamma_custom_size_alloc;
     double * griglia_gamma_Ne_log;
     double * griglia_gamma_Ne_log_IC;
     double * griglia_gamma_Ne_log_stat;
@@ -682,12 +751,19 @@ int solve_sys1(double VX1[],double VX2[],double VX3[],double SX[],double u[],uns
 /********************************     PyInterface    ************************************/
 // PyInterface
 struct spettro MakeBlob();
+void FreeBlob(struct spettro *pt_base);
 void MakeNe(struct spettro *pt_base);
 struct temp_ev MakeTempEv();
 void Init(struct spettro *pt, double luminosity_distance);
 void InitNe(struct spettro *pt);
-//void build_photons(struct spettro *pt_base);
-//void alloc_photons(double ** pt,int size);
+int build_photons(struct spettro *pt_base);
+void free_photons(struct spettro *pt_base);
+void copy_photons(struct spettro *pt_dst, struct spettro *pt_src);
+unsigned long get_photons_alloc_size(struct spettro *pt_base, double * arr);
+unsigned long photons_state_size(struct spettro *pt_base);
+char * write_photons_state(struct spettro *pt_base, char * state);
+char * read_photons_state(struct spettro *pt_base, char * state, int * done);
+int alloc_photons(double ** pt,unsigned long size);
 void set_seed_freq_start(struct spettro *pt_base);
 void Run_SED(struct spettro *pt_base);
 void Run_temp_evolution(struct spettro *pt_spec, struct temp_ev *pt_ev, double luminosity_distance);
@@ -697,6 +773,70 @@ double set_elec_custom_array(double * arr, struct spettro *pt,double val, unsign
 //===================================================================================
 
 
+//===================================================================================
+/********************************     Errors    ************************************/
+void kernel_error(struct spettro *pt, int error_code, const char *fmt, ...);
+void * kernel_error_enter(struct spettro *pt, void * jmp_env);
+void kernel_error_exit(struct spettro *pt, void * prev_jmp_env);
+//===================================================================================
+
+
+//===================================================================================
+/********************************     Stages    ************************************/
+void update_dirty_stages(struct spettro *pt);
+int get_pending_stages(struct spettro *pt);
+void save_stage_snapshot(struct spettro *pt);
+void free_stage_snapshot(struct spettro *pt);
+int get_par_index(char *name);
+double * get_par_field(struct spettro *pt, int par_index);
+//===================================================================================
+
+
+//===================================================================================
+/********************************     Blob state    ************************************/
+struct spettro * CloneBlob(struct spettro *pt_base);
+unsigned long BlobStateSize(struct spettro *pt_base);
+void GetBlobState(struct spettro *pt_base, char * state);
+struct spettro * BlobFromState(char * state, unsigned long state_size);
+//===================================================================================
+
+
+//===================================================================================
+/********************************     Parallel    ************************************/
+int get_n_threads(struct spettro *pt);
+struct spettro * make_work_context(struct spettro *pt);
+void free_work_context(struct spettro *pt_ctx);
+int eval_Sync_grid(struct spettro *pt, double * j_Sync, double * alfa_Sync);
+int eval_rate_compton_grid(struct spettro *pt, double * freq_array, double nu_start, double nu_stop, double * q_comp);
+int eval_rate_compton_points(struct spettro *pt, double * freq_array, unsigned long size, double nu_start, double nu_stop, double * q_comp);
+//===================================================================================
+
+
+//===================================================================================
+/********************************     Adaptive IC grids    ************************************/
+unsigned long build_adaptive_IC_grid(struct spettro *pt, double nu_start, double nu_stop, double * nu_grid, double * q_comp);
+//===================================================================================
+
+
+//===================================================================================
+/********************************     Evaluation profile    ************************************/
+void reset_profile(struct spettro *pt);
+double profile_start(struct spettro *pt);
+void profile_stop(struct spettro *pt, int stage, double t_start);
+void add_profile_counters(struct spettro *pt, struct spettro *pt_ctx);
+double get_profile_time(struct spettro *pt, int stage);
+unsigned long get_profile_calls(struct spettro *pt, int stage);
+const char * get_profile_stage_name(int stage);
+//===================================================================================
+
+
+//===================================================================================
+/********************************     Batch    ************************************/
+void eval_batch(struct spettro *pt, unsigned long n_samples, unsigned long n_pars, int * par_index,
+                double * par_vals, double * dist, double * nu_grid, double * nuFnu_sum);
+//===================================================================================
+
+
 
 
 
@@ -716,6 +856,7 @@ void CoolingRates(struct spettro * pt, struct temp_ev *pt_ev);
 /************************************ FUNZIONI Distr N *****************************/
 //void Genera_griglia_gamma_e_log(struct spettro *pt, double *griglia);
 void alloc_N_distr(double ** pt,int size);
+unsigned long get_elec_alloc_size(struct spettro *pt_base, double * arr);
 
 void Fill_N(struct spettro *pt, double *griglia_gamma_N_log, double *N);
 void build_Ne_custom(struct spettro *pt,  unsigned int size);
@@ -890,6 +1031,8 @@ double integrale_pp_electrons_rate(double (*pf_pp_gamma_kernel) (double gamma_p,
 /************************************ PHOTON GRID FUNCTIONS *****************************/
 void build_log_grid(double nu_start, double nu_stop, unsigned long SIZE, double * nu_grid);
 unsigned long x_to_grid_index(double * nu_grid, double nu, unsigned long SIZE);
+unsigned long x_to_grid_index_guess(double * nu_grid, double nu, double guess, unsigned long SIZE);
+unsigned long x_to_log_grid_index(double * log_nu_grid, double log_nu, double log_nu_start, double log_nu_step, unsigned long SIZE);
 //===========================================================================================
 
 
@@ -900,6 +1043,10 @@ unsigned long x_to_grid_index(double * nu_grid, double nu, unsigned long SIZE);
 /************************************ FUNCTIONS  IC  *****************************/
 double f_compton_K1(struct spettro *, double Gamma);
 void set_N_distr_for_Compton(struct spettro *, double nu_in, double nu_out, int stat_frame);
+unsigned long IC_gamma_start_index(struct spettro *pt);
+void tabella_KN(struct spettro *pt);
+double KN_bracket_tab(struct spettro *pt, double k);
+double integrale_IC_gamma_tab(struct spettro *pt, unsigned long i_start);
 double rate_compton_GR(struct spettro *);
 double integrale_IC(double (*pf) (struct spettro *, double x), struct spettro * pt, double a, double b,int stat_frame);
 double integrale_IC_cooling(struct spettro * pt, double a, double b, double gamma);
@@ -1023,8 +1170,8 @@ double eval_circle_secant(double z,double R,double mu);
 double st_gamma(double x);
 void beschb(double x, double *gam1, double *gam2, double *gampl,
         double *gammi);
-double chebev(float a, float b, float c[], int m, float x);
-void bessik(double x, double xnu, double *ri, double *rk, double *rip, double *rkp);
+double chebev(double a, double b, const double c[], int m, double x);
+int bessik(double x, double xnu, double *ri, double *rk, double *rip, double *rkp);
 double bessel_K_53(struct spettro *, double x);
 double bessel_K_pitch_ave(struct spettro *pt, double x);
 void tabella_Bessel(struct spettro *);
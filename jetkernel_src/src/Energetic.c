@@ -28,8 +28,8 @@ void FindNe_NpGp(struct spettro *pt) {
     double N2, N3;
 
     if (pt->Distr_e_done == 0) {
-        printf("No electron distribution calculated \n ");
-        exit(0);
+        kernel_error(pt, KERNEL_ERROR, "No electron distribution calculated");
+        return;
         //Genera_Ne(pt);
     }
 
@@ -61,8 +61,8 @@ void EvalU_e(struct spettro *pt) {
 
 
     if (pt->Distr_e_done == 0) {
-        printf("No electron distribution calculated \n ");
-        exit(0);
+        kernel_error(pt, KERNEL_ERROR, "No electron distribution calculated");
+        return;
         //Genera_Ne(pt);
     }
     //printf("N_0=%e\n", pt->N_0);
@@ -81,8 +81,8 @@ void EvalU_p(struct spettro *pt) {
 
 
     if (pt->Distr_p_done == 0) {
-        printf("No electron distribution calculated \n ");
-        exit(0);
+        kernel_error(pt, KERNEL_ERROR, "No electron distribution calculated");
+        return;
         //Genera_Ne(pt);
     }
     //printf("N_0=%e\n", pt->N_0);
@@ -121,7 +121,7 @@ double N_distr_U_e(struct spettro *pt_N, double Gamma) {
     //return N_distr(pt_N, Gamma) * Gamma;
     //!!!!!! ricordati di che si puo' usare N_distr
     // quando non usi i leptoni secondari
-    return N_distr_interp(pt_N, Gamma, pt_N->griglia_gamma_Ne_log, pt_N->Ne) * Gamma;
+    return N_distr_interp(pt_N->gamma_grid_size, Gamma, pt_N->griglia_gamma_Ne_log, pt_N->Ne) * Gamma;
 }
 
 double N_distr_U_p(struct spettro *pt_N, double Gamma) {
@@ -137,7 +137,7 @@ double N_distr_U_p(struct spettro *pt_N, double Gamma) {
     //return N_distr(pt_N, Gamma) * Gamma;
     //!!!!!! ricordati di che si puo' usare N_distr
     // quando non usi i leptoni secondari
-    return N_distr_interp(pt_N, Gamma, pt_N->griglia_gamma_Np_log, pt_N->Np) * Gamma;
+    return N_distr_interp(pt_N->gamma_grid_size, Gamma, pt_N->griglia_gamma_Np_log, pt_N->Np) * Gamma;
 }
 
 
@@ -259,8 +259,8 @@ double	Lum_SSC_at_nu (struct spettro *pt , double nu_1) {
 
     //printf("Eval Total Sync Power emitted by electrons\n");
     if (pt->Distr_e_done == 0) {
-        printf("No electron distribution calculated \n ");
-        exit(0);
+        kernel_error(pt, KERNEL_ERROR, "No electron distribution calculated");
+        return 0.0;
     }
 
 
@@ -290,8 +290,8 @@ double	Lum_Sync_at_nu (struct spettro *pt , double nu) {
 
     //printf("Eval Total Sync Power emitted by electrons\n");
     if (pt->Distr_e_done == 0) {
-        printf("No electron distribution calculated \n ");
-        exit(0);
+        kernel_error(pt, KERNEL_ERROR, "No electron distribution calculated");
+        return 0.0;
     }
 
 
@@ -321,8 +321,8 @@ double Power_Sync_Electron(struct spettro *pt) {
 
     //printf("Eval Total Sync Power emitted by electrons\n");
     if (pt->Distr_e_done == 0) {
-        printf("No electron distribution calculated \n ");
-        exit(0);
+        kernel_error(pt, KERNEL_ERROR, "No electron distribution calculated");
+        return 0.0;
     }
 
 
@@ -347,7 +347,7 @@ double Power_Sync_Electron(struct spettro *pt) {
 //==============================
 
 double Power_Sync_Electron_Integ(struct spettro *pt_N, double Gamma) {
-    return N_distr_interp(pt_N, Gamma, pt_N->griglia_gamma_Ne_log, pt_N->Ne)
+    return N_distr_interp(pt_N->gamma_grid_size, Gamma, pt_N->griglia_gamma_Ne_log, pt_N->Ne)
             * Gamma * Gamma;
     //(1.0 - (1.0 / (Gamma * Gamma)));
     //return N_distr(pt_N, Gamma) * Gamma * Gamma * (1.0 - (1.0 / (Gamma * Gamma)));
@@ -501,8 +501,8 @@ struct jet_energetic EnergeticOutput(struct spettro * pt,int write_file) {
         //printf("%s\n", f_Energetic);
         fp_Energetic = fopen(f_Energetic, "w");
         if (fp_Energetic == NULL) {
-            printf("warning non riesco ad aprire %s\n", f_Energetic);
-            exit(1);
+            kernel_error(pt, KERNEL_ERROR, "warning non riesco ad aprire %s", f_Energetic);
+            return energetic;
         }
         fprintf(fp_Energetic, "#######################################################################\n");
         fprintf(fp_Energetic, "#_obs is as observed from the earth: beaming+cosmo   \n");
@@ -728,8 +728,8 @@ void CoolingRates(struct spettro * pt, struct temp_ev *pt_ev) {
 
         if (fp_cooling == NULL)
         {
-            printf("warning non riesco ad aprire %s\n", f_cooling);
-            exit(1);
+            kernel_error(pt, KERNEL_ERROR, "warning non riesco ad aprire %s", f_cooling);
+            return;
         }
 
         fprintf(fp_cooling, "# log10(gamma) log10(IC/S|cooling) log10(Uph/UB) log10(t_cool)\n");
@@ -152,10 +152,12 @@ struct temp_ev MakeTempEv() {
 struct spettro MakeBlob() {
 
     struct spettro spettro_root;
-    spettro_root.spec_array_size=static_spec_arr_size;
+    //all the pointers to NULL, the buffers are allocated by build_photons
+    memset(&spettro_root, 0, sizeof(struct spettro));
 
     spettro_root.WRITE_TO_FILE=0;
     spettro_root.BESSEL_TABLE_DONE=0;
+    spettro_root.KN_TABLE_DONE=0;
     spettro_root.verbose = 0;
     sprintf(spettro_root.path, "./");
     sprintf(spettro_root.STEM, "TEST");
@@ -165,12 +167,18 @@ struct spettro MakeBlob() {
     spettro_root.Sync_kernel=1;
     spettro_root.do_SSC = 1;
     spettro_root.do_IC=1;
+    spettro_root.n_threads=1;
+    spettro_root.dirty_stages=STAGE_ALL;
+    spettro_root.stage_snapshot=NULL;
+    spettro_root.do_profile=0;
+    reset_profile(&spettro_root);
     spettro_root.adaptive_e_binning =0;
     sprintf(spettro_root.MODE, "fast");
     //GRID SIZE FOR SEED
     spettro_root.nu_seed_size = 200;
     //GRID SIZE FOR IC
     spettro_root.nu_IC_size = 100;
+    spettro_root.IC_adaptive_tol = 0;
     spettro_root.gamma_grid_size = 1000;
     spettro_root.gamma_custom_grid_size=1000;
     spettro_root.nu_start_Sync = 1e8;
@@ -277,11 +285,43 @@ struct spettro MakeBlob() {
     spettro_root.gamma_e_custom=NULL;
 
 
-//    build_photons(&spettro_root);
+    build_photons(&spettro_root);
     return spettro_root;
 }
 
 
+void FreeBlob(struct spettro *pt_base){
+    free_photons(pt_base);
+    free_stage_snapshot(pt_base);
+
+    free(pt_base->gam);
+    free(pt_base->Ne);
+    free(pt_base->Ne_stat);
+    free(pt_base->griglia_gamma_Ne_log);
+    free(pt_base->griglia_gamma_Ne_log_stat);
+    free(pt_base->griglia_gamma_Np_log);
+    free(pt_base->griglia_gamma_Ne_log_IC);
+    free(pt_base->Ne_IC);
+    free(pt_base->Np);
+    free(pt_base->Ne_custom);
+    free(pt_base->gamma_e_custom);
+
+    pt_base->gam=NULL;
+    pt_base->Ne=NULL;
+    pt_base->Ne_stat=NULL;
+    pt_base->griglia_gamma_Ne_log=NULL;
+    pt_base->griglia_gamma_Ne_log_stat=NULL;
+    pt_base->griglia_gamma_Np_log=NULL;
+    pt_base->griglia_gamma_Ne_log_IC=NULL;
+    pt_base->Ne_IC=NULL;
+    pt_base->Np=NULL;
+    pt_base->Ne_custom=NULL;
+    pt_base->gamma_e_custom=NULL;
+    pt_base->gamma_grid_size_alloc=0;
+    pt_base->gamma_custom_size_alloc=0;
+}
+
+
 void MakeNe(struct spettro *pt_base){
     build_Ne(pt_base);
 }
@@ -293,14 +333,16 @@ void set_seed_freq_start(struct spettro *pt_base){
     pt_base->nu_start_SSC = 1e14;
     pt_base->nu_stop_SSC = 1e30;
 
-
-    pt_base->nu_start_EC_Disk = 1e13;
-    pt_base->nu_stop_EC_Disk = 1e30;
-    pt_base->nu_start_EC_BLR = 1e13;
-    pt_base->nu_stop_EC_BLR = 1e30;
-    pt_base->nu_start_EC_DT = 1e13;
-    pt_base->nu_start_EC_CMB = 1e13;
-    pt_base->nu_stop_EC_CMB = 1e30;
+    //the EC grids are kept if the EC spectra are not evaluated again
+    if (pt_base->dirty_stages & STAGE_EC){
+        pt_base->nu_start_EC_Disk = 1e13;
+        pt_base->nu_stop_EC_Disk = 1e30;
+        pt_base->nu_start_EC_BLR = 1e13;
+        pt_base->nu_stop_EC_BLR = 1e30;
+        pt_base->nu_start_EC_DT = 1e13;
+        pt_base->nu_start_EC_CMB = 1e13;
+        pt_base->nu_stop_EC_CMB = 1e30;
+    }
 }
 
 
@@ -315,6 +357,25 @@ void Init(struct spettro *pt_base, double luminosity_distance) {
     double test, prova;
     unsigned long i;
     //char * ENV;
+    double t_start;
+    //a new evaluation starts
+    reset_profile(pt_base);
+    //stages affected by the changes since the last run
+    update_dirty_stages(pt_base);
+    if (luminosity_distance<0){
+
+        pt_base->dist = dist_lum_cm(pt_base->z_cosm);
+    }
+    else{
+        pt_base->dist = luminosity_distance;
+    }
+    if (pt_base->stage_snapshot != NULL && pt_base->dist != pt_base->stage_snapshot->dist){
+        pt_base->dirty_stages |= STAGE_EXT | STAGE_EC;
+    }
+    //the secondary electrons are not tracked
+    if (strcmp(pt_base->PARTICLE, "hadrons") == 0) {
+        pt_base->dirty_stages = STAGE_ALL;
+    }
     pt_base->SYSPATH=getenv("BLAZARSED");
     set_seed_freq_start(pt_base);
 
@@ -336,43 +397,36 @@ void Init(struct spettro *pt_base, double luminosity_distance) {
     //======================================
     // Arrays SetUp
     //======================================
-    if (pt_base->nu_seed_size>=pt_base->spec_array_size){
-    	pt_base->nu_seed_size=pt_base->spec_array_size-1;
-    	if (pt_base->verbose){
-            printf("!!! Warning nu_seed_size  was gt spec_array size \n");
-            printf("now set  to spec_array size %d \n ",pt_base->spec_array_size-1);
-        }
+    if (!build_photons(pt_base)){
+        return;
     }
-    if (pt_base->nu_IC_size>=pt_base->spec_array_size){
-    	pt_base->nu_IC_size=pt_base->spec_array_size-1;
-    	if (pt_base->verbose){
-            printf("!!! Warning  nu_IC_size  was gt spec_array size \n ");
-            printf("now set  to spec_array size %d\n ",pt_base->spec_array_size-1);
+
+    //the arrays of the clean stages are kept
+    for (i = 0; i < pt_base->nu_seed_size; i++) {
+        if (pt_base->dirty_stages & STAGE_SYNC){
+            pt_base->j_Sync[i] = 0.0;
+            pt_base->alfa_Sync[i] = 0.0;
         }
-    }
-    for (i = 0; i < static_spec_arr_size; i++) {
-        pt_base->q_comp[i] = 0.0;
-        pt_base->j_Sync[i] = 0.0;
-        pt_base->alfa_Sync[i] = 0.0;
         pt_base->I_nu_Sync[i] = 0.0;
         pt_base->nuF_nu_Sync_obs[i]=0.0;
-
-
+        if (pt_base->dirty_stages & STAGE_EXT){
+            pt_base->nuF_nu_Disk_obs[i]=0;
+            pt_base->nuF_nu_DT_obs[i]=0;
+            pt_base->nuF_nu_Star_obs[i]=0;
+        }
     }
 
-    for (i = 0; i < static_spec_arr_size; i++){
-
+    for (i = 0; i < pt_base->nu_IC_size; i++){
+        pt_base->q_comp[i] = 0.0;
         pt_base->nuF_nu_SSC_obs[i]=0.0;
-        pt_base->nuF_nu_EC_Disk_obs[i]=0;
-        pt_base->nuF_nu_EC_BLR_obs[i]=0;
-        pt_base->nuF_nu_EC_DT_obs[i]=0;
-        pt_base->nuF_nu_EC_Star_obs[i]=0;
-        pt_base->nuF_nu_EC_CMB_obs[i]=0;
-        //pt_base->nuF_nu_EC_CMB_stat_obs[i]=0;
-        pt_base->nuF_nu_Disk_obs[i]=0;
-        pt_base->nuF_nu_DT_obs[i]=0;
-        pt_base->nuF_nu_Star_obs[i]=0;
-
+        if (pt_base->dirty_stages & STAGE_EC){
+            pt_base->nuF_nu_EC_Disk_obs[i]=0;
+            pt_base->nuF_nu_EC_BLR_obs[i]=0;
+            pt_base->nuF_nu_EC_DT_obs[i]=0;
+            pt_base->nuF_nu_EC_Star_obs[i]=0;
+            pt_base->nuF_nu_EC_CMB_obs[i]=0;
+            //pt_base->nuF_nu_EC_CMB_stat_obs[i]=0;
+        }
     }
 
 
@@ -424,13 +478,18 @@ void Init(struct spettro *pt_base, double luminosity_distance) {
     //==================================
     //exit(1);
     if (pt_base->BESSEL_TABLE_DONE == 0){
+        t_start = profile_start(pt_base);
     	tabella_Bessel(pt_base);
+        profile_stop(pt_base, PROFILE_BESSEL, t_start);
     }
     
     //========================================================
     // Compton Parameter Initialization
     //========================================================
     pt_base->COST_IC_K1 = 3.0 * SIGTH * vluce_cm / 4.0;
+    if (pt_base->KN_TABLE_DONE == 0){
+        tabella_KN(pt_base);
+    }
     pt_base->COST_IC_COOLING = (4.0/3.0) * SIGTH * vluce_cm*HPLANCK/MEC2;
 
 
@@ -445,14 +504,6 @@ void Init(struct spettro *pt_base, double luminosity_distance) {
 
     //========================================================
 
-    if (luminosity_distance<0){
-
-        pt_base->dist = dist_lum_cm(pt_base->z_cosm);
-    }
-    else{
-        pt_base->dist = luminosity_distance;
-    }
-
     if (pt_base->verbose) {
         printf("Distanza rigorosa=%e in Mpc \n", pt_base->dist/(1.0e6*1.0e2));
         printf("Distanza rigorosa=%e in cm \n", pt_base->dist);
@@ -470,7 +521,14 @@ void Init(struct spettro *pt_base, double luminosity_distance) {
     }
     
     if (strcmp(pt_base->PARTICLE, "leptons") == 0) {
-        InitNe(pt_base);
+        if (pt_base->dirty_stages & STAGE_ELEC){
+            t_start = profile_start(pt_base);
+            InitNe(pt_base);
+            profile_stop(pt_base, PROFILE_INIT_NE, t_start);
+        }
+        else{
+            pt_base->Distr_e_done = 1;
+        }
         pt_base->N_tot_e_Sferic = pt_base->Vol_sphere * pt_base->N;
         FindNe_NpGp(pt_base);
         EvalU_e(pt_base);
@@ -522,14 +580,22 @@ void Init(struct spettro *pt_base, double luminosity_distance) {
             printf("Peak of  N(gamma)*gamma^3 = %e\n", pt_base-> Np3);
         }
     }
-
+    save_stage_snapshot(pt_base);
 }
 void Run_SED(struct spettro *pt_base){
 	unsigned long i;
+	double nu_peak_Sync_blob;
+    double t_start;
     if (pt_base->verbose) {
         printf("STEM=%s\n", pt_base->STEM);
         printf(">>>>>>>>>>>>>>>>>>>>>>>>>>>>> RUN      <<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<<\n");
     }
+    //stages affected by the changes since Init, or since the last run
+    update_dirty_stages(pt_base);
+    //grid sizes might have changed after Init
+    if (!build_photons(pt_base)){
+        return;
+    }
     //==================================================
     // Evaluate hadronic pp Spectrum
     //==================================================
@@ -544,7 +610,14 @@ void Run_SED(struct spettro *pt_base){
     // Evaluate Synchrotron Spectrum
     //==================================================
     if (pt_base->do_Sync != 0) {
+        nu_peak_Sync_blob = pt_base->nu_peak_Sync_blob;
+        t_start = profile_start(pt_base);
         spettro_sincrotrone(1, pt_base);
+        profile_stop(pt_base, PROFILE_SYNC, t_start);
+        //the EC grids start from the Sync peak
+        if (pt_base->nu_peak_Sync_blob != nu_peak_Sync_blob) {
+            pt_base->dirty_stages |= STAGE_EC;
+        }
     }
 
 
@@ -552,7 +625,9 @@ void Run_SED(struct spettro *pt_base){
     // Evaluate SSC Spectrum
     //==================================================
     if (pt_base->do_SSC && pt_base->do_IC) {
+        t_start = profile_start(pt_base);
         spettro_compton(1, pt_base);
+        profile_stop(pt_base, PROFILE_SSC, t_start);
     }
 
 
@@ -565,41 +640,56 @@ void Run_SED(struct spettro *pt_base){
 				|| pt_base->do_EC_CMB == 1 
 				|| pt_base->do_Disk==1 || pt_base->do_DT==1) 
                 {
-                spectra_External_Fields(1, pt_base);
-                if (pt_base->do_EC_Star == 1) {
+                if (pt_base->dirty_stages & STAGE_EXT) {
+                    t_start = profile_start(pt_base);
+                    spectra_External_Fields(1, pt_base);
+                    profile_stop(pt_base, PROFILE_EXT_FIELDS, t_start);
+                }
+                //the EC spectra of the last run are kept if EC is clean
+                if (pt_base->do_EC_Star == 1 && (pt_base->dirty_stages & STAGE_EC)) {
                     //if (pt_base->verbose) {
                     //    printf("************* Disk ****************\n");
                     //}
                     pt_base->EC = 4;
+                    t_start = profile_start(pt_base);
                     spettro_EC(1, pt_base);
+                    profile_stop(pt_base, PROFILE_EC_STAR, t_start);
                 }
-                if (pt_base->do_EC_Disk == 1 || pt_base->do_Disk==1) {
+                if ((pt_base->do_EC_Disk == 1 || pt_base->do_Disk==1) && (pt_base->dirty_stages & STAGE_EC)) {
                     //if (pt_base->verbose) {
                     //    printf("************* Disk ****************\n");
                    // }
                     pt_base->EC = 1;
+                    t_start = profile_start(pt_base);
                     spettro_EC(1, pt_base);
+                    profile_stop(pt_base, PROFILE_EC_DISK, t_start);
                 }
-                if (pt_base->do_EC_BLR == 1) {
+                if (pt_base->do_EC_BLR == 1 && (pt_base->dirty_stages & STAGE_EC)) {
                     //if (pt_base->verbose) {
                     //    printf("************* BLR ****************\n");
                     //}
                     pt_base->EC = 2;
+                    t_start = profile_start(pt_base);
                     spettro_EC(1, pt_base);
+                    profile_stop(pt_base, PROFILE_EC_BLR, t_start);
                 }
-                if (pt_base->do_EC_DT == 1) {
+                if (pt_base->do_EC_DT == 1 && (pt_base->dirty_stages & STAGE_EC)) {
                     //if (pt_base->verbose) {
                     //    printf("************* DT ****************\n");
                     // }
                     pt_base->EC = 3;
+                    t_start = profile_start(pt_base);
                     spettro_EC(1, pt_base);
+                    profile_stop(pt_base, PROFILE_EC_DT, t_start);
                 }
-                if (pt_base->do_EC_CMB == 1) {
+                if (pt_base->do_EC_CMB == 1 && (pt_base->dirty_stages & STAGE_EC)) {
                     //if (pt_base->verbose) {
                     //    printf("************* CMB ****************\n");
                    // }
                     pt_base->EC = 5;
+                    t_start = profile_start(pt_base);
                     spettro_EC(1, pt_base);
+                    profile_stop(pt_base, PROFILE_EC_CMB, t_start);
                 }
                 //if (pt_base->do_EC_CMB_stat == 1) {
                 //    if (pt_base->verbose) {
@@ -615,7 +705,14 @@ void Run_SED(struct spettro *pt_base){
     //==================================================
     //Sum Up all the Spectral Components
     //==================================================
+    t_start = profile_start(pt_base);
     spettro_somma_Sync_ic(1, pt_base);
+    profile_stop(pt_base, PROFILE_SUM, t_start);
+
+    if (pt_base->error_code == 0) {
+        pt_base->dirty_stages = 0;
+        save_stage_snapshot(pt_base);
+    }
 
     //==================================================
     // Energetic
@@ -635,43 +732,47 @@ void Run_SED(struct spettro *pt_base){
 //Funtions To access Ne and Spectral components form Python
 //==================================================
 double get_spectral_array(double * arr, struct spettro * pt, unsigned long id){
-	if ((id >=0) && (id <= pt->nu_grid_size)){
+	if (id < pt->nu_grid_size){
 		return arr[id];
 	}
 	else{
-		printf("exceeded array size\n");
-		exit(0);
+		kernel_error(pt, KERNEL_INDEX_ERROR, "index %lu exceeded array size", id);
+		return 0.0;
 	}
 }
 
 
 double get_elec_array(double * arr, struct spettro *pt, unsigned long id){
-	if ((id>=0) && (id<=pt->gamma_grid_size)){
+	if (id < pt->gamma_grid_size){
 		return arr[id];
 	}
 	else{
-		printf("exceeded array size\n");
-		exit(0);
+		kernel_error(pt, KERNEL_INDEX_ERROR, "index %lu exceeded array size", id);
+		return 0.0;
 	}
 }
 
 double set_elec_array(double * arr,struct spettro *pt, double val, unsigned long id){
-    if ((id>=0) && (id<=pt->gamma_grid_size)){
+    if (id < pt->gamma_grid_size){
            arr[id]=val;
+           pt->dirty_stages |= STAGE_ELEC;
+           return val;
         }
         else{
-            printf("exceeded array size\n");
-            exit(0);
+            kernel_error(pt, KERNEL_INDEX_ERROR, "index %lu exceeded array size", id);
+            return 0.0;
         }
 }
 
 double set_elec_custom_array(double * arr, struct spettro *pt,double val, unsigned long id){
-    if ((id>=0) && (id<=pt->gamma_custom_grid_size)){
+    if (id < pt->gamma_custom_grid_size){
            arr[id]=val;
+           pt->dirty_stages |= STAGE_ELEC;
+           return val;
         }
         else{
-            printf("exceeded array size\n");
-            exit(0);
+            kernel_error(pt, KERNEL_INDEX_ERROR, "index %lu exceeded array size", id);
+            return 0.0;
         }
 }
 
@@ -687,8 +788,8 @@ void SetBeaming(struct spettro *pt){
 	}
 
 	else {
-		printf("BEAMING_EXPR variable set to wrong value, posible delta or bulk_theta \n");
-		exit(0);
+		kernel_error(pt, KERNEL_ERROR, "BEAMING_EXPR variable set to wrong value, posible delta or bulk_theta");
+		return;
 	}
 
 	if (pt->verbose) {
@@ -0,0 +1,225 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <math.h>
+#include <string.h>
+#include "Blazar_SED.h"
+
+
+//========================
+//ADAPTIVE IC GRIDS
+//========================
+// With IC_adaptive_tol>0 the SSC and EC frequency grids are not uniform in
+// log(nu). build_adaptive_IC_grid starts from a coarse grid, uniform in
+// log(nu) between nu_start and nu_stop, and bisects the intervals where the
+// log of the emissivity at the midpoint differs from the log-log
+// interpolation of the interval ends by more than IC_adaptive_tol (dex),
+// until all the intervals meet the tolerance, or the grid has nu_IC_size
+// points. Hence the points are placed where the spectrum is curved (peaks
+// and cut-offs), while the tails more than ADAPTIVE_IC_DYN_RANGE decades
+// below the peak, or below emiss_lim, are not refined. The intervals are not
+// bisected below ADAPTIVE_IC_MIN_STEP, that bounds the points spent where the
+// emissivity drops to zero (kinematic cut-offs). If the grid is full, the
+// intervals with the largest errors are refined first.
+// The midpoints of each bisection are evaluated as the uniform grids, in
+// parallel with n_threads>1 (see parallel.c).
+// The grid and the rates are stored in the first n elements of the arrays,
+// the other elements repeat the last point, so that the arrays keep
+// nu_IC_size elements for the spectral loops, log_lin_interp and FindEpSp.
+
+
+
+//points of the starting grid
+#define ADAPTIVE_IC_START_SIZE 16
+//decades below the peak of the emissivity not refined
+#define ADAPTIVE_IC_DYN_RANGE 8.0
+//smallest interval, in log(nu)
+#define ADAPTIVE_IC_MIN_STEP 0.01
+
+
+
+static void eval_rates(struct spettro *pt, double * nu, unsigned long size, double nu_start, double nu_stop, double * q_comp){
+    // rate_compton_GR for the first size elements of nu in [nu_start,nu_stop]
+    unsigned long i;
+
+    if (get_n_threads(pt) > 1 && size > 1 && eval_rate_compton_points(pt, nu, size, nu_start, nu_stop, q_comp)){
+        return;
+    }
+    for (i = 0; i < size; i++){
+        if (nu[i] >= nu_start && nu[i] <= nu_stop){
+            pt->nu_1 = nu[i];
+            q_comp[i] = rate_compton_GR(pt);
+        }
+    }
+}
+
+
+
+static double log_emissivity(double nu, double q_comp){
+    double j;
+    j = q_comp * HPLANCK * nu;
+    if (j > 0){
+        return log10(j);
+    }
+    return -HUGE_VAL;
+}
+
+
+
+static double interval_error(double log_j_lo, double log_j_mid, double log_j_hi, double log_j_floor){
+    // difference between the log emissivity at the midpoint and the
+    // interpolation of the interval ends, the values below log_j_floor
+    // are taken at log_j_floor
+    return fabs(fmax(log_j_mid, log_j_floor) - 0.5 * (fmax(log_j_lo, log_j_floor) + fmax(log_j_hi, log_j_floor)));
+}
+
+
+
+static int compare_desc(const void * a, const void * b){
+    double x, y;
+    x = *((const double *) a);
+    y = *((const double *) b);
+    return (x < y) - (x > y);
+}
+
+
+
+unsigned long build_adaptive_IC_grid(struct spettro *pt, double nu_start, double nu_stop, double * nu_grid, double * q_comp){
+    // builds the grid of nu_IC_size elements in nu_grid, with the rates in
+    // q_comp, and returns the number of distinct points, or 0 (leaving
+    // nu_grid and q_comp unchanged) if the work arrays can not be allocated
+    unsigned long size, n, n_start, n_cand, n_mid, i, j, k, dst, dst_mid;
+    double log_nu_start, k_step, log_j_max, log_j_floor, err_min, e;
+    double *log_nu, *log_j, *err, *err_sorted, *log_nu_mid, *nu_mid, *q_mid;
+    char * refine;
+
+    size = pt->nu_IC_size;
+    n_start = size < ADAPTIVE_IC_START_SIZE ? size : ADAPTIVE_IC_START_SIZE;
+    if (n_start < 2){
+        return 0;
+    }
+
+    log_nu = malloc(size * sizeof (double));
+    log_j = malloc(size * sizeof (double));
+    err = malloc(size * sizeof (double));
+    err_sorted = malloc(size * sizeof (double));
+    log_nu_mid = malloc(size * sizeof (double));
+    nu_mid = malloc(size * sizeof (double));
+    q_mid = malloc(size * sizeof (double));
+    refine = malloc(size * sizeof (char));
+    if (log_nu == NULL || log_j == NULL || err == NULL || err_sorted == NULL ||
+        log_nu_mid == NULL || nu_mid == NULL || q_mid == NULL || refine == NULL){
+        free(log_nu);
+        free(log_j);
+        free(err);
+        free(err_sorted);
+        free(log_nu_mid);
+        free(nu_mid);
+        free(q_mid);
+        free(refine);
+        return 0;
+    }
+
+    //starting grid, as build_log_grid
+    log_nu_start = log10(nu_start);
+    k_step = log10(nu_stop) - log_nu_start;
+    for (i = 0; i < n_start; i++){
+        log_nu[i] = log_nu_start + k_step * (double) i / (double) (n_start - 1);
+        nu_grid[i] = pow(10, log_nu[i]);
+        q_comp[i] = 0;
+    }
+    eval_rates(pt, nu_grid, n_start, nu_start, nu_stop, q_comp);
+
+    n = n_start;
+    log_j_max = -HUGE_VAL;
+    for (i = 0; i < n; i++){
+        log_j[i] = log_emissivity(nu_grid[i], q_comp[i]);
+        log_j_max = fmax(log_j_max, log_j[i]);
+        //not tested yet, or not to be bisected
+        err[i] = HUGE_VAL;
+        if (k_step / (double) (n_start - 1) < 2 * ADAPTIVE_IC_MIN_STEP){
+            err[i] = -1;
+        }
+    }
+
+    while (n < size){
+        log_j_floor = log_j_max - ADAPTIVE_IC_DYN_RANGE;
+        if (pt->emiss_lim > 0){
+            log_j_floor = fmax(log_j_floor, log10(pt->emiss_lim));
+        }
+
+        n_cand = 0;
+        for (k = 0; k < n - 1; k++){
+            if (err[k] > pt->IC_adaptive_tol){
+                err_sorted[n_cand] = err[k];
+                n_cand++;
+            }
+        }
+        if (n_cand == 0){
+            break;
+        }
+        err_min = 0;
+        if (n_cand > size - n){
+            qsort(err_sorted, n_cand, sizeof (double), compare_desc);
+            err_min = err_sorted[size - n - 1];
+        }
+
+        n_mid = 0;
+        for (k = 0; k < n - 1; k++){
+            refine[k] = 0;
+            if (err[k] > pt->IC_adaptive_tol && err[k] >= err_min && n_mid < size - n){
+                refine[k] = 1;
+                log_nu_mid[n_mid] = 0.5 * (log_nu[k] + log_nu[k + 1]);
+                nu_mid[n_mid] = pow(10, log_nu_mid[n_mid]);
+                q_mid[n_mid] = 0;
+                n_mid++;
+            }
+        }
+        eval_rates(pt, nu_mid, n_mid, nu_start, nu_stop, q_mid);
+
+        //inserts the midpoints, moving the points from the end of the grid:
+        //the point k goes after the j midpoints of the intervals before it
+        j = n_mid;
+        for (k = n - 1; k > 0; k--){
+            dst = k + j;
+            log_nu[dst] = log_nu[k];
+            nu_grid[dst] = nu_grid[k];
+            q_comp[dst] = q_comp[k];
+            log_j[dst] = log_j[k];
+            if (k < n - 1){
+                err[dst] = err[k];
+            }
+            if (refine[k - 1]){
+                j--;
+                dst_mid = k + j;
+                log_nu[dst_mid] = log_nu_mid[j];
+                nu_grid[dst_mid] = nu_mid[j];
+                q_comp[dst_mid] = q_mid[j];
+                log_j[dst_mid] = log_emissivity(nu_mid[j], q_mid[j]);
+                log_j_max = fmax(log_j_max, log_j[dst_mid]);
+                //both the halves are refined if the interval misses the tolerance
+                e = interval_error(log_j[k - 1], log_j[dst_mid], log_j[dst], log_j_floor);
+                if (log_nu[dst] - log_nu_mid[j] < 2 * ADAPTIVE_IC_MIN_STEP){
+                    e = -1;
+                }
+                err[dst_mid] = e;
+                err[k - 1] = e;
+            }
+        }
+        n += n_mid;
+    }
+
+    for (i = n; i < size; i++){
+        nu_grid[i] = nu_grid[n - 1];
+        q_comp[i] = q_comp[n - 1];
+    }
+
+    free(log_nu);
+    free(log_j);
+    free(err);
+    free(err_sorted);
+    free(log_nu_mid);
+    free(nu_mid);
+    free(q_mid);
+    free(refine);
+    return n;
+}
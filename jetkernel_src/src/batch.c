@@ -0,0 +1,135 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <setjmp.h>
+#include <string.h>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+#include "Blazar_SED.h"
+
+
+//========================
+//BATCH EVALUATION
+//========================
+// eval_batch evaluates the model for n_samples sets of parameter values,
+// storing the summed spectrum (nuFnu_sum_grid) of each sample in a row of
+// nuFnu_sum. The parameters are given by their index (see get_par_index), the
+// values of the sample i are par_vals[i*n_pars:(i+1)*n_pars], and dist[i] is
+// the luminosity distance passed to Init (negative to evaluate it from z_cosm).
+// Each sample is evaluated as by Init and Run_SED, hence the stages not
+// affected by the changed parameters are not evaluated again.
+// With n_threads>1 the samples are distributed among the threads, each one
+// evaluating its samples on its own copy of the blob (CloneBlob), with
+// n_threads=1, and leaving the blob unchanged; otherwise the samples are
+// evaluated serially on the blob, that is left with the parameter values
+// and the spectra of the last sample.
+// If any thread reports a kernel error the samples are evaluated again
+// serially, where the same error is raised in the calling thread.
+
+
+
+static void eval_sample(struct spettro *pt, unsigned long n_pars, int * par_index,
+                        double * vals, double dist, double * nuFnu_sum){
+    unsigned long k;
+
+    for (k = 0; k < n_pars; k++){
+        *get_par_field(pt, par_index[k]) = vals[k];
+    }
+    Init(pt, dist);
+    Run_SED(pt);
+    if (pt->error_code == 0){
+        memcpy(nuFnu_sum, pt->nuFnu_sum_grid, pt->nu_grid_size * sizeof (double));
+    }
+}
+
+
+
+#ifdef _OPENMP
+static int eval_sample_ctx(struct spettro *pt_ctx, unsigned long n_pars, int * par_index,
+                           double * vals, double dist, double * nuFnu_sum){
+    // as eval_sample, the kernel errors jump back here, and 0 is returned
+    jmp_buf kernel_jmp_env;
+    void * prev_jmp_env;
+
+    prev_jmp_env = kernel_error_enter(pt_ctx, &kernel_jmp_env);
+    if (setjmp(kernel_jmp_env) == 0){
+        eval_sample(pt_ctx, n_pars, par_index, vals, dist, nuFnu_sum);
+    }
+    kernel_error_exit(pt_ctx, prev_jmp_env);
+    return pt_ctx->error_code == 0;
+}
+
+
+
+static int eval_batch_threads(struct spettro *pt, unsigned long n_samples, unsigned long n_pars, int * par_index,
+                              double * par_vals, double * dist, double * nu_grid, double * nuFnu_sum){
+    // returns 0 if the blob copies can not be allocated, or on kernel errors
+    long i;
+    int failed;
+
+    failed = 0;
+    #pragma omp parallel num_threads(get_n_threads(pt))
+    {
+        struct spettro * pt_ctx;
+        int ctx_failed;
+        pt_ctx = CloneBlob(pt);
+        ctx_failed = pt_ctx == NULL;
+        if (pt_ctx != NULL){
+            pt_ctx->n_threads = 1;
+        }
+        #pragma omp for schedule(dynamic)
+        for (i = 0; i < (long) n_samples; i++){
+            if (!ctx_failed){
+                ctx_failed = !eval_sample_ctx(pt_ctx, n_pars, par_index, par_vals + i * n_pars, dist[i],
+                                              nuFnu_sum + i * pt->nu_grid_size);
+            }
+        }
+        if (ctx_failed){
+            #pragma omp atomic write
+            failed = 1;
+        }
+        else if (pt_ctx != NULL && n_samples > 0){
+            // the frequency grid does not depend on the parameters
+            #pragma omp critical
+            memcpy(nu_grid, pt_ctx->nu_grid, pt->nu_grid_size * sizeof (double));
+        }
+        if (pt_ctx != NULL){
+            FreeBlob(pt_ctx);
+            free(pt_ctx);
+        }
+    }
+    return !failed;
+}
+#endif
+
+
+
+void eval_batch(struct spettro *pt, unsigned long n_samples, unsigned long n_pars, int * par_index,
+                double * par_vals, double * dist, double * nu_grid, double * nuFnu_sum){
+    unsigned long i;
+
+    for (i = 0; i < n_pars; i++){
+        if (get_par_field(pt, par_index[i]) == NULL){
+            kernel_error(pt, KERNEL_INDEX_ERROR, "wrong parameter index %d", par_index[i]);
+            return;
+        }
+    }
+
+#ifdef _OPENMP
+    if (get_n_threads(pt) > 1 && n_samples > 1){
+        if (eval_batch_threads(pt, n_samples, n_pars, par_index, par_vals, dist, nu_grid, nuFnu_sum)){
+            return;
+        }
+    }
+#endif
+
+    for (i = 0; i < n_samples; i++){
+        eval_sample(pt, n_pars, par_index, par_vals + i * n_pars, dist[i], nuFnu_sum + i * pt->nu_grid_size);
+        if (pt->error_code != 0){
+            return;
+        }
+    }
+    if (n_samples > 0){
+        memcpy(nu_grid, pt->nu_grid, pt->nu_grid_size * sizeof (double));
+    }
+}
@@ -3,13 +3,13 @@
 
 void beschb(double x, double *gam1, double *gam2, double *gampl, double *gammi)
 {
-	double chebev(double a, double b, double c[], int m, double x);
+	double chebev(double a, double b, const double c[], int m, double x);
 	double xx;
-	static double c1[] = {
+	static const double c1[] = {
 		-1.142022680371172e0,6.516511267076e-3,
 		3.08709017308e-4,-3.470626964e-6,6.943764e-9,
 		3.6780e-11,-1.36e-13};
-	static double c2[] = {
+	static const double c2[] = {
 		1.843740587300906e0,-0.076852840844786e0,
 		1.271927136655e-3,-4.971736704e-6,-3.3126120e-8,
 		2.42310e-10,-1.70e-13,-1.0e-15};
@@ -0,0 +1,275 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <stddef.h>
+#include <string.h>
+#include "Blazar_SED.h"
+
+
+//========================
+//BLOB COPIES AND STATE
+//========================
+// CloneBlob makes a deep copy of the blob in the same process, while
+// GetBlobState writes the blob to a byte state, from which BlobFromState
+// builds a new blob, possibly in another process.
+// The state is made of the size of struct spettro, the struct itself, the
+// spectral buffers (see photons.c) and the electron arrays, the non NULL
+// pointers of the stored struct tell the arrays stored in the state.
+// The copies have their own spectral and electron arrays, no jump buffer,
+// and their own stage snapshot, hence their next run evaluates only the
+// stages pending in the original blob (see stages.c). The Bessel and KN
+// tables are shared by CloneBlob, and attached again by the first Init of a
+// blob built from a state. The copies are freed with FreeBlob and free.
+
+
+
+#define ELEC_ARRAY(name) offsetof(struct spettro, name)
+#define N_ELEC_ARRAYS(group) (sizeof(group)/sizeof(group[0]))
+
+// arrays of gamma_grid_size_alloc elements
+static const size_t elec_arrays[] = {
+    ELEC_ARRAY(Ne),
+    ELEC_ARRAY(Ne_stat),
+    ELEC_ARRAY(griglia_gamma_Ne_log),
+    ELEC_ARRAY(griglia_gamma_Ne_log_stat),
+    ELEC_ARRAY(griglia_gamma_Np_log),
+    ELEC_ARRAY(griglia_gamma_Ne_log_IC),
+    ELEC_ARRAY(Ne_IC),
+    ELEC_ARRAY(Np),
+};
+
+// arrays of gamma_custom_size_alloc elements
+static const size_t elec_custom_arrays[] = {
+    ELEC_ARRAY(Ne_custom),
+    ELEC_ARRAY(gamma_e_custom),
+};
+
+
+
+static int in_elec_group(struct spettro *pt, double * arr, const size_t * group, unsigned long n_arrays){
+    unsigned long i;
+    for (i = 0; i < n_arrays; i++){
+        if (*((double **) ((char *) pt + group[i])) == arr){
+            return 1;
+        }
+    }
+    return 0;
+}
+
+
+
+unsigned long get_elec_alloc_size(struct spettro *pt_base, double * arr){
+    // allocated size of the electron array arr,
+    // 0 if arr is not an electron array of pt_base
+    if (arr == NULL){
+        return 0;
+    }
+    if (in_elec_group(pt_base, arr, elec_arrays, N_ELEC_ARRAYS(elec_arrays))){
+        return pt_base->gamma_grid_size_alloc;
+    }
+    if (in_elec_group(pt_base, arr, elec_custom_arrays, N_ELEC_ARRAYS(elec_custom_arrays))){
+        return pt_base->gamma_custom_size_alloc;
+    }
+    return 0;
+}
+
+
+
+static unsigned long elec_group_state_size(struct spettro *pt, const size_t * group, unsigned long n_arrays, unsigned long size){
+    unsigned long i, state_size;
+    state_size = 0;
+    for (i = 0; i < n_arrays; i++){
+        if (*((double **) ((char *) pt + group[i])) != NULL){
+            state_size += size * sizeof (double);
+        }
+    }
+    return state_size;
+}
+
+
+
+static char * write_elec_group(struct spettro *pt, char * state, const size_t * group, unsigned long n_arrays, unsigned long size){
+    unsigned long i;
+    double * arr;
+    for (i = 0; i < n_arrays; i++){
+        arr = *((double **) ((char *) pt + group[i]));
+        if (arr != NULL){
+            memcpy(state, arr, size * sizeof (double));
+            state += size * sizeof (double);
+        }
+    }
+    return state;
+}
+
+
+
+static char * read_elec_group(struct spettro *pt, char * state, const size_t * group, unsigned long n_arrays, unsigned long size, int * done){
+    // as read_photons_group in photons.c
+    unsigned long i;
+    double ** arr;
+    for (i = 0; i < n_arrays; i++){
+        arr = (double **) ((char *) pt + group[i]);
+        if (*arr != NULL){
+            *arr = NULL;
+            if (*done && size > 0){
+                *arr = malloc(size * sizeof (double));
+                *done = *arr != NULL;
+            }
+            if (*done && size > 0){
+                memcpy(*arr, state, size * sizeof (double));
+            }
+            state += size * sizeof (double);
+        }
+    }
+    return state;
+}
+
+
+
+static int copy_elec_group(struct spettro *pt_copy, struct spettro *pt_base, const size_t * group, unsigned long n_arrays, unsigned long size){
+    // returns 0 if the copy can not be allocated
+    unsigned long i;
+    double ** arr;
+    double * arr_base;
+    int done;
+    done = 1;
+    for (i = 0; i < n_arrays; i++){
+        arr = (double **) ((char *) pt_copy + group[i]);
+        arr_base = *((double **) ((char *) pt_base + group[i]));
+        *arr = NULL;
+        if (done && arr_base != NULL && size > 0){
+            *arr = malloc(size * sizeof (double));
+            done = *arr != NULL;
+            if (done){
+                memcpy(*arr, arr_base, size * sizeof (double));
+            }
+        }
+    }
+    return done;
+}
+
+
+
+static void reset_copy(struct spettro *pt_copy, struct spettro *pt_base){
+    // the members of a copy not shared with the original blob
+    pt_copy->error_jmp_env = NULL;
+    pt_copy->stage_snapshot = NULL;
+    pt_copy->dirty_stages = get_pending_stages(pt_base);
+    // set at each run
+    pt_copy->gam = NULL;
+    pt_copy->nu_seed = NULL;
+    pt_copy->n_seed = NULL;
+}
+
+
+
+struct spettro * CloneBlob(struct spettro *pt_base){
+    // deep copy of the blob, returns NULL if the copy can not be allocated
+    struct spettro * pt_copy;
+    int done;
+
+    pt_copy = malloc(sizeof(struct spettro));
+    if (pt_copy == NULL){
+        return NULL;
+    }
+    memcpy(pt_copy, pt_base, sizeof(struct spettro));
+    reset_copy(pt_copy, pt_base);
+
+    copy_photons(pt_copy, pt_base);
+
+    done = copy_elec_group(pt_copy, pt_base, elec_arrays, N_ELEC_ARRAYS(elec_arrays), pt_base->gamma_grid_size_alloc);
+    done &= copy_elec_group(pt_copy, pt_base, elec_custom_arrays, N_ELEC_ARRAYS(elec_custom_arrays), pt_base->gamma_custom_size_alloc);
+    if (!done){
+        FreeBlob(pt_copy);
+        free(pt_copy);
+        return NULL;
+    }
+    if (pt_copy->dirty_stages != STAGE_ALL){
+        save_stage_snapshot(pt_copy);
+    }
+    return pt_copy;
+}
+
+
+
+unsigned long BlobStateSize(struct spettro *pt_base){
+    return sizeof(unsigned long) + sizeof(struct spettro) + photons_state_size(pt_base)
+           + elec_group_state_size(pt_base, elec_arrays, N_ELEC_ARRAYS(elec_arrays), pt_base->gamma_grid_size_alloc)
+           + elec_group_state_size(pt_base, elec_custom_arrays, N_ELEC_ARRAYS(elec_custom_arrays), pt_base->gamma_custom_size_alloc);
+}
+
+
+
+void GetBlobState(struct spettro *pt_base, char * state){
+    // writes the state of the blob, state has to be BlobStateSize bytes long
+    unsigned long struct_size;
+    int pending_stages;
+
+    struct_size = sizeof(struct spettro);
+    memcpy(state, &struct_size, sizeof(unsigned long));
+    state += sizeof(unsigned long);
+
+    memcpy(state, pt_base, sizeof(struct spettro));
+    pending_stages = get_pending_stages(pt_base);
+    memcpy(state + offsetof(struct spettro, dirty_stages), &pending_stages, sizeof(int));
+    state += sizeof(struct spettro);
+
+    state = write_photons_state(pt_base, state);
+    state = write_elec_group(pt_base, state, elec_arrays, N_ELEC_ARRAYS(elec_arrays), pt_base->gamma_grid_size_alloc);
+    write_elec_group(pt_base, state, elec_custom_arrays, N_ELEC_ARRAYS(elec_custom_arrays), pt_base->gamma_custom_size_alloc);
+}
+
+
+
+struct spettro * BlobFromState(char * state, unsigned long state_size){
+    // builds a blob from a state written by GetBlobState, returns NULL if
+    // the state is not valid for this build, or if the blob can not be allocated
+    struct spettro * pt;
+    unsigned long struct_size;
+    int done;
+
+    if (state_size < sizeof(unsigned long) + sizeof(struct spettro)){
+        return NULL;
+    }
+    memcpy(&struct_size, state, sizeof(unsigned long));
+    if (struct_size != sizeof(struct spettro)){
+        return NULL;
+    }
+    state += sizeof(unsigned long);
+
+    pt = malloc(sizeof(struct spettro));
+    if (pt == NULL){
+        return NULL;
+    }
+    memcpy(pt, state, sizeof(struct spettro));
+    state += sizeof(struct spettro);
+    if (BlobStateSize(pt) != state_size){
+        free(pt);
+        return NULL;
+    }
+
+    // the pointers of the stored blob are not valid in this blob
+    pt->error_jmp_env = NULL;
+    pt->stage_snapshot = NULL;
+    pt->gam = NULL;
+    pt->nu_seed = NULL;
+    pt->n_seed = NULL;
+    pt->SYSPATH = NULL;
+    pt->bessel_table = NULL;
+    pt->BESSEL_TABLE_DONE = 0;
+    pt->KN_A_table = NULL;
+    pt->KN_TABLE_DONE = 0;
+
+    done = 1;
+    state = read_photons_state(pt, state, &done);
+    state = read_elec_group(pt, state, elec_arrays, N_ELEC_ARRAYS(elec_arrays), pt->gamma_grid_size_alloc, &done);
+    read_elec_group(pt, state, elec_custom_arrays, N_ELEC_ARRAYS(elec_custom_arrays), pt->gamma_custom_size_alloc, &done);
+    if (!done){
+        FreeBlob(pt);
+        free(pt);
+        return NULL;
+    }
+    if (pt->dirty_stages != STAGE_ALL){
+        save_stage_snapshot(pt);
+    }
+    return pt;
+}
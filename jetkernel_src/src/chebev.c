@@ -4,15 +4,15 @@
 #include <string.h>
 #include <unistd.h>
 
-double chebev(double a, double b, double c[], int m, double x)
+double chebev(double a, double b, const double c[], int m, double x)
 {
 
 	double d=0.0,dd=0.0,sv,y,y2;
 	int j;
 
 	if ((x-a)*(x-b) > 0.0){
-		exit(0);
-		printf("NRERROR x not in range in routine chebev");
+		// x not in range, checked by the caller
+		return NAN;
 	}
 	y2=2.0*(y=(2.0*x-a-b)/(b-a));
 	for (j=m-1;j>=1;j--) {
@@ -60,6 +60,7 @@ void Genera_griglia_gamma_N_log(struct spettro *pt, double * griglia_gamma_N_log
 //========================================
 
 void build_Ne(struct spettro *pt) {
+    pt->dirty_stages |= STAGE_ELEC;
     //==========================================
     //Numerical Integration precision Setup
     //==========================================
@@ -81,10 +82,8 @@ void build_Ne(struct spettro *pt) {
     	}
     }
     else {
-    	if (pt->verbose) {
-			printf("MODE set to wrong value: %s, allowed= accurate,fast,custom",pt->MODE);
-			exit(1);
-      	}
+    	kernel_error(pt, KERNEL_ERROR, "MODE set to wrong value: %s, allowed= accurate,fast,custom",pt->MODE);
+    	return;
     }
 
 	if (fmod((double) pt->gamma_grid_size, 2.0) == 0) {
@@ -116,12 +115,12 @@ void build_Ne(struct spettro *pt) {
     }
 
     if (pt->gmin < pt->gmin_griglia ) {
-        printf("gmin < gmin_griglia, it must be the oppsosite");
-        exit(1);
+        kernel_error(pt, KERNEL_ERROR, "gmin < gmin_griglia, it must be the oppsosite");
+        return;
     }
     if (pt->gmax > pt->gmax_griglia ) {
-        printf("gmax > gmax_griglia, it must be the oppsosite");
-        exit(1);
+        kernel_error(pt, KERNEL_ERROR, "gmax > gmax_griglia, it must be the oppsosite");
+        return;
     }
 
 
@@ -155,6 +154,7 @@ void build_Ne(struct spettro *pt) {
     //N for IC
     alloc_N_distr(&(pt->griglia_gamma_Ne_log_IC),pt->gamma_grid_size);
     alloc_N_distr(&(pt->Ne_IC),pt->gamma_grid_size);
+    pt->gamma_grid_size_alloc=pt->gamma_grid_size;
 
 
 
@@ -196,6 +196,7 @@ void Fill_Ne_IC(struct spettro *pt, double gmin, int stat_frame) {
 
 void build_Ne_custom(struct spettro *pt,  unsigned int size) {
     pt->gamma_custom_grid_size=size;
+    pt->dirty_stages |= STAGE_ELEC;
     if (pt->verbose>1) {
         printf("Set array for Ne for from_array mode \n");
         printf("elements number is pt->gamma_grid_size=%d\n", pt->gamma_grid_size);
@@ -203,6 +204,7 @@ void build_Ne_custom(struct spettro *pt,  unsigned int size) {
     //printf("Set array per Ne %s \n",pt->DISTR);
     alloc_N_distr(&(pt->gamma_e_custom),size);
     alloc_N_distr(&(pt->Ne_custom),size);
+    pt->gamma_custom_size_alloc=size;
 
 }
 
@@ -327,8 +329,8 @@ void Scrivi_N_file(struct spettro *pt, char *name, double *g, double *N) {
     if (pt->WRITE_TO_FILE==1){
             fp_distr = fopen(f_distr, "w");
             if (fp_distr == NULL) {
-                printf("warning non riesco ad aprire %s\n", f_distr);
-                exit(1);
+                kernel_error(pt, KERNEL_ERROR, "warning non riesco ad aprire %s", f_distr);
+                return;
             }
             distr_e_header(fp_distr);
         
@@ -712,13 +714,15 @@ double N_distr_integranda(struct spettro *pt_N, double Gamma) {
 double N_distr_interp(unsigned long size, double Gamma, double *griglia_gamma, double *N) {
 	unsigned long i;
     double gamma_piu, gamma_meno, Npiu, Nmeno, g, a;
-    i = 0;
-    while (griglia_gamma[i] < Gamma && i < size) {
-        i++;
+
+    //first i such that griglia_gamma[i] >= Gamma, found by bisection
+    if (size < 2 || !(Gamma > griglia_gamma[0] && Gamma <= griglia_gamma[size - 1])) {
+        return 0;
     }
+    i = x_to_grid_index(griglia_gamma, Gamma, size) + 1;
 
     //printf("G=%e G_file=%e\n",pt->griglia_gamma_Ne_log[i],G_File[count]);
-    if (i > 0 && i < size && N[i] > 0 && N[i - 1] > 0) {
+    if (N[i] > 0 && N[i - 1] > 0) {
         gamma_piu = log10(griglia_gamma[i]);
         gamma_meno = log10(griglia_gamma[i - 1]);
         Npiu = log10(N[i]);
@@ -0,0 +1,52 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <stdarg.h>
+#include <setjmp.h>
+#include <string.h>
+#include "Blazar_SED.h"
+
+
+//========================
+//KERNEL ERRORS
+//========================
+// Errors are stored in the blob (error_code, error_msg), instead of
+// terminating the process.
+// If the blob has a jump buffer set by kernel_error_enter (this is done by
+// the Python wrappers, see jetkernel.i), kernel_error jumps back to the
+// caller, that raises a Python exception; otherwise kernel_error returns,
+// and the function reporting the error has to return as well.
+
+
+
+void kernel_error(struct spettro *pt, int error_code, const char *fmt, ...){
+    va_list args;
+
+    va_start(args, fmt);
+    vsnprintf(pt->error_msg, static_error_msg_max_length, fmt, args);
+    va_end(args);
+    pt->error_code = error_code;
+
+    if (pt->error_jmp_env != NULL){
+        longjmp(*((jmp_buf *) pt->error_jmp_env), error_code);
+    }
+}
+
+
+
+void * kernel_error_enter(struct spettro *pt, void * jmp_env){
+    // clears the error state and sets the jump buffer
+    // returns the previous jump buffer, to be restored by kernel_error_exit
+    void * prev_jmp_env;
+
+    prev_jmp_env = pt->error_jmp_env;
+    pt->error_code = 0;
+    pt->error_msg[0] = '\0';
+    pt->error_jmp_env = jmp_env;
+    return prev_jmp_env;
+}
+
+
+
+void kernel_error_exit(struct spettro *pt, void * prev_jmp_env){
+    pt->error_jmp_env = prev_jmp_env;
+}
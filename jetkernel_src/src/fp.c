@@ -144,8 +144,9 @@ void Wm(double wm, double *WP, double *WM){
 		*WM=*WP-wm;
 	}
 	else {
-		printf("something wrong in Wm\n");
-		exit(0);
+		// wm is NaN, propagated to the caller
+		*WP=wm;
+		*WM=wm;
 	}
 	return ;
 }
@@ -23,18 +23,64 @@ void build_log_grid(double nu_start, double nu_stop, unsigned long SIZE, double
 }
 
 unsigned long x_to_grid_index(double * nu_grid, double nu, unsigned long SIZE){
-	unsigned long I=0;
-	while (!(nu >= nu_grid[I] && nu <=nu_grid[I + 1] ) && (I<SIZE)){
-		I++;
+	// bisection on a monotonically increasing grid
+	// returns the first I such that nu_grid[I] <= nu <= nu_grid[I+1]
+	// or -1 if nu is outside the grid
+	unsigned long I_low,I_up,I_mid;
+
+	if (SIZE<2 || !(nu >= nu_grid[0] && nu <= nu_grid[SIZE-1])){
+		return -1;
 	}
 
-	if (I==SIZE){
-		I=-1;
+	I_low=1;
+	I_up=SIZE-1;
+	while (I_low<I_up){
+		I_mid=(I_low+I_up)/2;
+		if (nu_grid[I_mid]>=nu){
+			I_up=I_mid;
+		}
+		else{
+			I_low=I_mid+1;
+		}
 	}
 
-	return I;
+	return I_low-1;
 }
 
+unsigned long x_to_grid_index_guess(double * nu_grid, double nu, double guess, unsigned long SIZE){
+	// same as x_to_grid_index, but starting from a guess of the
+	// (fractional) position of nu in the grid, that for grids with a
+	// constant step is exact up to rounding.
+	// falls back to bisection if the guess is wrong by more than one bin
+	unsigned long I;
+
+	if (SIZE<2 || !(nu >= nu_grid[0] && nu <= nu_grid[SIZE-1])){
+		return -1;
+	}
+
+	if (guess>=0 && guess<(double)(SIZE-1)){
+		I=(unsigned long) guess;
+
+		if (I>0 && nu_grid[I]>=nu){
+			I--;
+		}
+		else if (I<SIZE-2 && nu_grid[I+1]<nu){
+			I++;
+		}
+
+		if (nu_grid[I+1]>=nu && (I==0 || nu_grid[I]<nu)){
+			return I;
+		}
+	}
+
+	return x_to_grid_index(nu_grid, nu, SIZE);
+}
+
+unsigned long x_to_log_grid_index(double * log_nu_grid, double log_nu, double log_nu_start, double log_nu_step, unsigned long SIZE){
+	// grid with constant step in log, as built by build_log_grid,
+	// the index is computed directly from the start and the step
+	return x_to_grid_index_guess(log_nu_grid, log_nu, (log_nu - log_nu_start)/log_nu_step, SIZE);
+}
 
 
 
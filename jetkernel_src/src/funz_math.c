@@ -7,6 +7,7 @@
 #include <math.h>
 #include <string.h>
 #include <unistd.h>
+#include <pthread.h>
 //#include "libmia.h"
 #include "Blazar_SED.h"
 #include "nrutil.h"
@@ -28,21 +29,26 @@
 
 double st_gamma(double z)
 {
+  // Lanczos-Spouge coefficients for a=12:
+  // c[0]=sqrt(2 pi), c[k]=exp(a-k)*(a-k)^(k-0.5)/((k-1)!*(-1)^(k-1))
   const int a = 12;
-  static double c_space[12];
-  static double *c = NULL;
+  static const double c[12] = {
+    2.5066282746310002,
+    198580.06271387744,
+    -696538.00715380232,
+    984524.69720040914,
+    -719481.38054635748,
+    290262.75410926092,
+    -64035.016015929323,
+    7201.8644207650377,
+    -354.97463894564885,
+    5.6610056376747284,
+    -0.01474384952133102,
+    7.4908560087605962e-07
+  };
   int k;
   double accm;
 
-  if ( c == NULL ) {
-    double k1_factrl = 1.0; /* (k - 1)!*(-1)^k with 0!==1*/
-    c = c_space;
-    c[0] = sqrt(2.0*M_PI);
-    for(k=1; k < a; k++) {
-      c[k] = exp(a-k) * pow(a-k, k-0.5) / k1_factrl;
-	  k1_factrl *= -k;
-    }
-  }
   accm = c[0];
   for(k=1; k < a; k++) {
     accm += c[k] / ( z + k );
@@ -61,16 +67,25 @@ double st_gamma(double z)
 double bessel_K_53(struct spettro *pt, double x) {
     double ri, rip, rkp, ord, a;
     ord = 5.0 / 3.0;
-    bessik(x, ord, &ri, &a, &rip, &rkp);
+    if (bessik(x, ord, &ri, &a, &rip, &rkp)) {
+        kernel_error(pt, KERNEL_ERROR, "bessik failed for x=%e nu=%e", x, ord);
+        return 0.0;
+    }
     return a;
 }
 
 double bessel_K_pitch_ave(struct spettro *pt, double x) {
     double ri, rip, rkp, ord, a, K_43,K_13;
     ord = 4.0 / 3.0;
-    bessik(x, ord, &ri, &K_43, &rip, &rkp);
+    if (bessik(x, ord, &ri, &K_43, &rip, &rkp)) {
+        kernel_error(pt, KERNEL_ERROR, "bessik failed for x=%e nu=%e", x, ord);
+        return 0.0;
+    }
     ord = 1.0 / 3.0;
-    bessik(x, ord, &ri, &K_13, &rip, &rkp);
+    if (bessik(x, ord, &ri, &K_13, &rip, &rkp)) {
+        kernel_error(pt, KERNEL_ERROR, "bessik failed for x=%e nu=%e", x, ord);
+        return 0.0;
+    }
     a=(K_43*K_13 - 0.6*x*(K_43*K_43 - K_13*K_13));
 
     return a;
@@ -84,7 +99,7 @@ double bessel_K_pitch_ave(struct spettro *pt, double x) {
 // funzione che costruisce la tabelle delle funz. di Bessel
 //===================================================
 
-void tabella_Bessel(struct spettro *pt_TB) {
+static void build_bessel_table(struct spettro *pt_TB, struct bessel_table *TB) {
     double a, t_Bessel;
     double ri, rip, rkp, K13, K43;
     char in_x[80], in_y[80], in_ave_y[80], in_ave_x[80];
@@ -98,25 +113,25 @@ void tabella_Bessel(struct spettro *pt_TB) {
     if (pt_TB->verbose>0) {
     	printf("Evaluation of Bessel Tables\n");
     }
-	//printf("start=%e\n", pt_TB->x_Bessel_min = (pt_TB->nu_start_Sync) /
+	//printf("start=%e\n", TB->x_Bessel_min = (pt_TB->nu_start_Sync) /
 	//	((3.0 * pt_TB->nu_B * (pt_TB->gmax_griglia * pt_TB->gmax_griglia) / 2.0) * pt_TB->sin_psi));
-	//printf("stop=%e\n", pt_TB->x_Bessel_max = (pt_TB->nu_stop_Sync) /
+	//printf("stop=%e\n", TB->x_Bessel_max = (pt_TB->nu_stop_Sync) /
 	//	((3.0 * pt_TB->nu_B * (pt_TB->gmin_griglia * pt_TB->gmin_griglia) / 2.0) * pt_TB->sin_psi));
     //}
-    pt_TB->x_Bessel_min = 1E-17;
-    pt_TB->x_Bessel_max = 7.2E2;
+    TB->x_Bessel_min = 1E-17;
+    TB->x_Bessel_max = 7.2E2;
 
-    pt_TB->x_ave_Bessel_min = 1E-16;
-    pt_TB->x_ave_Bessel_max = 3.5E2;
+    TB->x_ave_Bessel_min = 1E-16;
+    TB->x_ave_Bessel_max = 3.5E2;
 
-    pt_TB->log_x_Bessel_min = log10(pt_TB->x_Bessel_min);
-    pt_TB->log_x_Bessel_max = log10(pt_TB->x_Bessel_max);
+    TB->log_x_Bessel_min = log10(TB->x_Bessel_min);
+    TB->log_x_Bessel_max = log10(TB->x_Bessel_max);
     
 
-    pt_TB->log_x_ave_Bessel_min = log10(pt_TB->x_ave_Bessel_min);
-    pt_TB->log_x_ave_Bessel_max = log10(pt_TB->x_ave_Bessel_max);
+    TB->log_x_ave_Bessel_min = log10(TB->x_ave_Bessel_min);
+    TB->log_x_ave_Bessel_max = log10(TB->x_ave_Bessel_max);
 
-    //if(pt_TB->x_Bessel_max>Bessel_MAX)pt_TB->x_Bessel_max=Bessel_MAX;
+    //if(TB->x_Bessel_max>Bessel_MAX)TB->x_Bessel_max=Bessel_MAX;
     pf = &bessel_K_53;
     //printf("SYSPATH =%s\n", pt_TB->SYSPATH);
     //return;
@@ -127,16 +142,16 @@ void tabella_Bessel(struct spettro *pt_TB) {
     sprintf(f_bessel_file, "%s/F_Sync.dat",  pt_TB->SYSPATH);
     if (pt_TB->verbose>1) {
 	//printf("gmax_griglia=%e -> x/xc_min=%e    gmin_griglia=%e -> x/xc_max=%e\n",
-    //        pt_TB->gmax_griglia, pt_TB->x_Bessel_min,
-     //       pt_TB->gmin_griglia, pt_TB->x_Bessel_max);
+    //        pt_TB->gmax_griglia, TB->x_Bessel_min,
+     //       pt_TB->gmin_griglia, TB->x_Bessel_max);
     	printf("Bessel Tables  in  file: %s\n", f_bessel_file);
     }
 
 
     fp = fopen(f_bessel_file, "r");
 
-	build_log_grid( pt_TB->x_Bessel_min,  pt_TB->x_Bessel_max, static_bess_table_size,  pt_TB->F_Sync_x);
-	build_log_grid( pt_TB->x_ave_Bessel_min,  pt_TB->x_ave_Bessel_max, static_bess_table_size, pt_TB->F_ave_Sync_x);
+	build_log_grid( TB->x_Bessel_min,  TB->x_Bessel_max, static_bess_table_size,  TB->F_Sync_x);
+	build_log_grid( TB->x_ave_Bessel_min,  TB->x_ave_Bessel_max, static_bess_table_size, TB->F_ave_Sync_x);
 
     if (fp == NULL ) {
         //fclose(fp);
@@ -148,30 +163,32 @@ void tabella_Bessel(struct spettro *pt_TB) {
 
         
         for (i = 0; i < static_bess_table_size; i++) {
-            //x = pt_TB->x_Bessel_min *
-            //        pow((pt_TB->x_Bessel_max / pt_TB->x_Bessel_min),
+            //x = TB->x_Bessel_min *
+            //        pow((TB->x_Bessel_max / TB->x_Bessel_min),
             //        ((double) i) / ((double) elementi_tabelle - 1.0));
            
-            //pt_TB->F_Sync_x[i] = x;
-            pt_TB->F_Sync_y[i]= pt_TB->F_Sync_x[i] * integrale_trap_log_struct(pf, pt_TB, pt_TB->F_Sync_x[i], 1000, 1000);
-            pt_TB->log_F_Sync_x[i] = log10(pt_TB->F_Sync_x[i]);
-            if (pt_TB->F_Sync_y[i]>0.0){
-            	pt_TB->log_F_Sync_y[i] = log10(pt_TB->F_Sync_y[i]);
+            //TB->F_Sync_x[i] = x;
+            TB->F_Sync_y[i]= TB->F_Sync_x[i] * integrale_trap_log_struct(pf, pt_TB, TB->F_Sync_x[i], 1000, 1000);
+            TB->log_F_Sync_x[i] = log10(TB->F_Sync_x[i]);
+            if (TB->F_Sync_y[i]>0.0){
+            	TB->log_F_Sync_y[i] = log10(TB->F_Sync_y[i]);
             }
             else{
-            	pt_TB->log_F_Sync_y[i] = -300.0;
+            	TB->log_F_Sync_y[i] = -300.0;
             }
-            //pt_TB->F_ave_Sync_x[i] = x;
-            pt_TB->F_ave_Sync_y[i]= pt_TB->F_ave_Sync_x[i] *pt_TB->F_ave_Sync_x[i]*  bessel_K_pitch_ave(pt_TB,  pt_TB->F_ave_Sync_x[i]);
-            pt_TB->log_F_ave_Sync_x[i] = log10(pt_TB->F_ave_Sync_x[i]);
-            if(pt_TB->F_ave_Sync_y[i]>0.0){
-            	pt_TB->log_F_ave_Sync_y[i] = log10(pt_TB->F_ave_Sync_y[i]);
+            //TB->F_ave_Sync_x[i] = x;
+            TB->F_ave_Sync_y[i]= TB->F_ave_Sync_x[i] *TB->F_ave_Sync_x[i]*  bessel_K_pitch_ave(pt_TB,  TB->F_ave_Sync_x[i]);
+            TB->log_F_ave_Sync_x[i] = log10(TB->F_ave_Sync_x[i]);
+            if(TB->F_ave_Sync_y[i]>0.0){
+            	TB->log_F_ave_Sync_y[i] = log10(TB->F_ave_Sync_y[i]);
             }
             else{
-            	pt_TB->log_F_ave_Sync_y[i]=-300.0;
+            	TB->log_F_ave_Sync_y[i]=-300.0;
+            }
+            if (fp != NULL) {
+                fprintf(fp, "%e %e %e %e\n",
+                		TB->F_Sync_x[i] , TB->F_Sync_y[i] , TB->F_ave_Sync_x[i], TB->F_ave_Sync_y[i]);
             }
-            fprintf(fp, "%e %e %e %e\n",
-            		pt_TB->F_Sync_x[i] , pt_TB->F_Sync_y[i] , pt_TB->F_ave_Sync_x[i], pt_TB->F_ave_Sync_y[i]);
             
             //printf("i=%d i_max=%d x=%e F(x)=%e\n",i,elementi_tabelle,x,pt_TB->tabella_F[i][1]);
                
@@ -184,29 +201,34 @@ void tabella_Bessel(struct spettro *pt_TB) {
 
         }
         while (!feof(fp)) {
+            if (i == static_bess_table_size) {
+                //too many lines
+                i++;
+                break;
+            }
             fscanf(fp, "%s %s %s %s\n", in_x, in_y,in_ave_x,in_ave_y);
-            pt_TB->F_Sync_x[i] = strtod(in_x, NULL);
-            pt_TB->F_Sync_y[i] = strtod(in_y, NULL);
+            TB->F_Sync_x[i] = strtod(in_x, NULL);
+            TB->F_Sync_y[i] = strtod(in_y, NULL);
 
-            pt_TB->F_ave_Sync_x[i] = strtod(in_ave_x, NULL);
-            pt_TB->F_ave_Sync_y[i] = strtod(in_ave_y, NULL);
+            TB->F_ave_Sync_x[i] = strtod(in_ave_x, NULL);
+            TB->F_ave_Sync_y[i] = strtod(in_ave_y, NULL);
 
-            pt_TB->log_F_Sync_x[i] = log10(pt_TB->F_Sync_x[i]);
+            TB->log_F_Sync_x[i] = log10(TB->F_Sync_x[i]);
 
-            if (pt_TB->F_Sync_y[i]>0.0){
-            	pt_TB->log_F_Sync_y[i] = log10(pt_TB->F_Sync_y[i]);
+            if (TB->F_Sync_y[i]>0.0){
+            	TB->log_F_Sync_y[i] = log10(TB->F_Sync_y[i]);
             }
             else{
-            	pt_TB->log_F_Sync_y[i] = -300.0;
+            	TB->log_F_Sync_y[i] = -300.0;
             }
 
-            pt_TB->log_F_ave_Sync_x[i] =log10(pt_TB->F_ave_Sync_x[i]);
+            TB->log_F_ave_Sync_x[i] =log10(TB->F_ave_Sync_x[i]);
 
-            if(pt_TB->F_ave_Sync_y[i]>0.0){
-            	pt_TB->log_F_ave_Sync_y[i] = log10(pt_TB->F_ave_Sync_y[i]);
+            if(TB->F_ave_Sync_y[i]>0.0){
+            	TB->log_F_ave_Sync_y[i] = log10(TB->F_ave_Sync_y[i]);
             }
             else{
-            	pt_TB->log_F_ave_Sync_y[i]=-300.0;
+            	TB->log_F_ave_Sync_y[i]=-300.0;
             }
 
             //printf("i=%d i_max=%d x=%e F(x)=%e\n",
@@ -217,20 +239,61 @@ void tabella_Bessel(struct spettro *pt_TB) {
         i--;
 
         if ((i != static_bess_table_size - 1) ||
-                (pt_TB->F_Sync_x[0] != pt_TB->x_Bessel_min) ||
-                (pt_TB->F_Sync_x[static_bess_table_size - 1] != pt_TB->x_Bessel_max)
+                (TB->F_Sync_x[0] != TB->x_Bessel_min) ||
+                (TB->F_Sync_x[static_bess_table_size - 1] != TB->x_Bessel_max)
                 ) {
             printf("i_max=%d elementi_tabelle=%d \n", i, static_bess_table_size);
-            printf("F_Sync_x min=%e, %e\n", pt_TB->F_Sync_x[0], pt_TB->x_Bessel_min);
-            printf("F_Sync_x max=%e, %e\n", pt_TB->F_Sync_x[static_bess_table_size - 1], pt_TB->x_Bessel_max);
-            printf("file %s not valid!!!!!!!!!!!!!!!!\n",f_bessel_file);
-            printf("delete it and re-execute the code\n");
-            exit(0);
+            printf("F_Sync_x min=%e, %e\n", TB->F_Sync_x[0], TB->x_Bessel_min);
+            printf("F_Sync_x max=%e, %e\n", TB->F_Sync_x[static_bess_table_size - 1], TB->x_Bessel_max);
+            fclose(fp);
+            kernel_error(pt_TB, KERNEL_ERROR, "file %s not valid, delete it and re-execute the code", f_bessel_file);
+            return;
         }
     }
     
-    fclose(fp);
-    pt_TB->BESSEL_TABLE_DONE=1;
+    if (fp != NULL) {
+        fclose(fp);
+    }
+}
+
+
+
+//===================================================
+// tabelle di Bessel condivise
+//===================================================
+// The Bessel tables do not depend on the blob parameters, so they are built
+// (or read from F_Sync.dat) once per process, and all the blobs point to the
+// same read-only table. Processes forked after the first Init share it too.
+
+static struct bessel_table shared_bessel_table;
+static int shared_bessel_table_done = 0;
+static pthread_mutex_t shared_bessel_table_lock = PTHREAD_MUTEX_INITIALIZER;
+
+void tabella_Bessel(struct spettro *pt_TB) {
+    void * prev_jmp_env;
+    char error_msg[static_error_msg_max_length];
+
+    // no jumps while the lock is held, errors are raised after unlocking
+    prev_jmp_env = pt_TB->error_jmp_env;
+    pt_TB->error_jmp_env = NULL;
+
+    pthread_mutex_lock(&shared_bessel_table_lock);
+    if (shared_bessel_table_done == 0) {
+        build_bessel_table(pt_TB, &shared_bessel_table);
+        if (pt_TB->error_code == 0) {
+            shared_bessel_table_done = 1;
+        }
+    }
+    pthread_mutex_unlock(&shared_bessel_table_lock);
+
+    pt_TB->error_jmp_env = prev_jmp_env;
+    if (pt_TB->error_code != 0) {
+        strcpy(error_msg, pt_TB->error_msg);
+        kernel_error(pt_TB, pt_TB->error_code, "%s", error_msg);
+        return;
+    }
+    pt_TB->bessel_table = &shared_bessel_table;
+    pt_TB->BESSEL_TABLE_DONE = 1;
 }
 //=========================================================================================
 
@@ -272,9 +335,11 @@ double log_lin_interp(double x,  double * x_grid, double x_min, double x_max, do
 //LOG-LOG INTERPOLATION
 //=====================================================================
 double log_log_interp(double log_x,  double * log_x_grid, double log_x_min, double log_x_max, double *  log_y_grid , unsigned long SIZE, double emiss_lim){
+	//log_x_grid is expected to have a constant step between log_x_min and log_x_max
+	//(as the Bessel tables), if not the index is found by bisection
 	unsigned long ID;
 	double y1,y2,x1,x2,a_c;
-	ID=x_to_grid_index(log_x_grid,  log_x,   SIZE);
+	ID=x_to_log_grid_index(log_x_grid,  log_x, log_x_min, (log_x_max-log_x_min)/(double)(SIZE-1),  SIZE);
 
 	if (ID<0 || ID>SIZE-2){
 		return emiss_lim;
@@ -505,7 +570,8 @@ double derivata(double (*pf) (struct spettro *, double x), struct spettro *pt_d,
 //
 //==========================================================
 
-void bessik(double x, double xnu, double *ri, double *rk, double *rip, double *rkp) {
+int bessik(double x, double xnu, double *ri, double *rk, double *rip, double *rkp) {
+    // returns 0 on success, 1 on bad arguments or failed convergence
 
     double EPS;
     double FPMIN;
@@ -528,8 +594,7 @@ void bessik(double x, double xnu, double *ri, double *rk, double *rip, double *r
     XMIN = 2.0;
 
     if (x <= 0.0 || xnu < 0.0) {
-    	printf("NRERROR bad arguments in bessik");
-    	exit(0);
+    	return 1;
     }
     nl = (int) (xnu + 0.5);
     xmu = xnu - nl;
@@ -551,8 +616,7 @@ void bessik(double x, double xnu, double *ri, double *rk, double *rip, double *r
     }
     if (i > MAXIT){
 
-    	printf("x too large in bessik; try asymptotic expansion");
-    	exit(0);
+    	return 1;
     }
     ril = FPMIN;
     ripl = h*ril;
@@ -594,8 +658,7 @@ void bessik(double x, double xnu, double *ri, double *rk, double *rip, double *r
             if (fabs(del) < fabs(sum) * EPS) break;
         }
         if (i > MAXIT){
-        	printf("bessk series failed to converge");
-        	exit(0);
+        	return 1;
         }
         rkmu = sum;
         rk1 = sum1*xi2;
@@ -626,8 +689,7 @@ void bessik(double x, double xnu, double *ri, double *rk, double *rip, double *r
         }
         if (i > MAXIT){
 
-        	printf("bessik: failure to converge in cf2");
-        	exit(0);
+        	return 1;
         }
         h = a1*h;
         rkmu = sqrt(pi / (2.0 * x)) * exp(-x) / s;
@@ -644,6 +706,7 @@ void bessik(double x, double xnu, double *ri, double *rk, double *rip, double *r
     }
     *rk = rkmu;
     *rkp = xnu * xi * rkmu - rk1;
+    return 0;
 }
 
 /* (C) Copr. 1986-92 Numerical Recipes Software !'K4$<%#110L&")|oV'4. */
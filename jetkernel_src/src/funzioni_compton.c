@@ -8,6 +8,7 @@
 #include <math.h>
 #include <string.h>
 #include <unistd.h>
+#include <pthread.h>
 //#include "libmia.h"
 #include "Blazar_SED.h"
 /**
@@ -36,6 +37,7 @@ double rate_compton_GR(struct spettro *pt_GR) {
     double nu_1_original;
     int i;
     pf_K = &f_compton_K1;
+    pt_GR->profile.n_IC_rate++;
 
 
 
@@ -372,9 +374,13 @@ double f_compton_K1(struct spettro *pt_K1, double g) {
 
             cost = pt_K1->COST_IC_K1 / ((g2) * pt_K1->nu_compton_0);
 
-            a = 2.0 * k * log(k) ;
+            if (pt_K1->do_IC == 2) {
+                a = KN_bracket_tab(pt_K1, k);
+            } else {
+                a = 2.0 * k * log(k) ;
 
-            a = a + (1+2*k)*(1-k);
+                a = a + (1+2*k)*(1-k);
+            }
 
 
             c = 0.5*(1-k)*(Gamma_e*k)*(Gamma_e*k)/(1+4.0*k*Gamma_e);
@@ -428,6 +434,118 @@ double f_compton_K1(struct spettro *pt_K1, double g) {
 }
 //=========================================================================================
 
+//=========================================================================================
+// Tabulated KN kernel (do_IC=2)
+// the only transcendental term of the bracket in f_compton_K1 is
+// A(k)=2*k*ln(k)+(1+2*k)*(1-k), k in (0,1], that is tabulated on a uniform
+// grid of static_KN_table_size points and linearly interpolated.
+// The Gamma_e dependent term is rational and is evaluated exactly.
+// The interpolation error is largest close to k=0, where A''(k)=2/k-4,
+// and close to k=1, where A(k)->0. The relative error on the kernel is
+// < 3E-4 for any (k,Gamma_e), and < 2E-5 for 0.01<k<0.999.
+// On the integrated SSC/EC spectra the relative error is ~1E-6
+// As the Bessel tables, the table is built once per process and shared
+// read-only by all the blobs
+//=========================================================================================
+static double shared_KN_A_table[static_KN_table_size];
+static int shared_KN_table_done = 0;
+static pthread_mutex_t shared_KN_table_lock = PTHREAD_MUTEX_INITIALIZER;
+
+void tabella_KN(struct spettro *pt) {
+    unsigned long i;
+    double k;
+
+    pthread_mutex_lock(&shared_KN_table_lock);
+    if (shared_KN_table_done == 0) {
+        shared_KN_A_table[0] = 1.0;
+        for (i = 1; i < static_KN_table_size; i++) {
+            k = (double) i / (double) (static_KN_table_size - 1);
+            shared_KN_A_table[i] = 2.0 * k * log(k) + (1 + 2 * k)*(1 - k);
+        }
+        shared_KN_table_done = 1;
+    }
+    pthread_mutex_unlock(&shared_KN_table_lock);
+
+    pt->KN_A_table = shared_KN_A_table;
+    pt->KN_TABLE_DONE = 1;
+}
+
+double KN_bracket_tab(struct spettro *pt, double k) {
+    double x;
+    unsigned long j;
+
+    pt->profile.n_interp++;
+    x = k * (double) (static_KN_table_size - 1);
+    j = (unsigned long) x;
+    if (j > static_KN_table_size - 2) {
+        j = static_KN_table_size - 2;
+    }
+    x -= (double) j;
+    return pt->KN_A_table[j] + x * (pt->KN_A_table[j + 1] - pt->KN_A_table[j]);
+}
+//=========================================================================================
+
+//=========================================================================================
+// f_compton_K1 with the tabulated bracket term, and with the terms depending
+// only on nu_compton_0 and nu_1 passed by the caller
+//=========================================================================================
+static inline double KN_tab_rate(struct spettro *pt, double g, double nu_0, double nu_1,
+        double epsilon_1, double four_epsilon_0, double cost_0) {
+    double g2, k, Gamma_e_k, rate;
+
+    g2 = g * g;
+    rate = 0.0;
+    if (nu_1 >= nu_0 && nu_1 * (1.0 + four_epsilon_0 * g) <= 4.0 * nu_0 * g2) {
+        k = nu_1 / (nu_0 * 4.0 * (g2 - g * epsilon_1));
+        if (k > 1.0 / (4 * g2) && k <= 1) {
+            Gamma_e_k = four_epsilon_0 * g * k;
+            rate = KN_bracket_tab(pt, k);
+            rate += 0.5 * (1 - k) * Gamma_e_k * Gamma_e_k / (1 + 4.0 * Gamma_e_k);
+            rate *= cost_0 / g2;
+        }
+    }
+    return rate;
+}
+
+//=========================================================================================
+// Simpson integral over the gamma grid of f_compton_K1*Ne_IC, for the
+// tabulated kernel, starting from the grid index i_start.
+// Same integration scheme as in integrale_IC, with the terms depending only
+// on nu_compton_0 and nu_1 evaluated once
+//=========================================================================================
+double integrale_IC_gamma_tab(struct spettro *pt, unsigned long i_start) {
+    double nu_0, nu_1, epsilon_1, four_epsilon_0, cost_0;
+    double integr_gamma, g, g1, g3, y_g1, y_g2, y_g3;
+    unsigned long i;
+
+    nu_0 = pt->nu_compton_0;
+    nu_1 = pt->nu_1;
+    epsilon_1 = HPLANCK * nu_1 * one_by_MEC2;
+    four_epsilon_0 = 4.0 * HPLANCK * nu_0 * one_by_MEC2;
+    cost_0 = pt->COST_IC_K1 / nu_0;
+
+    integr_gamma = 0.0;
+    g1 = pt->griglia_gamma_Ne_log_IC[i_start];
+    y_g1 = KN_tab_rate(pt, g1, nu_0, nu_1, epsilon_1, four_epsilon_0, cost_0) * pt->Ne_IC[i_start];
+    for (i = i_start + 1; i < pt->gamma_grid_size - 1; i += 2) {
+        g = pt->griglia_gamma_Ne_log_IC[i];
+        y_g2 = KN_tab_rate(pt, g, nu_0, nu_1, epsilon_1, four_epsilon_0, cost_0) * pt->Ne_IC[i];
+
+        g3 = pt->griglia_gamma_Ne_log_IC[i + 1];
+        y_g3 = KN_tab_rate(pt, g3, nu_0, nu_1, epsilon_1, four_epsilon_0, cost_0) * pt->Ne_IC[i + 1];
+
+        integr_gamma += (g3 - g1)*(y_g1 + 4.0 * y_g2 + y_g3);
+
+        y_g1 = y_g3;
+        g1 = g3;
+    }
+    //the integrand is evaluated at the indices i_start,...,i-1
+    pt->profile.n_IC_integrand += i - i_start;
+
+    return integr_gamma;
+}
+//=========================================================================================
+
 void set_N_distr_for_Compton(struct spettro * pt, double nu_in, double nu_out, int stat_frame)
 {
     double epsilon_0, epsilon_1, g_min_BG;
@@ -451,6 +569,49 @@ void set_N_distr_for_Compton(struct spettro * pt, double nu_in, double nu_out, i
     }
 }
 
+//=========================================================================================
+// Even index of the gamma grid from which the Simpson integration in
+// integrale_IC has to start.
+// f_compton_K1 is not null only for k<=1, i.e. for
+// g >= g_lim = 0.5*epsilon_1*(1+sqrt(1+1/(epsilon_1*epsilon_0)))
+// and every Simpson triplet (2m,2m+1,2m+2) with all the points below g_lim
+// contributes exactly 0. The limit is lowered by a small safety margin,
+// so that the skipped triplets never include a non-null point.
+// If the whole grid is below g_lim, the last triplet is returned.
+//=========================================================================================
+unsigned long IC_gamma_start_index(struct spettro *pt) {
+    double epsilon_0, epsilon_1, g_lim;
+    unsigned long I, size;
+
+    size = pt->gamma_grid_size;
+    if (pt->nu_1 < pt->nu_compton_0 || size < 3) {
+        return 0;
+    }
+    epsilon_0 = HPLANCK * pt->nu_compton_0 * one_by_MEC2;
+    epsilon_1 = HPLANCK * pt->nu_1 * one_by_MEC2;
+    g_lim = 0.5 * epsilon_1 * (1.0 + sqrt(1.0 + (1.0 / (epsilon_1 * epsilon_0))));
+    g_lim *= (1.0 - 1E-6);
+
+    if (g_lim <= pt->griglia_gamma_Ne_log_IC[1]) {
+        return 0;
+    }
+    if (g_lim > pt->griglia_gamma_Ne_log_IC[size - 1]) {
+        I = size - 1;
+    } else {
+        //grid[I] <= g_lim <= grid[I+1], with I>=1
+        I = x_to_grid_index(pt->griglia_gamma_Ne_log_IC, g_lim, size);
+    }
+    //the point I-1 is strictly below g_lim
+    I = I - 1;
+    I = I - (I % 2);
+    //the Simpson loop needs a full triplet
+    if (I + 2 > size - 1) {
+        I = (size - 3) - ((size - 3) % 2);
+    }
+    return I;
+}
+//=========================================================================================
+
 //=========================================================================================
 // INTEGRAZIONE SSC TRAPEZOIDALE/METODO DI SIMPSON E GRIGLIA EQUI-LOG
 // TEST MODIFICO INTERFACCIA
@@ -462,7 +623,7 @@ double integrale_IC(double (*pf) (struct spettro *, double x), struct spettro *
     double nu1, nu2, integr_gamma, integr_nu;
     double g3, g1, y_g1, y_g2, y_g3, y_nu1, y_nu2, g;
     double delta_g, delta_nu;
-    unsigned long i;
+    unsigned long i, i_start;
     double (*pf_K1) (struct spettro *, double x);
 
     pf_K1 = &f_compton_K1;
@@ -502,7 +663,6 @@ double integrale_IC(double (*pf) (struct spettro *, double x), struct spettro *
 
         integr_gamma = 0.0;
 
-        g1 = pt->griglia_gamma_Ne_log_IC[0];
         pt->nu_compton_0 = pt->nu_seed[i];
 
         if (pt->adaptive_e_binning ==1){
@@ -510,28 +670,40 @@ double integrale_IC(double (*pf) (struct spettro *, double x), struct spettro *
             //the actual nu_seed value
             set_N_distr_for_Compton(pt, pt->nu_compton_0, pt->nu_1, stat_frame);
         }
-        
-        y_g1 = f_compton_K1(pt, g1) * pt->Ne_IC[0];
 
+        //the Simpson triplets below the kinematic limit
+        //only add zeros, and are skipped
+        i_start = IC_gamma_start_index(pt);
+
+        if (pt->do_IC == 2) {
+            integr_gamma = integrale_IC_gamma_tab(pt, i_start);
+        } else {
 
+            g1 = pt->griglia_gamma_Ne_log_IC[i_start];
+            y_g1 = f_compton_K1(pt, g1) * pt->Ne_IC[i_start];
 
-        for (pt->i_griglia_gamma = 1; pt->i_griglia_gamma < pt->gamma_grid_size - 1; pt->i_griglia_gamma++) {
 
 
+            for (pt->i_griglia_gamma = i_start + 1; pt->i_griglia_gamma < pt->gamma_grid_size - 1; pt->i_griglia_gamma++) {
 
-            y_g2 = f_compton_K1(pt, pt->griglia_gamma_Ne_log_IC[pt->i_griglia_gamma]) * pt->Ne_IC[pt->i_griglia_gamma];
 
-            pt->i_griglia_gamma++;
-            g3 = pt->griglia_gamma_Ne_log_IC[pt->i_griglia_gamma];
-            y_g3 = f_compton_K1(pt, g3) * pt->Ne_IC[pt->i_griglia_gamma];
 
-            delta_g = (g3 - g1);
-            integr_gamma += (delta_g)*(y_g1 + 4.0 * y_g2 + y_g3);
+                y_g2 = f_compton_K1(pt, pt->griglia_gamma_Ne_log_IC[pt->i_griglia_gamma]) * pt->Ne_IC[pt->i_griglia_gamma];
 
-            y_g1 = y_g3;
-            g1 = g3;
+                pt->i_griglia_gamma++;
+                g3 = pt->griglia_gamma_Ne_log_IC[pt->i_griglia_gamma];
+                y_g3 = f_compton_K1(pt, g3) * pt->Ne_IC[pt->i_griglia_gamma];
 
+                delta_g = (g3 - g1);
+                integr_gamma += (delta_g)*(y_g1 + 4.0 * y_g2 + y_g3);
 
+                y_g1 = y_g3;
+                g1 = g3;
+
+
+            }
+            //the integrand is evaluated at the indices i_start,...,i_griglia_gamma-1
+            pt->profile.n_IC_integrand += pt->i_griglia_gamma - i_start;
         }
 
 
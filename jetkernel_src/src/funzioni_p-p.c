@@ -121,7 +121,7 @@ double pp_electron_kernel_delta(double Ee_TeV, struct spettro *pt) {
     Ep_TeV = Ee_TeV / (Kpp_e) + MPC2_TeV;
     gamma_p = Ep_TeV / MPC2_TeV;
     qe = pt->pp_racc_elec / (Kpp_e) * sigma_pp_inel(Ep_TeV)*
-            N_distr_interp(pt, gamma_p, pt->griglia_gamma_Np_log, pt->Np);
+            N_distr_interp(pt->gamma_grid_size, gamma_p, pt->griglia_gamma_Np_log, pt->Np);
     //        N_distr(pt,gamma_p);
     return qe;
 }
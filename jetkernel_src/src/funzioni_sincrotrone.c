@@ -25,12 +25,16 @@
 // Sync F(X) log-log interpolation
 //=========================================================================================
 double F_K_53(struct spettro * pt, double x){
-    return log_log_interp(log10(x), pt->log_F_Sync_x, pt->log_x_Bessel_min, pt->log_x_Bessel_max, pt->log_F_Sync_y,static_bess_table_size,0  );
+    struct bessel_table * TB = pt->bessel_table;
+    pt->profile.n_interp++;
+    return log_log_interp(log10(x), TB->log_F_Sync_x, TB->log_x_Bessel_min, TB->log_x_Bessel_max, TB->log_F_Sync_y,static_bess_table_size,0  );
 }
 
 
 double F_K_ave(struct spettro *pt, double x){
-    return log_log_interp(log10(x), pt->log_F_ave_Sync_x, pt->log_x_ave_Bessel_min, pt->log_x_ave_Bessel_max, pt->log_F_ave_Sync_y,static_bess_table_size,0  );
+    struct bessel_table * TB = pt->bessel_table;
+    pt->profile.n_interp++;
+    return log_log_interp(log10(x), TB->log_F_ave_Sync_x, TB->log_x_ave_Bessel_min, TB->log_x_ave_Bessel_max, TB->log_F_ave_Sync_y,static_bess_table_size,0  );
 
 }
 //=========================================================================================
@@ -236,6 +240,8 @@ double integrale_Sync(double (*pf) (struct spettro *, unsigned long  ID), struct
         x1=x3;
         //printf("ID=%d, delta=%e, integr=%e\n",ID,delta,integr);
     }
+    //the integrand is evaluated at the indices 0,...,ID-1
+    pt->profile.n_Sync_integrand += ID;
     if(pt->verbose>2){
         printf("Synch Integr=%e\n", integr);
     }
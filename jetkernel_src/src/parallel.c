@@ -0,0 +1,167 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <math.h>
+#include <string.h>
+#include <unistd.h>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+//#include "libmia.h"
+#include "Blazar_SED.h"
+
+
+//========================
+//PARALLEL FREQUENCY LOOPS
+//========================
+// The per-frequency evaluations in spettro_sincrotrone, spettro_compton and
+// spettro_EC communicate through scratch fields of struct spettro
+// (nu, nu_1, nu_seed, n_seed, nu_compton_0, i_griglia_gamma, Gamma, and the
+// Ne_IC/griglia_gamma_Ne_log_IC buffers).
+// Each thread works on its own copy of the struct (work context), with private
+// IC electron buffers, while all the other arrays are shared read-only.
+// Each frequency is evaluated exactly as in the serial loop, so the results
+// are bit-identical; the outputs are stored in the q/j/alfa arrays passed by
+// the caller, that then runs its serial loop reading the values from them.
+// Without OpenMP, or for n_threads<=1, the serial loops are used.
+// Kernel errors can not jump out of an OpenMP region, so the work contexts
+// have no jump buffer: if any thread reports an error the grid evaluation
+// fails, and the caller falls back to the serial loop, where the same error
+// is raised in the calling thread.
+// The profile counters of the work contexts are added to the blob (see profile.c).
+
+
+
+int get_n_threads(struct spettro *pt){
+#ifdef _OPENMP
+    if (pt->n_threads > 1){
+        return pt->n_threads;
+    }
+#endif
+    return 1;
+}
+
+
+
+struct spettro * make_work_context(struct spettro *pt){
+    struct spettro * pt_ctx;
+    pt_ctx = malloc(sizeof(struct spettro));
+    if (pt_ctx == NULL){
+        return NULL;
+    }
+    memcpy(pt_ctx, pt, sizeof(struct spettro));
+    pt_ctx->error_code = 0;
+    pt_ctx->error_jmp_env = NULL;
+    //the counters are added to the blob at the end of the loop
+    memset(&pt_ctx->profile, 0, sizeof(struct eval_profile));
+    pt_ctx->griglia_gamma_Ne_log_IC = calloc(pt->gamma_grid_size, sizeof (double));
+    pt_ctx->Ne_IC = calloc(pt->gamma_grid_size, sizeof (double));
+    if (pt_ctx->griglia_gamma_Ne_log_IC == NULL || pt_ctx->Ne_IC == NULL){
+        free_work_context(pt_ctx);
+        return NULL;
+    }
+    return pt_ctx;
+}
+
+
+
+void free_work_context(struct spettro *pt_ctx){
+    // only the private buffers are owned by the work context
+    if (pt_ctx != NULL){
+        free(pt_ctx->griglia_gamma_Ne_log_IC);
+        free(pt_ctx->Ne_IC);
+        free(pt_ctx);
+    }
+}
+
+
+
+int eval_Sync_grid(struct spettro *pt, double * j_Sync, double * alfa_Sync){
+    // j_nu_Sync and alfa_nu_Sync for all the nu_Sync in [nu_start_Sync,nu_stop_Sync]
+    // returns 0 if the work contexts can not be allocated, or on kernel errors
+    long NU_INT;
+    int failed;
+
+    failed=0;
+#ifdef _OPENMP
+    #pragma omp parallel num_threads(get_n_threads(pt))
+    {
+        struct spettro * pt_ctx;
+        pt_ctx = make_work_context(pt);
+        if (pt_ctx == NULL){
+            #pragma omp atomic write
+            failed = 1;
+        }
+        #pragma omp for schedule(dynamic)
+        for (NU_INT = 0; NU_INT < (long) pt->nu_seed_size; NU_INT++) {
+            if (pt_ctx != NULL && pt->nu_Sync[NU_INT] <= pt->nu_stop_Sync &&  pt->nu_Sync[NU_INT] >= pt->nu_start_Sync) {
+                pt_ctx->nu = pt->nu_Sync[NU_INT];
+                j_Sync[NU_INT] = j_nu_Sync(pt_ctx);
+                if (pt->do_Sync == 2) {
+                    alfa_Sync[NU_INT] = alfa_nu_Sync(pt_ctx);
+                }
+            }
+        }
+        if (pt_ctx != NULL && pt_ctx->error_code != 0){
+            #pragma omp atomic write
+            failed = 1;
+        }
+        if (pt_ctx != NULL){
+            #pragma omp critical (profile_counters)
+            add_profile_counters(pt, pt_ctx);
+        }
+        free_work_context(pt_ctx);
+    }
+#else
+    failed = 1;
+#endif
+    return !failed;
+}
+
+
+
+int eval_rate_compton_grid(struct spettro *pt, double * freq_array, double nu_start, double nu_stop, double * q_comp){
+    // rate_compton_GR for all the freq_array[NU_INT] in [nu_start,nu_stop]
+    // for the IC component set in pt (SSC, EC, EC_stat)
+    // returns 0 if the work contexts can not be allocated, or on kernel errors
+    return eval_rate_compton_points(pt, freq_array, pt->nu_IC_size, nu_start, nu_stop, q_comp);
+}
+
+
+
+int eval_rate_compton_points(struct spettro *pt, double * freq_array, unsigned long size, double nu_start, double nu_stop, double * q_comp){
+    // as eval_rate_compton_grid, for the first size elements of freq_array
+    long NU_INT;
+    int failed;
+
+    failed=0;
+#ifdef _OPENMP
+    #pragma omp parallel num_threads(get_n_threads(pt))
+    {
+        struct spettro * pt_ctx;
+        pt_ctx = make_work_context(pt);
+        if (pt_ctx == NULL){
+            #pragma omp atomic write
+            failed = 1;
+        }
+        #pragma omp for schedule(dynamic)
+        for (NU_INT = 0; NU_INT < (long) size; NU_INT++) {
+            if (pt_ctx != NULL && freq_array[NU_INT] >= nu_start && freq_array[NU_INT] <= nu_stop) {
+                pt_ctx->nu_1 = freq_array[NU_INT];
+                q_comp[NU_INT] = rate_compton_GR(pt_ctx);
+            }
+        }
+        if (pt_ctx != NULL && pt_ctx->error_code != 0){
+            #pragma omp atomic write
+            failed = 1;
+        }
+        if (pt_ctx != NULL){
+            #pragma omp critical (profile_counters)
+            add_profile_counters(pt, pt_ctx);
+        }
+        free_work_context(pt_ctx);
+    }
+#else
+    failed = 1;
+#endif
+    return !failed;
+}
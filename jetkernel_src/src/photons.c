@@ -2,294 +2,383 @@
 #include <stdio.h>
 #include <math.h>
 #include <string.h>
+#include <stddef.h>
 #include <unistd.h>
 //#include "libmia.h"
 #include "Blazar_SED.h"
 
 
-/*
-void build_photons(struct spettro *pt_base){
-
-// Grid
-    alloc_photons(&(pt_base->nu_grid),pt_base->nu_grid_size );
-    alloc_photons(&(pt_base->nuFnu_sum_grid),pt_base->nu_grid_size);
-    //pt_base->nu_grid = malloc(200 * sizeof (double));
-    //pt_base->nuFnu_sum_grid = malloc(200 * sizeof (double));
-    //double nu_grid[static_spec_arr_size];
-    //double nuFnu_sum_grid[static_spec_arr_size];
-
-
-
-
-
-//Synch
-//  double nuFnu_Sync_grid[static_spec_arr_size];
-//  double j_Sync[static_spec_arr_size];
-//  double alfa_Sync[static_spec_arr_size];
-//  double I_nu_Sync[static_spec_arr_size];
-//  double nu_Sync[static_spec_arr_size];
-//  double nu_Sync_obs[static_spec_arr_size];
-//  double n_Sync[static_spec_arr_size];
-//  double nuF_nu_Sync_obs[static_spec_arr_size];
-
-    alloc_photons(&(pt_base->nuFnu_Sync_grid),pt_base->nu_grid_size);
-
-    alloc_photons(&(pt_base->j_Sync),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->alfa_Sync),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->I_nu_Sync),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_Sync),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_Sync_obs),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->n_Sync),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nuF_nu_Sync_obs),pt_base->nu_seed_size);
-
-
-
-//Hadrons
-//  double j_pp[static_spec_arr_size];
-//  double nu_pp[static_spec_arr_size];
-//  double nuF_nu_pp_obs[static_spec_arr_size];
-//
-    alloc_photons(&(pt_base->j_pp),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_pp),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nuF_nu_pp_obs),pt_base->nu_seed_size);
-
-
-
-//SSC
-//  double nuFnu_SSC_grid[static_spec_arr_size];
-//  double q_comp[static_spec_arr_size];
-//  double j_comp[static_spec_arr_size];
-//  double j_EC[static_spec_arr_size];
-//  double nu_SSC[static_spec_arr_size];
-//  double nu_SSC_obs[static_spec_arr_size];
-//  double nuF_nu_SSC_obs[static_spec_arr_size];
-
-    alloc_photons(&(pt_base->nuFnu_SSC_grid),pt_base->nu_grid_size);
-
-    alloc_photons(&(pt_base->q_comp),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->j_comp),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->j_EC),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->nu_SSC),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->nu_SSC_obs),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->nuF_nu_SSC_obs),pt_base->nu_IC_size);
-
-
-//EC star
-//  double nuFnu_EC_Star_grid[static_spec_arr_size];
-//	double nu_EC_Star[static_spec_arr_size];
-//	double nu_EC_Star_obs[static_spec_arr_size];
-//	double nuF_nu_EC_Star_obs[static_spec_arr_size];
-
-
-
-    alloc_photons(&(pt_base->nuFnu_EC_Star_grid),pt_base->nu_grid_size);
-
-    alloc_photons(&(pt_base->nuF_nu_EC_Star_obs),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->nu_EC_Star_obs),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->nu_EC_Star),pt_base->nu_IC_size);
-
-//  double nuFnu_Star_grid[static_spec_arr_size];
-//  double I_nu_Star[static_spec_arr_size];
-//	double J_nu_Star_disk_RF[static_spec_arr_size];
-//	double I_nu_Star_disk_RF[static_spec_arr_size];
-//	double nu_Star[static_spec_arr_size];
-//	double nu_Star_obs[static_spec_arr_size];
-//	double nu_Star_disk_RF[static_spec_arr_size];
-//	double nuF_nu_Star_obs[static_spec_arr_size];
-//	double n_Star[static_spec_arr_size];
-
-
-    alloc_photons(&(pt_base->nuFnu_Star_grid),pt_base->nu_grid_size);
-
-    alloc_photons(&(pt_base->I_nu_Star),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->J_nu_Star_disk_RF),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->I_nu_Star_disk_RF),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_Star),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_Star_obs),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_Star_disk_RF),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nuF_nu_Star_obs),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->n_Star),pt_base->nu_seed_size);
-
-
-
-
-
-
-
-//EC CMB
-//  double nuFnu_EC_CMB_grid[static_spec_arr_size];
-//	double nu_EC_CMB[static_spec_arr_size];
-//	double nu_EC_CMB_obs[static_spec_arr_size];
-//	double nuF_nu_EC_CMB_obs[static_spec_arr_size];
-
-    alloc_photons(&(pt_base->nuFnu_EC_CMB_grid),pt_base->nu_grid_size);
-
-    alloc_photons(&(pt_base->nu_EC_CMB),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->nu_EC_CMB_obs),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->nuF_nu_EC_CMB_obs),pt_base->nu_IC_size);
-
-//	double I_nu_CMB[static_spec_arr_size];
-//	double I_nu_CMB_disk_RF[static_spec_arr_size];
-//	double nu_CMB[static_spec_arr_size];
-//	double nu_CMB_disk_RF[static_spec_arr_size];
-//	double n_CMB[static_spec_arr_size];
-
-    alloc_photons(&(pt_base->I_nu_CMB),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->I_nu_CMB_disk_RF),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_CMB),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_CMB_disk_RF),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->n_CMB),pt_base->nu_seed_size);
-
+//========================
+//SPECTRAL BUFFERS
+//========================
+// The spectral arrays of struct spettro are allocated at the size
+// actually configured:
+// - nu_grid_size for the summed/observed grids (nuFnu_*_grid)
+// - nu_seed_size for Sync and for the seed photon fields
+// - nu_IC_size for the IC/EC and pp spectra
+// each group is reallocated only when the corresponding size changes
+// The arrays of each group are listed by their offset in struct spettro,
+// and are copied, or written to and read from a blob state (see
+// blob_state.c), group by group
+
+
+
+#define PHOTON_ARRAY(name) offsetof(struct spettro, name)
+#define N_PHOTON_ARRAYS(group) (sizeof(group)/sizeof(group[0]))
+
+static const size_t grid_photons[] = {
+    PHOTON_ARRAY(nu_grid),
+    PHOTON_ARRAY(nuFnu_sum_grid),
+    PHOTON_ARRAY(nuFnu_Sync_grid),
+    PHOTON_ARRAY(nuFnu_SSC_grid),
+    PHOTON_ARRAY(nuFnu_Disk_grid),
+    PHOTON_ARRAY(nuFnu_DT_grid),
+    PHOTON_ARRAY(nuFnu_Star_grid),
+    PHOTON_ARRAY(nuFnu_EC_CMB_grid),
+    PHOTON_ARRAY(nuFnu_EC_BLR_grid),
+    PHOTON_ARRAY(nuFnu_EC_DT_grid),
+    PHOTON_ARRAY(nuFnu_EC_Disk_grid),
+    PHOTON_ARRAY(nuFnu_EC_Star_grid),
+};
+
+
+
+static const size_t seed_photons[] = {
+    //Sync
+    PHOTON_ARRAY(j_Sync),
+    PHOTON_ARRAY(alfa_Sync),
+    PHOTON_ARRAY(I_nu_Sync),
+    PHOTON_ARRAY(nu_Sync),
+    PHOTON_ARRAY(nu_Sync_obs),
+    PHOTON_ARRAY(n_Sync),
+    PHOTON_ARRAY(nuF_nu_Sync_obs),
+
+    //Star
+    PHOTON_ARRAY(I_nu_Star),
+    PHOTON_ARRAY(J_nu_Star_disk_RF),
+    PHOTON_ARRAY(I_nu_Star_disk_RF),
+    PHOTON_ARRAY(nu_Star),
+    PHOTON_ARRAY(nu_Star_obs),
+    PHOTON_ARRAY(nu_Star_disk_RF),
+    PHOTON_ARRAY(nuF_nu_Star_obs),
+    PHOTON_ARRAY(n_Star),
+    PHOTON_ARRAY(n_Star_DRF),
+
+    //CMB
+    PHOTON_ARRAY(I_nu_CMB),
+    PHOTON_ARRAY(I_nu_CMB_disk_RF),
+    PHOTON_ARRAY(nu_CMB),
+    PHOTON_ARRAY(nu_CMB_disk_RF),
+    PHOTON_ARRAY(n_CMB),
+    PHOTON_ARRAY(n_CMB_DRF),
+
+    //Disk
+    PHOTON_ARRAY(L_nu_Disk_disk_RF),
+    PHOTON_ARRAY(I_nu_Disk),
+    PHOTON_ARRAY(I_nu_Disk_disk_RF),
+    PHOTON_ARRAY(nu_Disk),
+    PHOTON_ARRAY(nu_Disk_obs),
+    PHOTON_ARRAY(nu_Disk_disk_RF),
+    PHOTON_ARRAY(nuF_nu_Disk_obs),
+    PHOTON_ARRAY(n_Disk),
+    PHOTON_ARRAY(n_Disk_DRF),
+
+    //BLR
+    PHOTON_ARRAY(I_nu_BLR),
+    PHOTON_ARRAY(Lnu_BLR_disk_RF),
+    PHOTON_ARRAY(nu_BLR),
+    PHOTON_ARRAY(I_nu_BLR_disk_RF),
+    PHOTON_ARRAY(nu_BLR_disk_RF),
+    PHOTON_ARRAY(n_BLR),
+    PHOTON_ARRAY(n_BLR_DRF),
+
+    //DT
+    PHOTON_ARRAY(I_nu_DT),
+    PHOTON_ARRAY(I_nu_DT_disk_RF),
+    PHOTON_ARRAY(nu_DT_obs),
+    PHOTON_ARRAY(nu_DT),
+    PHOTON_ARRAY(nu_DT_disk_RF),
+    PHOTON_ARRAY(n_DT),
+    PHOTON_ARRAY(n_DT_DRF),
+    PHOTON_ARRAY(L_nu_DT_disk_RF),
+    PHOTON_ARRAY(nuF_nu_DT_obs),
+};
+
+
+
+static const size_t IC_photons[] = {
+    //pp
+    PHOTON_ARRAY(j_pp),
+    PHOTON_ARRAY(nu_pp),
+    PHOTON_ARRAY(nuF_nu_pp_obs),
+
+    //SSC
+    PHOTON_ARRAY(q_comp),
+    PHOTON_ARRAY(j_comp),
+    PHOTON_ARRAY(q_comp_SSC),
+    PHOTON_ARRAY(j_EC),
+    PHOTON_ARRAY(nu_SSC),
+    PHOTON_ARRAY(nu_SSC_obs),
+    PHOTON_ARRAY(nuF_nu_SSC_obs),
+
+    //EC
+    PHOTON_ARRAY(nu_EC_Star),
+    PHOTON_ARRAY(nu_EC_Star_obs),
+    PHOTON_ARRAY(nuF_nu_EC_Star_obs),
+    PHOTON_ARRAY(nu_EC_CMB),
+    PHOTON_ARRAY(nu_EC_CMB_obs),
+    PHOTON_ARRAY(nuF_nu_EC_CMB_obs),
+    PHOTON_ARRAY(nu_EC_Disk),
+    PHOTON_ARRAY(nu_EC_Disk_obs),
+    PHOTON_ARRAY(nuF_nu_EC_Disk_obs),
+    PHOTON_ARRAY(nu_EC_BLR),
+    PHOTON_ARRAY(nu_EC_BLR_obs),
+    PHOTON_ARRAY(nuF_nu_EC_BLR_obs),
+    PHOTON_ARRAY(nu_EC_DT),
+    PHOTON_ARRAY(nu_EC_DT_obs),
+    PHOTON_ARRAY(nuF_nu_EC_DT_obs),
+};
+
+
+
+static int alloc_photons_group(struct spettro *pt_base, const size_t * group, unsigned long n_arrays, unsigned long size){
+    // the new arrays are allocated before freeing the old ones, so that
+    // the group is left unchanged if the allocation fails (returns 0)
+    unsigned long i;
+    double ** arrs;
+    int done;
+    if (size == 0){
+        for (i = 0; i < n_arrays; i++){
+            alloc_photons((double **) ((char *) pt_base + group[i]), 0);
+        }
+        return 1;
+    }
+    arrs = calloc(n_arrays, sizeof (double *));
+    done = arrs != NULL;
+    for (i = 0; done && i < n_arrays; i++){
+        done = alloc_photons(&arrs[i], size);
+    }
+    if (done){
+        for (i = 0; i < n_arrays; i++){
+            alloc_photons((double **) ((char *) pt_base + group[i]), 0);
+            *((double **) ((char *) pt_base + group[i])) = arrs[i];
+        }
+    }
+    else if (arrs != NULL){
+        for (i = 0; i < n_arrays; i++){
+            alloc_photons(&arrs[i], 0);
+        }
+    }
+    free(arrs);
+    return done;
+}
 
 
-//
-//
-//EC CMB stat
-//  double nuFnu_EC_CMB_stat_grid[static_spec_arr_size];
-//  double nu_EC_CMB_stat[static_spec_arr_size];
-//  double nu_EC_CMB_stat_obs[static_spec_arr_size];
-//  double nuF_nu_EC_CMB_stat_obs[static_spec_arr_size];
 
-//    alloc_photons(&(pt_base->nuFnu_EC_CMB_stat_grid),pt_base->nu_grid_size);
+static int resize_photons_group(struct spettro *pt_base, const size_t * group, unsigned long n_arrays, unsigned long size, unsigned long * size_alloc){
+    if (size != *size_alloc){
+        if (!alloc_photons_group(pt_base,group,n_arrays,size)){
+            return 0;
+        }
+        *size_alloc=size;
+    }
+    return 1;
+}
 
-//    alloc_photons(&(pt_base->nuF_nu_EC_CMB_stat_obs),pt_base->nu_IC_size);
-//    alloc_photons(&(pt_base->nu_EC_CMB_stat),pt_base->nu_IC_size);
-//    alloc_photons(&(pt_base->nu_EC_CMB_stat_obs),pt_base->nu_IC_size);
 
-//  double I_nu_CMB_stat[static_spec_arr_size];
-//  double I_nu_CMB_disk_RF_stat[static_spec_arr_size];
-//  double nu_CMB_stat[static_spec_arr_size];
-//  double nu_CMB_disk_RF_stat[static_spec_arr_size];
-//  double n_CMB_stat[static_spec_arr_size];
 
- //   alloc_photons(&(pt_base->I_nu_CMB_stat),pt_base->nu_seed_size);
- //   alloc_photons(&(pt_base->I_nu_CMB_disk_RF_stat),pt_base->nu_seed_size);
- //   alloc_photons(&(pt_base->nu_CMB_stat),pt_base->nu_seed_size);
- //   alloc_photons(&(pt_base->nu_CMB_disk_RF_stat),pt_base->nu_seed_size);
- //   alloc_photons(&(pt_base->n_CMB_stat),pt_base->nu_seed_size);
+static void copy_photons_group(struct spettro *pt_dst, struct spettro *pt_src, const size_t * group, unsigned long n_arrays, unsigned long size){
+    // pt_dst has the pointers of pt_src, that are replaced by copies of the arrays
+    unsigned long i;
+    double ** arr;
+    double * arr_src;
+    for (i = 0; i < n_arrays; i++){
+        arr = (double **) ((char *) pt_dst + group[i]);
+        arr_src = *((double **) ((char *) pt_src + group[i]));
+        *arr = NULL;
+        alloc_photons(arr, size);
+        if (*arr != NULL && arr_src != NULL){
+            memcpy(*arr, arr_src, (size + 1) * sizeof (double));
+        }
+    }
+}
 
 
 
+int build_photons(struct spettro *pt_base){
+    // returns 0 if a group can not be allocated, the group keeps its
+    // previous arrays and allocated size.
+    // The arrays of a group are reallocated when its size changes, hence
+    // the numpy views of the arrays (see jetkernel.i) are not valid anymore
+    int done;
+    done = resize_photons_group(pt_base,grid_photons,N_PHOTON_ARRAYS(grid_photons),pt_base->nu_grid_size,&(pt_base->nu_grid_size_alloc));
+    done &= resize_photons_group(pt_base,seed_photons,N_PHOTON_ARRAYS(seed_photons),pt_base->nu_seed_size,&(pt_base->nu_seed_size_alloc));
+    done &= resize_photons_group(pt_base,IC_photons,N_PHOTON_ARRAYS(IC_photons),pt_base->nu_IC_size,&(pt_base->nu_IC_size_alloc));
 
+    pt_base->spec_array_size=pt_base->nu_grid_size_alloc;
+    if (pt_base->nu_seed_size_alloc>pt_base->spec_array_size){
+        pt_base->spec_array_size=pt_base->nu_seed_size_alloc;
+    }
+    if (pt_base->nu_IC_size_alloc>pt_base->spec_array_size){
+        pt_base->spec_array_size=pt_base->nu_IC_size_alloc;
+    }
+    if (!done){
+        kernel_error(pt_base, KERNEL_MEMORY_ERROR, "spectral arrays allocation failed, nu_grid_size=%lu nu_seed_size=%lu nu_IC_size=%lu",
+                     pt_base->nu_grid_size, pt_base->nu_seed_size, pt_base->nu_IC_size);
+    }
+    return done;
+}
 
-//EC Disk
-//  double nu_EC_Disk[static_spec_arr_size];
-//  double nu_EC_Disk_obs[static_spec_arr_size];
-//  double nuF_nu_EC_Disk_obs[static_spec_arr_size];
-//  double nuFnu_EC_Disk_grid[static_spec_arr_size];
 
-    alloc_photons(&(pt_base->nuFnu_EC_Disk_grid),pt_base->nu_grid_size);
 
-    alloc_photons(&(pt_base->nu_EC_Disk),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->nu_EC_Disk_obs),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->nuF_nu_EC_Disk_obs),pt_base->nu_IC_size);
+void free_photons(struct spettro *pt_base){
+    alloc_photons_group(pt_base,grid_photons,N_PHOTON_ARRAYS(grid_photons),0);
+    alloc_photons_group(pt_base,seed_photons,N_PHOTON_ARRAYS(seed_photons),0);
+    alloc_photons_group(pt_base,IC_photons,N_PHOTON_ARRAYS(IC_photons),0);
+    pt_base->nu_grid_size_alloc=0;
+    pt_base->nu_seed_size_alloc=0;
+    pt_base->nu_IC_size_alloc=0;
+    pt_base->spec_array_size=0;
+}
 
 
-//  double nuFnu_Disk_grid[static_spec_arr_size];
-//  double I_nu_Disk[static_spec_arr_size];
-//  double J_nu_Disk_disk_RF[static_spec_arr_size];
-//  double I_nu_Disk_disk_RF[static_spec_arr_size];
-//  double nu_Disk[static_spec_arr_size];
-//  double nu_Disk_obs[static_spec_arr_size];
-//  double nu_Disk_disk_RF[static_spec_arr_size];
-//  double nuF_nu_Disk_obs[static_spec_arr_size];
-//  double n_Disk[static_spec_arr_size];
 
-    alloc_photons(&(pt_base->nuFnu_Disk_grid),pt_base->nu_grid_size);
+void copy_photons(struct spettro *pt_dst, struct spettro *pt_src){
+    // the buffers of pt_dst, a copy of the struct pt_src, are replaced
+    // by copies of the pt_src buffers
+    copy_photons_group(pt_dst,pt_src,grid_photons,N_PHOTON_ARRAYS(grid_photons),pt_src->nu_grid_size_alloc);
+    copy_photons_group(pt_dst,pt_src,seed_photons,N_PHOTON_ARRAYS(seed_photons),pt_src->nu_seed_size_alloc);
+    copy_photons_group(pt_dst,pt_src,IC_photons,N_PHOTON_ARRAYS(IC_photons),pt_src->nu_IC_size_alloc);
+}
 
-    alloc_photons(&(pt_base->I_nu_Disk),pt_base->nu_seed_size);
-    //alloc_photons(&(pt_base->J_nu_Disk_disk_RF),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->I_nu_Disk_disk_RF),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_Disk),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_Disk_obs),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_Disk_disk_RF),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nuF_nu_Disk_obs),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->n_Disk),pt_base->nu_seed_size);
 
 
+static int in_photons_group(struct spettro *pt_base, double * arr, const size_t * group, unsigned long n_arrays){
+    unsigned long i;
+    for (i = 0; i < n_arrays; i++){
+        if (*((double **) ((char *) pt_base + group[i])) == arr){
+            return 1;
+        }
+    }
+    return 0;
+}
 
-//EC BLR
-//  double nuFnu_EC_BLR_grid[static_spec_arr_size];
-//  double nuF_nu_EC_BLR_obs[static_spec_arr_size];
-//  double nu_EC_BLR[static_spec_arr_size];
-//  double nu_EC_BLR_obs[static_spec_arr_size];
 
 
-    alloc_photons(&(pt_base->nuFnu_EC_BLR_grid),pt_base->nu_grid_size);
+unsigned long get_photons_alloc_size(struct spettro *pt_base, double * arr){
+    // allocated size of the group of the spectral array arr,
+    // 0 if arr is not a spectral array of pt_base
+    if (arr == NULL){
+        return 0;
+    }
+    if (in_photons_group(pt_base,arr,grid_photons,N_PHOTON_ARRAYS(grid_photons))){
+        return pt_base->nu_grid_size_alloc;
+    }
+    if (in_photons_group(pt_base,arr,seed_photons,N_PHOTON_ARRAYS(seed_photons))){
+        return pt_base->nu_seed_size_alloc;
+    }
+    if (in_photons_group(pt_base,arr,IC_photons,N_PHOTON_ARRAYS(IC_photons))){
+        return pt_base->nu_IC_size_alloc;
+    }
+    return 0;
+}
 
-    alloc_photons(&(pt_base->nuF_nu_EC_BLR_obs),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->nu_EC_BLR),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->nu_EC_BLR_obs),pt_base->nu_IC_size);
 
 
-//  double I_nu_BLR[static_spec_arr_size];
-//  double nu_BLR[static_spec_arr_size];
-//  double J_nu_BLR_disk_RF[static_spec_arr_size];
-//  double nu_BLR_disk_RF[static_spec_arr_size];
-//  double n_BLR[static_spec_arr_size];
+static unsigned long photons_group_state_size(struct spettro *pt_base, const size_t * group, unsigned long n_arrays, unsigned long size){
+    unsigned long i, state_size;
+    state_size = 0;
+    for (i = 0; i < n_arrays; i++){
+        if (*((double **) ((char *) pt_base + group[i])) != NULL){
+            state_size += (size + 1) * sizeof (double);
+        }
+    }
+    return state_size;
+}
 
 
-    alloc_photons(&(pt_base->I_nu_BLR),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_BLR),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->I_nu_BLR_disk_RF),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_BLR_disk_RF),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->n_BLR),pt_base->nu_seed_size);
 
+static char * write_photons_group(struct spettro *pt_base, char * state, const size_t * group, unsigned long n_arrays, unsigned long size){
+    unsigned long i;
+    double * arr;
+    for (i = 0; i < n_arrays; i++){
+        arr = *((double **) ((char *) pt_base + group[i]));
+        if (arr != NULL){
+            memcpy(state, arr, (size + 1) * sizeof (double));
+            state += (size + 1) * sizeof (double);
+        }
+    }
+    return state;
+}
 
 
-//EC DT
-//  double nuFnu_EC_DT_grid[static_spec_arr_size];
-//  double nu_EC_DT[static_spec_arr_size];
-//  double nu_EC_DT_obs[static_spec_arr_size];
-//  double nuF_nu_EC_DT_obs[static_spec_arr_size];
 
-    alloc_photons(&(pt_base->nuFnu_EC_DT_grid),pt_base->nu_grid_size);
+static char * read_photons_group(struct spettro *pt_base, char * state, const size_t * group, unsigned long n_arrays, unsigned long size, int * done){
+    // the pointers of pt_base, read from the state, tell the arrays stored
+    // in the state, and are replaced by new arrays (NULL after a failure)
+    unsigned long i;
+    double ** arr;
+    for (i = 0; i < n_arrays; i++){
+        arr = (double **) ((char *) pt_base + group[i]);
+        if (*arr != NULL){
+            *arr = NULL;
+            if (*done){
+                alloc_photons(arr, size);
+                *done = *arr != NULL;
+            }
+            if (*done){
+                memcpy(*arr, state, (size + 1) * sizeof (double));
+            }
+            state += (size + 1) * sizeof (double);
+        }
+    }
+    return state;
+}
 
-    alloc_photons(&(pt_base->nu_EC_DT),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->nu_EC_DT_obs),pt_base->nu_IC_size);
-    alloc_photons(&(pt_base->nuF_nu_EC_DT_obs),pt_base->nu_IC_size);
 
 
-//  double nuFnu_DT_grid[static_spec_arr_size];
-//  double I_nu_DT[static_spec_arr_size];
-//  double J_nu_DT_disk_RF[static_spec_arr_size];
-//  double nu_DT_obs[static_spec_arr_size];
-//  double nu_DT[static_spec_arr_size];
-//  double nu_DT_disk_RF[static_spec_arr_size];
-//  double n_DT[static_spec_arr_size];
-//  double nuF_nu_DT_obs[static_spec_arr_size];
+unsigned long photons_state_size(struct spettro *pt_base){
+    return photons_group_state_size(pt_base,grid_photons,N_PHOTON_ARRAYS(grid_photons),pt_base->nu_grid_size_alloc)
+           + photons_group_state_size(pt_base,seed_photons,N_PHOTON_ARRAYS(seed_photons),pt_base->nu_seed_size_alloc)
+           + photons_group_state_size(pt_base,IC_photons,N_PHOTON_ARRAYS(IC_photons),pt_base->nu_IC_size_alloc);
+}
 
-    alloc_photons(&(pt_base->nuFnu_DT_grid),pt_base->nu_grid_size);
 
-    alloc_photons(&(pt_base->I_nu_DT),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->I_nu_DT_disk_RF),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_DT_obs),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_DT),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nu_DT_disk_RF),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->n_DT),pt_base->nu_seed_size);
-    alloc_photons(&(pt_base->nuF_nu_DT_obs),pt_base->nu_seed_size);
 
+char * write_photons_state(struct spettro *pt_base, char * state){
+    // writes the buffers to state, returns the end of the written data
+    state = write_photons_group(pt_base,state,grid_photons,N_PHOTON_ARRAYS(grid_photons),pt_base->nu_grid_size_alloc);
+    state = write_photons_group(pt_base,state,seed_photons,N_PHOTON_ARRAYS(seed_photons),pt_base->nu_seed_size_alloc);
+    return write_photons_group(pt_base,state,IC_photons,N_PHOTON_ARRAYS(IC_photons),pt_base->nu_IC_size_alloc);
 }
 
-void alloc_photons(double ** pt,int size){
-        printf("pre %p\n",*pt);
-        unsigned long i;
-        if (*pt){
 
 
-        //   printf("freeing\n");
+char * read_photons_state(struct spettro *pt_base, char * state, int * done){
+    // pt_base is the struct written with the state, its buffers are
+    // allocated and read from state, *done is set to 0 if the
+    // allocation fails, returns the end of the read data
+    state = read_photons_group(pt_base,state,grid_photons,N_PHOTON_ARRAYS(grid_photons),pt_base->nu_grid_size_alloc,done);
+    state = read_photons_group(pt_base,state,seed_photons,N_PHOTON_ARRAYS(seed_photons),pt_base->nu_seed_size_alloc,done);
+    return read_photons_group(pt_base,state,IC_photons,N_PHOTON_ARRAYS(IC_photons),pt_base->nu_IC_size_alloc,done);
+}
 
-            //for (i = 0; i < size; i++) {
 
-            //    printf("%e\n",*pt[i]);
 
-            //}
-            //free(*pt);
+int alloc_photons(double ** pt,unsigned long size){
+    // size=0 only frees the array
+    // one extra element is allocated, since x_to_grid_index
+    // reads the element following the last grid point
+    // returns 0 if the allocation fails, leaving the old array in place
+    double * arr;
+    arr=NULL;
+    if (size>0){
+        arr= calloc(size+1, sizeof (double));
+        if (arr==NULL){
+            return 0;
         }
-
-        *pt= malloc(size * sizeof (double));
-        printf("post %p\n",*pt);
-
     }
-
-*/
\ No newline at end of file
+    free(*pt);
+    *pt=arr;
+    return 1;
+}
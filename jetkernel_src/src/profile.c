@@ -0,0 +1,109 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <string.h>
+#include <time.h>
+#include "Blazar_SED.h"
+
+
+//========================
+//EVALUATION PROFILE
+//========================
+// pt->profile holds, for the last evaluation (from the last Init), the
+// number of calls of each stage of Init and Run_SED, and, if do_profile is
+// set, their wall time (monotonic clock), plus the counters of:
+// - n_Sync_integrand: Sync emissivity and absorption integrands (integrale_Sync)
+// - n_IC_integrand:   IC integrands over the electron grid (integrale_IC)
+// - n_IC_rate:        IC rates, i.e. IC frequencies evaluated (rate_compton_GR)
+// - n_interp:         table and spectral interpolations (Bessel and KN
+//                     tables, interpola_somma)
+// The stages are the PROFILE_* indices, the time of each EC component is
+// stored in its own stage. The work contexts of the parallel loops (see
+// parallel.c) start with zero counters, that are added to the blob at the
+// end of the loops. The profile does not change the spectra, and is not
+// tracked by the stages (see stages.c).
+
+
+
+static const char * profile_stage_names[PROFILE_N_STAGES] = {
+    "InitNe",
+    "tabella_Bessel",
+    "spettro_sincrotrone",
+    "spettro_compton",
+    "spectra_External_Fields",
+    "spettro_EC_Disk",
+    "spettro_EC_BLR",
+    "spettro_EC_DT",
+    "spettro_EC_Star",
+    "spettro_EC_CMB",
+    "spettro_somma_Sync_ic",
+};
+
+
+
+static double profile_clock(void){
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (double) ts.tv_sec + 1E-9 * (double) ts.tv_nsec;
+}
+
+
+
+void reset_profile(struct spettro *pt){
+    memset(&pt->profile, 0, sizeof(struct eval_profile));
+}
+
+
+
+double profile_start(struct spettro *pt){
+    // start time of a stage, 0 if do_profile is not set
+    if (pt->do_profile){
+        return profile_clock();
+    }
+    return 0;
+}
+
+
+
+void profile_stop(struct spettro *pt, int stage, double t_start){
+    pt->profile.calls[stage]++;
+    if (pt->do_profile){
+        pt->profile.time[stage] += profile_clock() - t_start;
+    }
+}
+
+
+
+void add_profile_counters(struct spettro *pt, struct spettro *pt_ctx){
+    // adds the counters of a work context to the blob
+    pt->profile.n_Sync_integrand += pt_ctx->profile.n_Sync_integrand;
+    pt->profile.n_IC_integrand += pt_ctx->profile.n_IC_integrand;
+    pt->profile.n_IC_rate += pt_ctx->profile.n_IC_rate;
+    pt->profile.n_interp += pt_ctx->profile.n_interp;
+}
+
+
+
+double get_profile_time(struct spettro *pt, int stage){
+    if (stage < 0 || stage >= PROFILE_N_STAGES){
+        return 0;
+    }
+    return pt->profile.time[stage];
+}
+
+
+
+unsigned long get_profile_calls(struct spettro *pt, int stage){
+    if (stage < 0 || stage >= PROFILE_N_STAGES){
+        return 0;
+    }
+    return pt->profile.calls[stage];
+}
+
+
+
+const char * get_profile_stage_name(int stage){
+    if (stage < 0 || stage >= PROFILE_N_STAGES){
+        return NULL;
+    }
+    return profile_stage_names[stage];
+}
@@ -85,8 +85,8 @@ void Build_I_nu_Star(struct spettro *pt){
 	if (pt->WRITE_TO_FILE==1){
 		fp_SED_star = fopen(f_SED_star, "w");
 		if (fp_SED_star == NULL) {
-			printf("unable to open %s\n ", fp_SED_star);
-			exit(1);
+			kernel_error(pt, KERNEL_ERROR, "unable to open %s", f_SED_star);
+			return;
 		}
 		flux_DISK_header(fp_SED_star);
 	}
@@ -203,7 +203,7 @@ double integrand_I_nu_Star_blob_RF(struct spettro *pt, double mu){
 	double nu_disk_RF=nu_blob_RF_to_nu_disk_RF(pt->nu_blob_RF,pt->BulkFactor,pt->beta_Gamma,mu);
 
 	i=x_to_grid_index( pt->nu_Star_disk_RF,nu_disk_RF,pt->nu_seed_size);
-	if (i>0){
+	if (i>0 && i<pt->nu_seed_size){
 		return pt->J_nu_Star_disk_RF[i]*pt->BulkFactor*(1-pt->beta_Gamma*mu);
 	}
 	else{
@@ -403,7 +403,7 @@ double integrand_I_nu_CMB_blob_RF(struct spettro *pt, double mu){
 	unsigned long i=0;
  	double nu_disk_RF=nu_blob_RF_to_nu_disk_RF(pt->nu_blob_RF,pt->BulkFactor,pt->beta_Gamma,mu);
 	i=x_to_grid_index( pt->nu_CMB_disk_RF,nu_disk_RF,pt->nu_seed_size);
- 	if (i>0){
+ 	if (i>0 && i<pt->nu_seed_size){
  		return pt->I_nu_CMB_disk_RF[i]*pt->BulkFactor*(1-pt->beta_Gamma*mu);
 	}
 	else{
@@ -439,8 +439,8 @@ void Build_I_nu_Disk(struct spettro *pt){
 
 		fp_SED_disk = fopen(f_SED_disk, "w");
 		if (fp_SED_disk == NULL) {
-			printf("unable to open %s\n ", f_SED_disk);
-			exit(1);
+			kernel_error(pt, KERNEL_ERROR, "unable to open %s", f_SED_disk);
+			return;
 		}
 		flux_DISK_header(fp_SED_disk);
 	}
@@ -472,8 +472,8 @@ void Build_I_nu_Disk(struct spettro *pt){
 		 nu_stop_disk_RF = nu_peak_BB * pt->mono_planck_max_factor;
 	}
 	else{
-		printf("wrong disk type, option BB, MultiBB, Mono \n ");
-		exit(1);
+		kernel_error(pt, KERNEL_ERROR, "wrong disk type, option BB, MultiBB, Mono");
+		return;
 	}
 
 	pt->nu_start_Disk = eval_nu_min_blob_RF(pt, pt->Disk_mu_1, pt->Disk_mu_2, nu_start_disk_RF);
@@ -579,8 +579,8 @@ void set_Disk(struct spettro *pt){
 	}
 	else
 	{
-		printf("wrong disk type, option BB, MultiBB, Mono \n ");
-		exit(1);
+		kernel_error(pt, KERNEL_ERROR, "wrong disk type, option BB, MultiBB, Mono");
+		return;
 	}
 
 	pt->R_Sw=eval_R_Sw(pt->M_BH);
@@ -810,8 +810,8 @@ void Build_I_nu_BLR(struct spettro *pt){
 
 		fp_BLR_disk = fopen(f_BLR_disk, "w");
 		if (fp_BLR_disk == NULL) {
-			printf("unable to open %s\n ", fp_BLR_disk);
-			exit(1);
+			kernel_error(pt, KERNEL_ERROR, "unable to open %s", f_BLR_disk);
+			return;
 		}
 	}
 	//flux_DISK_header(fp_BLR_disk);
@@ -1165,8 +1165,8 @@ void Build_I_nu_DT(struct spettro *pt){
 
 		fp_SED_DT = fopen(f_SED_DT, "w");
 		if (fp_SED_DT == NULL) {
-			printf("unable to open %s\n ", f_SED_DT);
-			exit(1);
+			kernel_error(pt, KERNEL_ERROR, "unable to open %s", f_SED_DT);
+			return;
 		}
 		flux_DISK_header(fp_SED_DT);
 	}
@@ -22,6 +22,7 @@ void spettro_compton(int Num_file, struct spettro *pt){
     double L_nu_SSC, nuL_nu_SSC, F_nu_SSC_obs;
     double log_nu, log_nu_start,gmax,numax_KN,numax_TH,nu_min_TH_1,nu_min_TH_2;
     unsigned long l, NU_INT, i, I_MAX, stop,out;
+    double * q_comp_par;
     char f_SSC[static_file_name_max_legth];
     FILE *fp_SSC;
     
@@ -36,8 +37,8 @@ void spettro_compton(int Num_file, struct spettro *pt){
         
         fp_SSC = fopen(f_SSC, "w");
         if (fp_SSC == NULL) {
-            printf("non posso aprire %s\n ", f_SSC);
-            exit(1);
+            kernel_error(pt, KERNEL_ERROR, "non posso aprire %s", f_SSC);
+            return;
         }
         flux_header(fp_SSC);
     }
@@ -79,8 +80,20 @@ void spettro_compton(int Num_file, struct spettro *pt){
     pt->nu_start_SSC_obs =nu_blob_to_nu_obs(pt->nu_start_SSC, pt->beam_obj, pt->z_cosm);
     pt->nu_stop_SSC_obs = nu_blob_to_nu_obs(pt->nu_stop_SSC, pt->beam_obj, pt->z_cosm);
 
-    build_log_grid(pt->nu_start_SSC,  pt->nu_stop_SSC, pt->nu_IC_size, pt->nu_SSC);
-    build_log_grid(pt->nu_start_SSC_obs,  pt->nu_stop_SSC_obs, pt->nu_IC_size, pt->nu_SSC_obs);
+    //with IC_adaptive_tol>0 the grid is built with the rates (see adaptive_grids.c),
+    //and it is kept with the rates if the SSC stage is clean
+    q_comp_par = NULL;
+    if (pt->IC_adaptive_tol > 0 && (!(pt->dirty_stages & STAGE_SSC) ||
+        build_adaptive_IC_grid(pt, pt->nu_start_SSC, pt->nu_stop_SSC, pt->nu_SSC, pt->q_comp_SSC) > 0)) {
+        q_comp_par = pt->q_comp_SSC;
+        for (NU_INT = 0; NU_INT < pt->nu_IC_size; NU_INT++) {
+            pt->nu_SSC_obs[NU_INT] = nu_blob_to_nu_obs(pt->nu_SSC[NU_INT], pt->beam_obj, pt->z_cosm);
+        }
+    }
+    else {
+        build_log_grid(pt->nu_start_SSC,  pt->nu_stop_SSC, pt->nu_IC_size, pt->nu_SSC);
+        build_log_grid(pt->nu_start_SSC_obs,  pt->nu_stop_SSC_obs, pt->nu_IC_size, pt->nu_SSC_obs);
+    }
 
 
 
@@ -107,6 +120,20 @@ void spettro_compton(int Num_file, struct spettro *pt){
 		printf("Number of freq to eval=%d\n",I_MAX);
 	}
 
+	//with n_threads>1 the rates are evaluated in parallel
+	//and then used in the loop below
+	//if the SSC stage is clean the rates of the last run are used
+	//(the adaptive grids have their rates already)
+	if (q_comp_par == NULL && !(pt->dirty_stages & STAGE_SSC)) {
+		q_comp_par = pt->q_comp_SSC;
+	} else if (q_comp_par == NULL && get_n_threads(pt) > 1) {
+		q_comp_par = calloc(pt->nu_IC_size, sizeof (double));
+		if (q_comp_par != NULL && !eval_rate_compton_grid(pt, pt->nu_SSC, pt->nu_start_SSC, pt->nu_stop_SSC, q_comp_par)) {
+			free(q_comp_par);
+			q_comp_par = NULL;
+		}
+	}
+
 	stop=0;
     for (NU_INT = 0; NU_INT <= I_MAX; NU_INT++) {
         
@@ -119,7 +146,12 @@ void spettro_compton(int Num_file, struct spettro *pt){
         }
         if((pt->nu_SSC[NU_INT]>=pt->nu_start_SSC) &&(pt->nu_SSC[NU_INT]<=pt->nu_stop_SSC)){
 			if (!stop) {
-				pt->q_comp[NU_INT] = rate_compton_GR(pt);
+				if (q_comp_par != NULL) {
+					pt->q_comp[NU_INT] = q_comp_par[NU_INT];
+				} else {
+					pt->q_comp[NU_INT] = rate_compton_GR(pt);
+				}
+				pt->q_comp_SSC[NU_INT] = pt->q_comp[NU_INT];
 				pt->j_comp[NU_INT] = pt->q_comp[NU_INT] *
 				HPLANCK * pt->nu_SSC[NU_INT];
 				if (pt->verbose > 1) {
@@ -192,6 +224,10 @@ void spettro_compton(int Num_file, struct spettro *pt){
             //==========================  END of Loop ove frequencies ====================================
         }
     }
+    if (q_comp_par != pt->q_comp_SSC) {
+        free(q_comp_par);
+    }
+
     //Se ancora non ha trovato nu_stop
     if (!stop){
         pt->nu_stop_SSC = pt->nu_SSC[NU_INT-1];
@@ -28,6 +28,7 @@ void spettro_EC(int Num_file, struct spettro *pt) {
     double * nu_start_EC, * nu_stop_EC, * nu_start_EC_obs, * nu_stop_EC_obs, nu_seed_max;
     unsigned long * NU_INT_STOP_EC;
     unsigned long l, NU_INT, I_MAX, stop,out;
+    double * q_comp_par;
     char f_EC[static_file_name_max_legth];
     FILE *fp_EC;
 
@@ -65,8 +66,8 @@ void spettro_EC(int Num_file, struct spettro *pt) {
 			}
 		fp_EC = fopen(f_EC, "w");
 		if (fp_EC == NULL) {
-			printf("non posso aprire %s\n ", f_EC);
-			exit(1);
+			kernel_error(pt, KERNEL_ERROR, "non posso aprire %s", f_EC);
+			return;
 		}
 
 		flux_header(fp_EC);
@@ -239,8 +240,24 @@ void spettro_EC(int Num_file, struct spettro *pt) {
    	*nu_start_EC_obs=nu_blob_to_nu_obs(*nu_start_EC, pt->beam_obj, pt->z_cosm);
 
 
-   	build_log_grid(*nu_start_EC,  *nu_stop_EC, pt->nu_IC_size, freq_array);
-   	build_log_grid(*nu_start_EC_obs,  *nu_stop_EC_obs, pt->nu_IC_size, freq_array_obs);
+   	//with IC_adaptive_tol>0 the grid is built with the rates (see adaptive_grids.c)
+   	q_comp_par = NULL;
+   	if (pt->IC_adaptive_tol > 0) {
+   		q_comp_par = calloc(pt->nu_IC_size, sizeof (double));
+   		if (q_comp_par != NULL && build_adaptive_IC_grid(pt, *nu_start_EC, *nu_stop_EC, freq_array, q_comp_par) == 0) {
+   			free(q_comp_par);
+   			q_comp_par = NULL;
+   		}
+   	}
+   	if (q_comp_par != NULL) {
+   		for (NU_INT = 0; NU_INT < pt->nu_IC_size; NU_INT++) {
+   			freq_array_obs[NU_INT] = nu_blob_to_nu_obs(freq_array[NU_INT], pt->beam_obj, pt->z_cosm);
+   		}
+   	}
+   	else {
+   		build_log_grid(*nu_start_EC,  *nu_stop_EC, pt->nu_IC_size, freq_array);
+   		build_log_grid(*nu_start_EC_obs,  *nu_stop_EC_obs, pt->nu_IC_size, freq_array_obs);
+   	}
 
     //pt->nu_stop_compton = *nu_start_EC_obs;
     //pt->nu_start_compton = *nu_stop_EC_obs;
@@ -260,6 +277,17 @@ void spettro_EC(int Num_file, struct spettro *pt) {
 		printf("emiss limit=%e\n", pt->emiss_lim);
 	}
 
+	//with n_threads>1 the rates are evaluated in parallel
+	//and then used in the loop below
+	//(the adaptive grids have their rates already)
+	if (q_comp_par == NULL && get_n_threads(pt) > 1) {
+		q_comp_par = calloc(pt->nu_IC_size, sizeof (double));
+		if (q_comp_par != NULL && !eval_rate_compton_grid(pt, freq_array, *nu_start_EC, *nu_stop_EC, q_comp_par)) {
+			free(q_comp_par);
+			q_comp_par = NULL;
+		}
+	}
+
 	I_MAX = pt->nu_IC_size-1;
 	stop=0;
 	for (NU_INT = 0; NU_INT <= I_MAX; NU_INT++) {
@@ -274,7 +302,11 @@ void spettro_EC(int Num_file, struct spettro *pt) {
         if ((freq_array[NU_INT] >= *nu_start_EC) && (freq_array[NU_INT] <= *nu_stop_EC)) {
 			if (!stop) {
 				
-				pt->q_comp[NU_INT] = rate_compton_GR(pt);
+				if (q_comp_par != NULL) {
+					pt->q_comp[NU_INT] = q_comp_par[NU_INT];
+				} else {
+					pt->q_comp[NU_INT] = rate_compton_GR(pt);
+				}
 				if (pt->EC_stat == 1){
 					//in this case we have q_comp in the disk frame, so j_nu is in the disk rest frame
 					//and we have to use also the scattered nu in the disk rest frame
@@ -368,6 +400,8 @@ void spettro_EC(int Num_file, struct spettro *pt) {
         }
     }
 
+    free(q_comp_par);
+
     //Se ancora non ha trovato nu_stop
     if (!stop) {
     	*nu_stop_EC_obs = freq_array_obs[NU_INT-1];
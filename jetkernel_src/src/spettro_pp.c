@@ -39,13 +39,14 @@ void spettro_pp(int Num_file, struct spettro *pt) {
 
         fp_pp = fopen(f_pp, "w");
         if (fp_pp == NULL) {
-            printf("non posso aprire %s\n ", f_pp);
-            exit(1);
+            kernel_error(pt, KERNEL_ERROR, "non posso aprire %s", f_pp);
+            return;
         }
         fp_pp_energy = fopen(f_pp_energy, "w");
-        if (fp_pp == NULL) {
-            printf("non posso aprire %s\n ", f_pp);
-            exit(1);
+        if (fp_pp_energy == NULL) {
+            fclose(fp_pp);
+            kernel_error(pt, KERNEL_ERROR, "non posso aprire %s", f_pp_energy);
+            return;
         }
         flux_header(fp_pp);
     }
@@ -36,6 +36,7 @@ void spettro_sincrotrone(int Num_file, struct spettro * pt) {
     double L_nu_Sync, nuL_nu_Sync;
 
     double (*pf_norm) (struct spettro *, double x);
+    double * j_Sync_par, * alfa_Sync_par;
 
 
     char f_Synch[static_file_name_max_legth];
@@ -43,8 +44,8 @@ void spettro_sincrotrone(int Num_file, struct spettro * pt) {
 
     FILE *fp_Synch;
     if (pt->Distr_e_done == 0) {
-        printf("No electron distribution calculated \n ");
-        exit(0);
+        kernel_error(pt, KERNEL_ERROR, "No electron distribution calculated");
+        return;
     }
 
     //*fpe_sinc,*fpf_sinc;
@@ -60,8 +61,8 @@ void spettro_sincrotrone(int Num_file, struct spettro * pt) {
         sprintf(f_Synch, "%s%s-Sync.dat", pt->path, pt->STEM);
         fp_Synch = fopen(f_Synch, "w");
         if (fp_Synch == NULL) {
-            printf("warning non riesco ad aprire %s\n", f_Synch);
-            exit(1);
+            kernel_error(pt, KERNEL_ERROR, "warning non riesco ad aprire %s", f_Synch);
+            return;
         }
         flux_header(fp_Synch);
     }
@@ -135,6 +136,34 @@ void spettro_sincrotrone(int Num_file, struct spettro * pt) {
     }
     //========================================================
 
+    //with n_threads>1 j_nu and alfa_nu are evaluated in parallel
+    //and then used in the loop below
+    //if the Sync stage is clean the values of the last run are used
+    j_Sync_par = NULL;
+    alfa_Sync_par = NULL;
+    if (!(pt->dirty_stages & STAGE_SYNC)) {
+        j_Sync_par = malloc(pt->nu_seed_size * sizeof (double));
+        alfa_Sync_par = malloc(pt->nu_seed_size * sizeof (double));
+        if (j_Sync_par == NULL || alfa_Sync_par == NULL) {
+            free(j_Sync_par);
+            free(alfa_Sync_par);
+            j_Sync_par = NULL;
+            alfa_Sync_par = NULL;
+        } else {
+            memcpy(j_Sync_par, pt->j_Sync, pt->nu_seed_size * sizeof (double));
+            memcpy(alfa_Sync_par, pt->alfa_Sync, pt->nu_seed_size * sizeof (double));
+        }
+    }
+    if (j_Sync_par == NULL && get_n_threads(pt) > 1) {
+        j_Sync_par = calloc(pt->nu_seed_size, sizeof (double));
+        alfa_Sync_par = calloc(pt->nu_seed_size, sizeof (double));
+        if (j_Sync_par == NULL || alfa_Sync_par == NULL || !eval_Sync_grid(pt, j_Sync_par, alfa_Sync_par)) {
+            free(j_Sync_par);
+            free(alfa_Sync_par);
+            j_Sync_par = NULL;
+            alfa_Sync_par = NULL;
+        }
+    }
 
     for (NU_INT = 0; NU_INT <= I_MAX; NU_INT++) {
 
@@ -154,11 +183,19 @@ void spettro_sincrotrone(int Num_file, struct spettro * pt) {
         if ( pt->nu_Sync[NU_INT] <= pt->nu_stop_Sync &&  pt->nu_Sync[NU_INT] >= pt->nu_start_Sync && stop != 1) {
 
             /* erg*s^-1*cm^-3*Hz^-1*sterad^-1 */
-            pt->j_Sync[NU_INT] = j_nu_Sync(pt);
+            if (j_Sync_par != NULL) {
+                pt->j_Sync[NU_INT] = j_Sync_par[NU_INT];
+            } else {
+                pt->j_Sync[NU_INT] = j_nu_Sync(pt);
+            }
 
             if (pt->do_Sync == 2) {
                 /* cm^-1 */
-                pt->alfa_Sync[NU_INT] = alfa_nu_Sync(pt);
+                if (alfa_Sync_par != NULL) {
+                    pt->alfa_Sync[NU_INT] = alfa_Sync_par[NU_INT];
+                } else {
+                    pt->alfa_Sync[NU_INT] = alfa_nu_Sync(pt);
+                }
 
             }
 
@@ -217,6 +254,9 @@ void spettro_sincrotrone(int Num_file, struct spettro * pt) {
 
     }
 
+    free(j_Sync_par);
+    free(alfa_Sync_par);
+
     //Se ancora non ha trovato nu_stop
     if (!stop) {
         pt->NU_INT_STOP_Sync_SSC = NU_INT - 1;
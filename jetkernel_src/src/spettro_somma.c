@@ -5,6 +5,7 @@
 #include <stdio.h>
 #include <math.h>
 #include <string.h>
+#include <errno.h>
 #include <unistd.h>
 #include "Blazar_SED.h"
 
@@ -23,7 +24,6 @@ void spettro_somma_Sync_ic(int Num_file, struct spettro * pt) {
 	double log_nu, log_nu_start, nuF_nu_obs, k;
 	unsigned long I_MAX, i;
 	FILE *fp, *fpll, *fpll_src;
-	const char *s;
 	//printf("**********************  CALCOLO DELLO SPETTRO SOMMA  *******************************\n");
 
 
@@ -33,10 +33,8 @@ void spettro_somma_Sync_ic(int Num_file, struct spettro * pt) {
 
 		fp = fopen(somma_obs, "w");
 		if (fp == NULL) {
-			printf("non posso aprire %s\n ", somma_obs);
-			perror(s);
-			exit(1);
-			;
+			kernel_error(pt, KERNEL_ERROR, "non posso aprire %s: %s", somma_obs, strerror(errno));
+			return;
 		}
 
 
@@ -45,9 +43,9 @@ void spettro_somma_Sync_ic(int Num_file, struct spettro * pt) {
 
 		fpll = fopen(somma_obs_log_log, "w");
 		if (fpll == NULL) {
-			printf("non posso aprire %s\n ", somma_obs_log_log);
-			perror(s);
-			exit(1);
+			fclose(fp);
+			kernel_error(pt, KERNEL_ERROR, "non posso aprire %s: %s", somma_obs_log_log, strerror(errno));
+			return;
 		}
 
 
@@ -56,9 +54,10 @@ void spettro_somma_Sync_ic(int Num_file, struct spettro * pt) {
 				pt->path, pt->STEM);
 		fpll_src = fopen(somma_obs_src, "w");
 		if (fpll_src == NULL) {
-			printf("non posso aprire %s\n ", somma_obs_src);
-			perror(s);
-			exit(1);
+			fclose(fp);
+			fclose(fpll);
+			kernel_error(pt, KERNEL_ERROR, "non posso aprire %s: %s", somma_obs_src, strerror(errno));
+			return;
 		}
 		somma_header(fp);
 		somma_log_log_header(fpll);
@@ -210,6 +209,7 @@ void interpola_somma(struct spettro *pt_j, double nu_obs, unsigned long i)
 	//Sync
 	if (pt_j->do_Sync >= 1) {
 		interp_flux=log_lin_interp( nu_obs,  pt_j->nu_Sync_obs,  pt_j->nu_start_Sync_obs,pt_j->nu_stop_Sync_obs, pt_j->nuF_nu_Sync_obs , pt_j->nu_seed_size, pt_j->emiss_lim);
+		pt_j->profile.n_interp++;
 		//printf("Sync interp_flux=%e\n",interp_flux);
 		//printf("Sync interp_flux=%e %e %e %e  %lu \n",interp_flux,nu_obs,  pt_j->nu_start_Sync_obs,pt_j->nu_stop_Sync_obs, pt_j->nu_seed_size);
 		if (interp_flux > pt_j->emiss_lim) {
@@ -224,6 +224,7 @@ void interpola_somma(struct spettro *pt_j, double nu_obs, unsigned long i)
 	//SSC
 	if (pt_j->do_SSC) {
 		interp_flux=log_lin_interp( nu_obs,  pt_j->nu_SSC_obs,  pt_j->nu_start_SSC_obs,pt_j->nu_stop_SSC_obs, pt_j->nuF_nu_SSC_obs , pt_j->nu_IC_size, pt_j->emiss_lim);
+		pt_j->profile.n_interp++;
 		//printf("SSC interp_flux=%e %e %e  %lu \n",interp_flux,  pt_j->nu_start_SSC_obs,pt_j->nu_stop_SSC_obs, pt_j->nu_IC_size);
 
 		if (interp_flux > pt_j->emiss_lim) {
@@ -238,6 +239,7 @@ void interpola_somma(struct spettro *pt_j, double nu_obs, unsigned long i)
 	//EC Disk
 	if (pt_j->do_EC_Disk == 1) {
 		interp_flux=log_lin_interp( nu_obs,  pt_j->nu_EC_Disk_obs,  pt_j->nu_start_EC_Disk_obs,pt_j->nu_stop_EC_Disk_obs, pt_j->nuF_nu_EC_Disk_obs , pt_j->nu_IC_size, pt_j->emiss_lim);
+		pt_j->profile.n_interp++;
 
 		if (interp_flux > pt_j->emiss_lim) {
 			pt_j->nuFnu_EC_Disk_grid[i] = interp_flux;
@@ -251,6 +253,7 @@ void interpola_somma(struct spettro *pt_j, double nu_obs, unsigned long i)
 	//EC BLR
 	if (pt_j->do_EC_BLR == 1) {
 		interp_flux=log_lin_interp( nu_obs,  pt_j->nu_EC_BLR_obs,  pt_j->nu_start_EC_BLR_obs,pt_j->nu_stop_EC_BLR_obs, pt_j->nuF_nu_EC_BLR_obs , pt_j->nu_IC_size, pt_j->emiss_lim);
+		pt_j->profile.n_interp++;
 
 		if (interp_flux > pt_j->emiss_lim) {
 			pt_j->nuFnu_EC_BLR_grid[i] = interp_flux;
@@ -265,6 +268,7 @@ void interpola_somma(struct spettro *pt_j, double nu_obs, unsigned long i)
 	//EC DT
 	if (pt_j->do_EC_DT == 1) {
 		interp_flux=log_lin_interp( nu_obs,  pt_j->nu_EC_DT_obs,  pt_j->nu_start_EC_DT_obs,pt_j->nu_stop_EC_DT_obs, pt_j->nuF_nu_EC_DT_obs , pt_j->nu_IC_size, pt_j->emiss_lim);
+		pt_j->profile.n_interp++;
 
 		if (interp_flux > pt_j->emiss_lim) {
 			pt_j->nuFnu_EC_DT_grid[i] = interp_flux;
@@ -279,6 +283,7 @@ void interpola_somma(struct spettro *pt_j, double nu_obs, unsigned long i)
 	//EC Star
 	if (pt_j->do_EC_Star == 1) {
 		interp_flux=log_lin_interp( nu_obs,  pt_j->nu_EC_Star_obs,  pt_j->nu_start_EC_Star_obs,pt_j->nu_stop_EC_Star_obs, pt_j->nuF_nu_EC_Star_obs , pt_j->nu_IC_size, pt_j->emiss_lim);
+		pt_j->profile.n_interp++;
 
 		if (interp_flux > pt_j->emiss_lim) {
 			pt_j->nuFnu_EC_Star_grid[i] = interp_flux;
@@ -292,6 +297,7 @@ void interpola_somma(struct spettro *pt_j, double nu_obs, unsigned long i)
 	//EC CMB
 	if (pt_j->do_EC_CMB == 1) {
 		interp_flux=log_lin_interp( nu_obs,  pt_j->nu_EC_CMB_obs,  pt_j->nu_start_EC_CMB_obs,pt_j->nu_stop_EC_CMB_obs, pt_j->nuF_nu_EC_CMB_obs , pt_j->nu_IC_size, pt_j->emiss_lim);
+		pt_j->profile.n_interp++;
 
 		if (interp_flux > pt_j->emiss_lim) {
 			pt_j->nuFnu_EC_CMB_grid[i] = interp_flux;
@@ -305,6 +311,7 @@ void interpola_somma(struct spettro *pt_j, double nu_obs, unsigned long i)
 	/* //EC CMB 
 	if (pt_j->do_EC_CMB_stat == 1) {
 		interp_flux=log_lin_interp( nu_obs,  pt_j->nu_EC_CMB_stat_obs,  pt_j->nu_start_EC_CMB_stat_obs,pt_j->nu_stop_EC_CMB_stat_obs, pt_j->nuF_nu_EC_CMB_stat_obs, pt_j->nu_IC_size, pt_j->emiss_lim);
+		pt_j->profile.n_interp++;
 
 		if (interp_flux > pt_j->emiss_lim) {
 			pt_j->nuFnu_EC_CMB_stat_grid[i] = interp_flux;
@@ -319,6 +326,7 @@ void interpola_somma(struct spettro *pt_j, double nu_obs, unsigned long i)
 	if (pt_j->do_EC_Disk==1 || pt_j->do_EC_BLR==1 || pt_j->do_Disk==1) {
 
 		interp_flux=log_lin_interp( nu_obs,  pt_j->nu_Disk_obs,  pt_j->nu_start_Disk_obs,pt_j->nu_stop_Disk_obs, pt_j->nuF_nu_Disk_obs , pt_j->nu_seed_size, pt_j->emiss_lim);
+		pt_j->profile.n_interp++;
 		if (interp_flux > pt_j->emiss_lim) {
 			pt_j->nuFnu_Disk_grid[i] = interp_flux;
 		}
@@ -332,6 +340,7 @@ void interpola_somma(struct spettro *pt_j, double nu_obs, unsigned long i)
 	//Dusty Torus
 	if (pt_j->do_EC_DT==1 || pt_j->do_DT==1) {
 		interp_flux=log_lin_interp( nu_obs,  pt_j->nu_DT_obs,  pt_j->nu_start_DT_obs,pt_j->nu_stop_DT_obs, pt_j->nuF_nu_DT_obs , pt_j->nu_seed_size, pt_j->emiss_lim);
+		pt_j->profile.n_interp++;
 
 		if (interp_flux > pt_j->emiss_lim) {
 			pt_j->nuFnu_DT_grid[i] = interp_flux;
@@ -345,6 +354,7 @@ void interpola_somma(struct spettro *pt_j, double nu_obs, unsigned long i)
 	//Star
 	if (pt_j->do_EC_Star==1) {
 		interp_flux=log_lin_interp( nu_obs,  pt_j->nu_Star_obs,  pt_j->nu_start_Star_obs,pt_j->nu_stop_Star_obs, pt_j->nuF_nu_Star_obs , pt_j->nu_seed_size, pt_j->emiss_lim);
+		pt_j->profile.n_interp++;
 
 		if (interp_flux > pt_j->emiss_lim) {
 			pt_j->nuFnu_Star_grid[i] = interp_flux;
@@ -0,0 +1,210 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <stddef.h>
+#include <string.h>
+#include "Blazar_SED.h"
+
+
+//========================
+//DIRTY STAGES
+//========================
+// Init and Run_SED recompute only the stages whose inputs changed since the
+// last run:
+// - STAGE_ELEC electron distribution (InitNe)
+// - STAGE_SYNC synchrotron emissivity and absorption (j_Sync, alfa_Sync)
+// - STAGE_SSC  SSC rates (q_comp_SSC)
+// - STAGE_EXT  external seed photon fields (spectra_External_Fields)
+// - STAGE_EC   EC spectra (spettro_EC)
+// A copy of the struct spettro is kept in stage_snapshot at the end of Init
+// and Run_SED. At the next call the parameters listed in stage_fields are
+// compared with the copy, and each changed parameter marks its stages;
+// any other change of the struct (grid sizes, flags, distribution type, ...)
+// marks all the stages. The functions writing the electron arrays mark
+// STAGE_ELEC directly.
+// The Sync and SSC loops always run, using the stored emissivities and rates
+// when their stage is clean, so that changing only the beaming, the redshift
+// or R re-transforms the spectra without integrating them again.
+// dirty_stages is cleared only when Run_SED completes, hence after a kernel
+// error the stages are evaluated again.
+// A copy of the blob (see blob_state.c) takes the stages pending in the
+// original blob (get_pending_stages), and its own snapshot, so that its next
+// run evaluates the same stages as the next run of the original blob.
+// The numerical fields of stage_fields are also the model parameters that can
+// be set by index (get_par_index, get_par_field), as done by eval_batch.
+
+
+struct stage_field {
+    const char * name;
+    size_t offset;
+    size_t size;
+    int stages;
+};
+
+#define STAGE_FIELD(name, stages) {#name, offsetof(struct spettro, name), sizeof(((struct spettro *) 0)->name), stages}
+
+static const struct stage_field stage_fields[] = {
+    //not affecting the spectra
+    STAGE_FIELD(verbose, 0),
+    STAGE_FIELD(n_threads, 0),
+    STAGE_FIELD(error_code, 0),
+    STAGE_FIELD(error_msg, 0),
+    STAGE_FIELD(error_jmp_env, 0),
+    STAGE_FIELD(dirty_stages, 0),
+    STAGE_FIELD(stage_snapshot, 0),
+    STAGE_FIELD(do_profile, 0),
+    STAGE_FIELD(profile, 0),
+
+    //emitting region
+    STAGE_FIELD(B, STAGE_SYNC),
+    STAGE_FIELD(R, STAGE_SSC | STAGE_EC),
+    STAGE_FIELD(beam_obj, STAGE_EC),
+    STAGE_FIELD(BulkFactor, STAGE_EXT),
+    STAGE_FIELD(theta, STAGE_EXT),
+    STAGE_FIELD(z_cosm, STAGE_EXT),
+
+    //external fields
+    STAGE_FIELD(R_H, STAGE_EXT),
+    STAGE_FIELD(L_Disk, STAGE_EXT),
+    STAGE_FIELD(T_Disk, STAGE_EXT),
+    STAGE_FIELD(accr_eff, STAGE_EXT),
+    STAGE_FIELD(M_BH, STAGE_EXT),
+    STAGE_FIELD(R_inner_Sw, STAGE_EXT),
+    STAGE_FIELD(R_ext_Sw, STAGE_EXT),
+    STAGE_FIELD(disk_type, STAGE_EXT),
+    STAGE_FIELD(tau_BLR, STAGE_EXT),
+    STAGE_FIELD(R_BLR_in, STAGE_EXT),
+    STAGE_FIELD(R_BLR_out, STAGE_EXT),
+    STAGE_FIELD(T_DT, STAGE_EXT),
+    STAGE_FIELD(R_DT, STAGE_EXT),
+    STAGE_FIELD(tau_DT, STAGE_EXT),
+
+    //electron distribution
+    STAGE_FIELD(N, STAGE_ELEC),
+    STAGE_FIELD(gmin, STAGE_ELEC),
+    STAGE_FIELD(gmax, STAGE_ELEC),
+    STAGE_FIELD(p, STAGE_ELEC),
+    STAGE_FIELD(p_1, STAGE_ELEC),
+    STAGE_FIELD(gamma_break, STAGE_ELEC),
+    STAGE_FIELD(gamma_cut, STAGE_ELEC),
+    STAGE_FIELD(r, STAGE_ELEC),
+    STAGE_FIELD(s, STAGE_ELEC),
+    STAGE_FIELD(gamma0_log_parab, STAGE_ELEC),
+    STAGE_FIELD(gammap_log_parab, STAGE_ELEC),
+    STAGE_FIELD(gamma_inj, STAGE_ELEC),
+    STAGE_FIELD(spit_index, STAGE_ELEC),
+    STAGE_FIELD(spit_temp, STAGE_ELEC),
+    STAGE_FIELD(spit_gamma_th, STAGE_ELEC),
+    STAGE_FIELD(gamma_pile_up, STAGE_ELEC),
+    STAGE_FIELD(gamma_pile_up_cut, STAGE_ELEC),
+    STAGE_FIELD(alpha_pile_up, STAGE_ELEC),
+    STAGE_FIELD(ratio_pile_up, STAGE_ELEC),
+};
+
+
+
+static int changed_stages(struct spettro *pt){
+    // compares the struct with stage_snapshot, and returns the stages
+    // marked by the changed members
+    struct spettro * pt_masked;
+    unsigned long i;
+    int stages;
+
+    if (pt->stage_snapshot == NULL){
+        return STAGE_ALL;
+    }
+    // copy of the struct with the stage_fields taken from the snapshot,
+    // any remaining difference is a change of an untracked member
+    pt_masked = malloc(sizeof(struct spettro));
+    if (pt_masked == NULL){
+        return STAGE_ALL;
+    }
+    stages = 0;
+    memcpy(pt_masked, pt, sizeof(struct spettro));
+    for (i = 0; i < sizeof(stage_fields)/sizeof(stage_fields[0]); i++){
+        if (memcmp((char *) pt + stage_fields[i].offset,
+                   (char *) pt->stage_snapshot + stage_fields[i].offset,
+                   stage_fields[i].size) != 0){
+            stages |= stage_fields[i].stages;
+        }
+        memcpy((char *) pt_masked + stage_fields[i].offset,
+               (char *) pt->stage_snapshot + stage_fields[i].offset,
+               stage_fields[i].size);
+    }
+    if (memcmp(pt_masked, pt->stage_snapshot, sizeof(struct spettro)) != 0){
+        stages = STAGE_ALL;
+    }
+    free(pt_masked);
+    return stages;
+}
+
+
+
+void update_dirty_stages(struct spettro *pt){
+    // marks the changed stages and the stages depending on them
+    pt->dirty_stages |= changed_stages(pt);
+
+    if (pt->dirty_stages & STAGE_ELEC){
+        pt->dirty_stages |= STAGE_SYNC | STAGE_SSC | STAGE_EC;
+    }
+    if (pt->dirty_stages & STAGE_SYNC){
+        pt->dirty_stages |= STAGE_SSC;
+    }
+    if (pt->dirty_stages & STAGE_EXT){
+        pt->dirty_stages |= STAGE_EC;
+    }
+}
+
+
+
+int get_pending_stages(struct spettro *pt){
+    // stages marked for the next run, without changing the blob
+    return pt->dirty_stages | changed_stages(pt);
+}
+
+
+
+void save_stage_snapshot(struct spettro *pt){
+    // if the copy can not be allocated the next run evaluates all the stages
+    if (pt->stage_snapshot == NULL){
+        pt->stage_snapshot = malloc(sizeof(struct spettro));
+        if (pt->stage_snapshot == NULL){
+            return;
+        }
+    }
+    memcpy(pt->stage_snapshot, pt, sizeof(struct spettro));
+}
+
+
+
+void free_stage_snapshot(struct spettro *pt){
+    free(pt->stage_snapshot);
+    pt->stage_snapshot = NULL;
+}
+
+
+
+int get_par_index(char *name){
+    // index of the model parameter `name` in stage_fields,
+    // -1 if `name` is not a numerical model parameter
+    unsigned long i;
+
+    for (i = 0; i < sizeof(stage_fields)/sizeof(stage_fields[0]); i++){
+        if (stage_fields[i].stages != 0 && stage_fields[i].size == sizeof(double)
+            && strcmp(stage_fields[i].name, name) == 0){
+            return i;
+        }
+    }
+    return -1;
+}
+
+
+
+double * get_par_field(struct spettro *pt, int par_index){
+    // pointer to the model parameter with index par_index,
+    // NULL if par_index is not the index of a numerical model parameter
+    if (par_index < 0 || par_index >= (int) (sizeof(stage_fields)/sizeof(stage_fields[0]))
+        || stage_fields[par_index].stages == 0 || stage_fields[par_index].size != sizeof(double)){
+        return NULL;
+    }
+    return (double *) ((char *) pt + stage_fields[par_index].offset);
+}
@@ -264,8 +264,8 @@
     sprintf(stringa, "%s%s-inj-profile.dat", pt_ev->path, pt_ev->STEM);
     fp = fopen(stringa, "w");
     if (fp == NULL) {
-    	printf("warning non riesco ad aprire %s\n", fp);
-        exit(1);
+    	kernel_error(pt_spec, KERNEL_ERROR, "warning non riesco ad aprire %s", stringa);
+        return;
     }
     fprintf(fp, "#t inj_prof\n");
 
@@ -283,8 +283,8 @@
     path, pt_ev->STEM);
     fp = fopen(stringa, "w");
     if (fp == NULL) {
-    	printf("warning non riesco ad aprire %s\n", fp);
-        exit(1);
+    	kernel_error(pt_spec, KERNEL_ERROR, "warning non riesco ad aprire %s", stringa);
+        return;
     }
     fprintf(fp, "#gamma t_Sync_cool t_D t_DA t_A\n");
 
@@ -420,8 +420,8 @@
 
     fp = fopen(stringa, "w");
     if (fp == NULL) {
-        printf("warning non riesco ad aprire %s\n", fp);
-        exit(1);
+        kernel_error(pt_spec, KERNEL_ERROR, "warning non riesco ad aprire %s", stringa);
+        return;
     }
     distr_e_header(fp);
 
@@ -578,8 +578,8 @@
             //printf("N=%e T=%d G=%d\n",N1[TMP],T,TMP);
         }
         if (solve_sys1(A, B, C, R, N1, E_SIZE) > 0) {
-            printf("errore nella soluzione del sistema condizione di positivita' non soddisfatta\n ");
-            exit(1);
+            kernel_error(pt_spec, KERNEL_ERROR, "errore nella soluzione del sistema condizione di positivita' non soddisfatta");
+            return;
         }
         //printf("********dopo sys********************\n");
         for (TMP = 0; TMP < E_SIZE; TMP++) {
@@ -602,6 +602,8 @@
             sprintf(name1, "distr-e-evol.dat");
 
             EvalU_e(pt_spec);
+            //Ne is evolved in place
+            pt_spec->dirty_stages |= STAGE_ELEC;
             Run_SED(pt_spec);
 
             Scrivi_N_file(pt_spec, name1, pt_spec->griglia_gamma_Ne_log, pt_spec->Ne);
@@ -4,6 +4,7 @@ JetSeT package
 
 
 import pkgutil
+import importlib
 import os
 import json
 
@@ -24,14 +25,23 @@ if 'label'  in _info.keys():
 else:
     __label__= None
 
-for importer, modname, ispkg in pkgutil.walk_packages(path=[pkg_dir],
-                                                      prefix=pkg_name+'.',
-                                                      onerror=lambda x: None):
+#the submodules are not imported here, but at the first access as attributes
+#of the package, e.g. jetset.jet_model
+_submodules=[]
+for importer, modname, ispkg in pkgutil.iter_modules(path=[pkg_dir]):
 
     if ispkg == True:
-        __all__.append(modname)
+        __all__.append(pkg_name+'.'+modname)
     else:
         pass
 
+    _submodules.append(modname)
 
-    data_dir=os.path.dirname(__file__)+'/data'
\ No newline at end of file
+data_dir=os.path.dirname(__file__)+'/data'
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module('.'+name, __name__)
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
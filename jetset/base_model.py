@@ -13,7 +13,52 @@ import numpy as np
 import json
 import pickle
 
-__all__=['Model']
+__all__=['Model','EvalPlan']
+
+
+class EvalPlan(object):
+    """
+    Linear interpolation of a function tabulated on the grid `x`, at the fixed
+    points `x_new`, giving the same values as :class:`scipy.interpolate.interp1d`
+    (:func:`numpy.interp`) for finite tabulated values.
+    Only the points within the grid (:attr:`msk`) are interpolated.
+    The bracketing indices and the distances from the grid points are computed
+    once, hence each evaluation only gathers and blends the tabulated values
+    bracketing the points.
+    """
+    def __init__(self,x,x_new):
+        self.x=x
+        self.x_new=np.array(x_new)
+
+        self.msk=self.x_new > x.min()
+        self.msk*=self.x_new < x.max()
+
+        x_new_msk=self.x_new[self.msk]
+        #x[lo] <= x_new < x[hi], as numpy.interp
+        self.hi=np.searchsorted(x,x_new_msk,side='right').clip(1,x.size-1)
+        self.lo=self.hi-1
+        self.dx=x[self.hi]-x[self.lo]
+        self.dx_new=x_new_msk-x[self.lo]
+
+    def gather(self,y):
+        """
+        returns the values of `y` (along its last axis) bracketing the points
+        """
+        return y[...,self.lo],y[...,self.hi]
+
+    def blend(self,y_lo,y_hi):
+        """
+        returns the interpolated values at the points within the grid,
+        from the bracketing values returned by :meth:`gather`
+        """
+        #as numpy.interp
+        slope=(y_hi-y_lo)/self.dx
+        return slope*self.dx_new+y_lo
+
+    def interp(self,y):
+        return self.blend(*self.gather(y))
+
+
 class Model(object):
     
     
@@ -142,6 +187,16 @@ class Model(object):
         else:
             return  np.log10(nu_residuals[msk]),  residuals[msk]
 
+    def __getstate__(self):
+        """
+        state used by pickle and copy, the subclasses remove the members that
+        can be rebuilt in :meth:`__setstate__`
+        """
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
     def save_model(self, file_name):
 
 
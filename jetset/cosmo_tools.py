@@ -6,6 +6,7 @@ from builtins import (bytes, str, open, super, range,
 
 __author__ = "Andrea Tramacere"
 
+import numpy as np
 from astropy.units import  Unit as u
 
 
@@ -40,6 +41,43 @@ class  Cosmo (object):
 
         self._c = _c
         self._DL_cm = DL_cm
+        self._init_DL_cache()
+
+    def _init_DL_cache(self):
+        #luminosity distances memoised per redshift, and optional interpolation table
+        self._DL_cache = {}
+        self._DL_table = None
+
+    def __setstate__(self, state):
+        #pickled Cosmo objects, before the distance cache
+        self._init_DL_cache()
+        self.__dict__.update(state)
+
+    def build_DL_table(self,z_min=1E-4,z_max=10.,size=1000):
+        """
+        builds a table of the luminosity distance over `size` redshift values, log-spaced
+        between `z_min` and `z_max`, used by :meth:`get_DL_cm` by linear interpolation
+        in log-log, for the redshift values in the table range.
+        The relative error of the interpolation is below 1E-5 with the default values.
+        Useful for fits with the redshift free
+
+        :param z_min: minimum redshift
+        :param z_max: maximum redshift
+        :param size: size of the table
+        """
+        if self._c is None:
+            return
+
+        if z_min<=0 or z_max<=z_min:
+            raise RuntimeError('wrong redshift range, must be 0<z_min<z_max')
+
+        z=np.logspace(np.log10(z_min),np.log10(z_max),int(size))
+        self._DL_table=(np.log10(z),np.log10(self._eval_DL_cm(z)))
+        self._DL_cache.clear()
+
+    def clear_DL_table(self):
+        self._DL_table = None
+        self._DL_cache.clear()
 
     def __repr__(self):
         if self._c is not None:
@@ -53,23 +91,58 @@ class  Cosmo (object):
 
         return s
 
-    def get_DL_cm(self,z=None):
-        if self._c is not None:
-            #THIS IS FIXING THE ERROR WITH PICKLED COSMO
-            #TODO open issue on astropy!
-            try:
-                _d= self._c.luminosity_distance( z ).to('cm').value
-            except:
-                _d = self._c.luminosity_distance(z)
-                _d = _d.value*u(str(_d.unit))
-                _d = _d.to('cm').value
-        else:
-            _d = self._DL_cm
+    def _eval_DL_cm(self,z):
+        #THIS IS FIXING THE ERROR WITH PICKLED COSMO
+        #TODO open issue on astropy!
+        try:
+            _d= self._c.luminosity_distance( z ).to('cm').value
+        except:
+            _d = self._c.luminosity_distance(z)
+            _d = _d.value*u(str(_d.unit))
+            _d = _d.to('cm').value
 
         return _d
-    
-    
-
 
+    def _interp_DL_cm(self,z):
+        #from the table, None if z is out of the table range
+        log_z=np.log10(z)
+        log_z_table,log_DL_table=self._DL_table
+        if np.all(log_z>=log_z_table[0]) and np.all(log_z<=log_z_table[-1]):
+            return 10**np.interp(log_z,log_z_table,log_DL_table)
+        else:
+            return None
 
+    def get_DL_cm(self,z=None):
+        """
+        returns the luminosity distance in cm at redshift `z`, interpolated from the
+        table built by :meth:`build_DL_table` if `z` is in the table range, otherwise
+        from the astropy cosmology. Scalar values are memoised per redshift
+        """
+        if self._c is None:
+            return self._DL_cm
+
+        if np.ndim(z)>0 or z is None:
+            _d=None
+            if self._DL_table is not None and z is not None:
+                _d=self._interp_DL_cm(z)
+            if _d is None:
+                _d=self._eval_DL_cm(z)
+            return _d
+
+        z=float(z)
+        try:
+            return self._DL_cache[z]
+        except KeyError:
+            pass
+
+        _d=None
+        if self._DL_table is not None:
+            _d=self._interp_DL_cm(z)
+        if _d is None:
+            _d=self._eval_DL_cm(z)
+        _d=float(_d)
+        if len(self._DL_cache)>=1000:
+            self._DL_cache.clear()
+        self._DL_cache[z]=_d
 
+        return _d
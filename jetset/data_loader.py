@@ -996,7 +996,7 @@ class ObsData(object):
         self.data_reb['dnuFnu_data_log']=dy_bin
         
         #remove empty bins
-        msk=[self.data_reb['nu_data_log']!=0]
+        msk=self.data_reb['nu_data_log']!=0
         
         self.data_reb=self.data_reb[msk]
         
@@ -16,6 +16,8 @@ import os
 import json
 import  sys
 import pickle
+import time
+import copy
 import six
 
 import numpy as np
@@ -25,6 +27,7 @@ from scipy.interpolate import interp1d
 from astropy.table import Table
 import warnings
 import inspect
+from collections import OrderedDict
 
 
 
@@ -41,9 +44,9 @@ else:
 from . import spectral_shapes
 
 from .model_parameters import ModelParameterArray, ModelParameter
-from .base_model import  Model
+from .base_model import  Model, EvalPlan
 
-from .output import makedir,WorkPlace,clean_dir
+from .output import makedir,WorkPlace,clean_dir,get_sub_dir
 
 from .jetkernel_models_dic import nuFnu_obs_dic,gamma_dic,available_N_distr,N_distr_descr,n_seed_dic,allowed_disk_type
 
@@ -85,6 +88,18 @@ def old_model_warning():
     m+= '*' * 80 + '\n'
     warnings.warn(m)
 
+
+def _add_eval_profile(profile_sum,profile):
+    """
+    adds the :attr:`Jet.last_eval_profile` `profile` to `profile_sum`
+    """
+    for k,v in profile.items():
+        if isinstance(v,dict):
+            _add_eval_profile(profile_sum.setdefault(k,OrderedDict()),v)
+        else:
+            profile_sum[k]=profile_sum.get(k,0)+v
+
+
 class JetkerneltException(NoTraceBackWithLineNumber):
 
     def __init__(self, message='Jeset  exception', debug_message=''):
@@ -149,7 +164,9 @@ class JetParameter(ModelParameter):
     This class is a subclass of the :class:`.ModelParameter` class,
     extending the base class to  handles SSC/EC parameters, 
     overriding the :meth:`.ModelParameter.set` in order to propagate the
-    parameter value to the BlazarSED object instance
+    parameter value to the BlazarSED object instance.
+    The BlazarSED kernel tracks the changed parameters, and at the next
+    :meth:`.Jet.eval` only the stages depending on them are evaluated again
            
  
     """
@@ -441,18 +458,21 @@ class ElectronDistribution(object):
         #BlazarSED.MakeNe(self._jet._blob)
         BlazarSED.InitNe(self._jet._blob)
         self._N_name, self._gamma_name = gamma_dic['electron_distr']
-        self.Ne_ptr = getattr(self._jet._blob, self._N_name)
-        self.gamma_ptr = getattr(self._jet._blob, self._gamma_name)
 
+    #as for the spectral components, the pointers are always read from the blob
+    @property
+    def Ne_ptr(self):
+        return getattr(self._jet._blob, self._N_name)
 
-    def _fill(self):
-        size = self._jet._blob.gamma_grid_size
-        self.gamma = zeros(size)
-        self.n_gamma = zeros(size)
+    @property
+    def gamma_ptr(self):
+        return getattr(self._jet._blob, self._gamma_name)
 
-        for ID in range(size):
-            self.gamma[ID] = BlazarSED.get_elec_array(self.gamma_ptr, self._jet._blob, ID)
-            self.n_gamma[ID] = BlazarSED.get_elec_array(self.Ne_ptr, self._jet._blob, ID)
+
+    def _fill(self):
+        #the electron arrays are reallocated by InitNe, hence we keep a copy
+        self.gamma = np.array(BlazarSED.get_elec_array_view(self.gamma_ptr, self._jet._blob))
+        self.n_gamma = np.array(BlazarSED.get_elec_array_view(self.Ne_ptr, self._jet._blob))
 
 
     def plot(self, p=None, y_min=None,y_max=None,x_min=None,x_max=None):
@@ -647,15 +667,22 @@ class JetSeedPhotons(object):
         self._blob_object = blob_object
         self._n_name, self._nu_name = n_seed_dic[self.name]
 
-        self.n_ptr = getattr(blob_object, self._n_name)
-
-        self.nu_ptr = getattr(blob_object, self._nu_name)
         #self.SED = spectral_shapes.SED(name=self.name)
         if var_name is not None:
             self._var_name=var_name
 
         self.fill(emiss_lim=self._blob_object.emiss_lim)
 
+    #the spectral buffers are reallocated when the grid sizes change,
+    #hence the pointers are always read from the blob
+    @property
+    def n_ptr(self):
+        return getattr(self._blob_object, self._n_name)
+
+    @property
+    def nu_ptr(self):
+        return getattr(self._blob_object, self._nu_name)
+
     def fill(self,log_log=False,emiss_lim=0):
         self.nu,self.n=self.get_spectral_points(log_log=log_log,emiss_lim=emiss_lim)
 
@@ -664,14 +691,8 @@ class JetSeedPhotons(object):
         #try:
 
         size=self._blob_object.nu_seed_size
-        x=zeros(size)
-        y=zeros(size)
-
-        for i in range(size):
-            x[i]=BlazarSED.get_spectral_array(self.nu_ptr,self._blob_object,i)
-            y[i]=BlazarSED.get_spectral_array(self.n_ptr,self._blob_object,i)
-
-            #print("->%e %e"%(x[i],y[i]))
+        x=np.array(BlazarSED.get_spectral_array_view(self.nu_ptr,self._blob_object,size))
+        y=np.array(BlazarSED.get_spectral_array_view(self.n_ptr,self._blob_object,size))
 
         msk_nan=np.isnan(x)
         msk_nan+=np.isnan(y)
@@ -730,11 +751,7 @@ class JetSpecComponent(object):
 
         self._blob_object=blob_object
         self._nuFnu_name, self._nu_name=nuFnu_obs_dic[self.name]
-        
-        self.nuFnu_ptr=getattr(blob_object,self._nuFnu_name)
-        
-        self.nu_ptr=getattr(blob_object,self._nu_name)
-    
+
         self.SED=spectral_shapes.SED(name=self.name)
         self.seed_field=None
         #print('->',name,n_seed_dic.keys())
@@ -760,6 +777,14 @@ class JetSpecComponent(object):
         if state is not None and self._state_dict != {}:
             self.state=state
 
+    @property
+    def nuFnu_ptr(self):
+        return getattr(self._blob_object, self._nuFnu_name)
+
+    @property
+    def nu_ptr(self):
+        return getattr(self._blob_object, self._nu_name)
+
     def get_emiss_lim(self,seed=False):
         return self._blob_object.emiss_lim
 
@@ -778,14 +803,8 @@ class JetSpecComponent(object):
 
     def get_SED_points(self, log_log=False):
 
-        size = self._blob_object.nu_grid_size
-        x = zeros(size)
-        y = zeros(size)
-
-        for i in range(size):
-            x[i] = BlazarSED.get_spectral_array(self.nu_ptr, self._blob_object, i)
-            y[i] = BlazarSED.get_spectral_array(self.nuFnu_ptr, self._blob_object, i)
-
+        x = np.array(BlazarSED.get_spectral_array_view(self.nu_ptr, self._blob_object))
+        y = np.array(BlazarSED.get_spectral_array_view(self.nuFnu_ptr, self._blob_object))
 
         msk_nan = np.isnan(x)
         msk_nan += np.isnan(y)
@@ -810,13 +829,8 @@ class JetSpecComponent(object):
 
 
     def update(self):
-        size = self._blob.nu_grid_size
-        x = zeros(size)
-        y = zeros(size)
-
-        for i in range(size):
-            x[i] = BlazarSED.get_spectral_array(self.nu_ptr, self._blob, i)
-            y[i] = BlazarSED.get_spectral_array(self.nuFnu_ptr, self._blob, i)
+        x = BlazarSED.get_spectral_array_view(self.nu_ptr, self._blob_object)
+        y = BlazarSED.get_spectral_array_view(self.nuFnu_ptr, self._blob_object)
 
 
     def show(self):
@@ -918,7 +932,7 @@ class TempEvol(object):
 
 
     def run(self,jet):
-        BlazarSED.Run_temp_evolution(jet._blob, self._temp_ev)
+        BlazarSED.Run_temp_evolution(jet._blob, self._temp_ev, jet.get_DL_cm())
 
 
 class SpecCompList(object):
@@ -1033,11 +1047,15 @@ class Jet(Model):
 
         self._blob = self.build_blob(verbose=verbose)
 
+        self._eval_plan=None
+
+        self._eval_profile_sum=None
+
         if jet_workplace is None:
             jet_workplace=WorkPlace()
-            out_dir= jet_workplace.out_dir + '/' + self.name + '_jet_prod/'
+            out_dir= get_sub_dir(jet_workplace.out_dir, self.name + '_jet_prod')
         else:
-            out_dir=jet_workplace.out_dir+'/'+self.name+'_jet_prod/'
+            out_dir=get_sub_dir(jet_workplace.out_dir, self.name + '_jet_prod')
 
         self.set_path(out_dir,clean_work_dir=clean_work_dir)
 
@@ -1087,6 +1105,7 @@ class Jet(Model):
         self._IC_states = {}
         self._IC_states['on'] = 1
         self._IC_states['off'] = 0
+        self._IC_states['tabulated'] = 2
 
         self._external_field_transf = {}
         self._external_field_transf['blob'] = 0
@@ -1149,6 +1168,8 @@ class Jet(Model):
         blob.nu_start_grid = 1e6
         blob.nu_stop_grid = 1e30
 
+        BlazarSED.build_photons(blob)
+
         return blob
 
     def _serialize_model(self):
@@ -1170,6 +1191,7 @@ class Jet(Model):
         _model['internal_pars']['nu_seed_size'] = self.nu_seed_size
         _model['internal_pars']['gamma_grid_size'] = self.gamma_grid_size
         _model['internal_pars']['IC_nu_size']=self.IC_nu_size
+        _model['internal_pars']['IC_adaptive_tol']=self.IC_adaptive_tol
         _model['internal_pars']['nu_min']=self.nu_min
         _model['internal_pars']['nu_max']=self.nu_max
         _model['internal_pars']['Norm_distr'] = self.Norm_distr
@@ -1178,6 +1200,35 @@ class Jet(Model):
     def save_model(self,file_name):
         pickle.dump(self._serialize_model(), open(file_name, 'wb'), protocol=pickle.HIGHEST_PROTOCOL)
 
+    def clone(self):
+        """
+        returns a copy of the jet, the blob is copied with the computed spectra,
+        hence the model is not evaluated, and the next :meth:`eval` of the copy
+        evaluates only the stages that the next :meth:`eval` of this jet would.
+        Pickling the jet stores the blob in the same way.
+        """
+        return copy.deepcopy(self)
+
+    def _get_eval_config(self):
+        """
+        returns a hashable description of the model setup and of the grids,
+        used to key the :class:`.FitModel` evaluation cache
+        """
+        return (self._electron_distribution_name,
+                self._beaming_expr,
+                tuple((c.name, c.state) for c in self.spectral_components_list),
+                self.nu_size,
+                self.nu_seed_size,
+                self.gamma_grid_size,
+                self.IC_nu_size,
+                self.IC_adaptive_tol,
+                self.nu_min,
+                self.nu_max,
+                self.Norm_distr,
+                self.get_IC_mode(),
+                self.get_external_field_transf(),
+                self.get_emiss_lim())
+
     def _decode_model(self,_model):
 
         self.cosmo = _model['cosmo']
@@ -1825,9 +1876,20 @@ class Jet(Model):
         return self._blob.STEM
 
     def get_path(self):
+        if self._blob.path=='':
+            return None
         return self._blob.path
 
     def set_path(self,path,clean_work_dir=True):
+        """
+        sets the directory of the kernel output files, with `path=None`
+        no directory is created and the kernel does not write files
+        """
+        if path is None:
+            set_str_attr(self._blob,'path','')
+            self._blob.WRITE_TO_FILE=0
+            return
+
         if path.endswith('/'):
             pass
         else:
@@ -1848,6 +1910,15 @@ class Jet(Model):
 
 
     def set_IC_mode(self,val):
+        """
+        sets the IC evaluation mode:
+
+        - 'on': IC components evaluated with the exact Klein-Nishina kernel
+        - 'tabulated': IC components evaluated with the tabulated Klein-Nishina
+          kernel, faster, with a relative error on the kernel < 3E-4, and
+          typically ~1E-6 on the IC spectra
+        - 'off': IC components not evaluated
+        """
 
         if val not in self._IC_states.keys():
             raise RuntimeError('val',val,'not in allowed values',self._IC_states.keys())
@@ -1897,9 +1968,120 @@ class Jet(Model):
         return self._blob.nu_IC_size
 
     def set_IC_nu_size(self, val):
-        if val > 1000:
-            raise RuntimeError('value can not exceed 1000')
         self._blob.nu_IC_size = val
+        BlazarSED.build_photons(self._blob)
+
+    @property
+    def IC_adaptive_tol(self):
+        return self._blob.IC_adaptive_tol
+
+    @IC_adaptive_tol.setter
+    def IC_adaptive_tol(self, val):
+        self.set_IC_adaptive_tol(val)
+
+    def get_IC_adaptive_tol(self):
+        return self._blob.IC_adaptive_tol
+
+    def set_IC_adaptive_tol(self, val):
+        """
+        sets the tolerance (in dex) of the adaptive SSC and EC frequency grids:
+        the grids are refined where the log-log interpolation of the IC
+        emissivity misses the tolerance, hence they are dense around the peaks
+        and the cut-offs, and sparse in the tails, with at most `IC_nu_size`
+        points. With `val=0` (the default) the grids are uniform in log, with
+        `IC_nu_size` points. A tolerance of 0.01 typically needs a few tens of
+        points.
+        """
+        if val < 0:
+            raise RuntimeError('the tolerance must be >=0')
+
+        self._blob.IC_adaptive_tol = val
+
+    @property
+    def n_threads(self):
+        return self._blob.n_threads
+
+    @n_threads.setter
+    def n_threads(self, val):
+        self.set_n_threads(val)
+
+    def get_n_threads(self):
+        return self._blob.n_threads
+
+    def set_n_threads(self, val):
+        """
+        sets the number of threads used to evaluate the Sync, SSC and EC
+        frequency grids. The results do not depend on the number of threads.
+        If jetkernel is built without OpenMP, the evaluation is serial.
+        """
+        if int(val) != val or val < 1:
+            raise RuntimeError('the number of threads must be an integer >=1')
+
+        self._blob.n_threads = int(val)
+
+    @property
+    def do_profile(self):
+        return self._blob.do_profile==1
+
+    @do_profile.setter
+    def do_profile(self, val):
+        self.set_do_profile(val)
+
+    def get_do_profile(self):
+        return self._blob.do_profile==1
+
+    def set_do_profile(self, val):
+        """
+        switches on/off the timers of the evaluation stages reported by
+        :attr:`last_eval_profile`, the calls and the counters are always
+        recorded. The timers do not change the spectra.
+        """
+        self._blob.do_profile = int(bool(val))
+
+    @property
+    def last_eval_profile(self):
+        """
+        profile of the last :meth:`eval`, a dict with:
+
+        - `time`: wall time (s) of each stage of the kernel evaluation, 0 if
+          :attr:`do_profile` is off
+        - `calls`: number of calls of each stage, the stages that are up to
+          date are not evaluated, and are not counted
+        - `n_Sync_integrand`, `n_IC_integrand`: Sync and IC integrands evaluated
+        - `n_IC_rate`: IC rates evaluated
+        - `n_interp`: table and spectral interpolations
+
+        the stages are named after the kernel functions, see jetkernel_src/src/profile.c
+        """
+        profile=OrderedDict()
+        profile['time']=OrderedDict()
+        profile['calls']=OrderedDict()
+        for stage in range(BlazarSED.PROFILE_N_STAGES):
+            name=BlazarSED.get_profile_stage_name(stage)
+            profile['time'][name]=BlazarSED.get_profile_time(self._blob,stage)
+            profile['calls'][name]=BlazarSED.get_profile_calls(self._blob,stage)
+
+        for name in ['n_Sync_integrand','n_IC_integrand','n_IC_rate','n_interp']:
+            profile[name]=getattr(self._blob.profile,name)
+
+        return profile
+
+    def _start_eval_profile_sum(self):
+        """
+        starts summing the profiles of the next evaluations, see :meth:`_stop_eval_profile_sum`
+        """
+        self._eval_profile_sum=OrderedDict()
+        self._eval_profile_sum['n_eval']=0
+
+    def _stop_eval_profile_sum(self):
+        """
+        stops summing the profiles, and returns the sum of the profiles of the
+        evaluations from :meth:`_start_eval_profile_sum`, with the number of
+        evaluations in `n_eval`
+        """
+        profile_sum=self._eval_profile_sum
+        self._eval_profile_sum=None
+        return profile_sum
 
     @property
     def nu_seed_size(self):
@@ -1913,9 +2095,8 @@ class Jet(Model):
         self.set_seed_nu_size(val)
 
     def set_seed_nu_size(self,val):
-        if val>1000:
-            raise RuntimeError('value can not exceed 1000')
         self._blob.nu_seed_size=val
+        BlazarSED.build_photons(self._blob)
 
 
 
@@ -1995,11 +2176,180 @@ class Jet(Model):
 
     def _set_nu_grid_size(self, val):
         self._blob.nu_grid_size=val
-        #BlazarSED.build_photons(self._blob)
+        BlazarSED.build_photons(self._blob)
 
     def _get_nu_grid_size(self):
         return  self._blob.nu_grid_size
 
+    def autotune_grids(self,target_rel_error=0.01,nu_range=None,grids=None,sizes=None,dyn_range=3,n_timing=3,apply=True,verbose=True):
+        """
+        Chooses the cheapest sizes of the model grids meeting `target_rel_error`.
+
+        Each grid in `grids` is evaluated at the candidate `sizes`, with the
+        other grids at their current size, and the convergence error of each
+        spectral component is estimated against the last (largest) size.
+        The smallest size meeting the tolerance is taken for each grid, then
+        the combined setting is checked against all the grids at the largest
+        size, and until it meets the tolerance the grid with the largest error
+        on the worst component is moved to its next size.
+
+        The error of a component is the largest relative difference of its
+        nuFnu, at 100 frequencies in `nu_range`, where both the fluxes are
+        within `dyn_range` decades of the peak of the reference, and above the
+        emission limit, hence the shifts of the sharp cut-offs within a grid
+        step are not counted.
+
+        :param target_rel_error: (float) tolerance on the relative error
+        :param nu_range: (tuple) frequencies (Hz) where the error is estimated,
+            by default (nu_min, nu_max)
+        :param grids: (list) grids to tune, among `gamma_grid_size`, `nu_seed_size`,
+            `IC_nu_size` and `nu_size`, by default all of them
+        :param sizes: (dict) candidate sizes of each grid, in increasing order,
+            by default 1/8, 1/4, 1/2, 1, 2 and 4 times the current size
+        :param dyn_range: (float) decades below the peak of each component
+            used to estimate the error
+        :param n_timing: (int) evaluations timed for each setting, the fastest is reported
+        :param apply: (boolean) if True the tuned sizes are set, otherwise the
+            current sizes are restored
+        :param verbose: (boolean) prints the report
+
+        :returns: (astropy Table) one row for each evaluated setting, with
+            the grid sizes, the wall time of the evaluation, and the error of
+            each component. The row of the chosen setting has `selected` True.
+        """
+        _grids=['gamma_grid_size','nu_seed_size','IC_nu_size','nu_size']
+        if grids is None:
+            grids=_grids
+        for grid in grids:
+            if grid not in _grids:
+                raise RuntimeError('grid %s not in allowed'%grid,_grids)
+        if target_rel_error<=0:
+            raise RuntimeError('the target relative error must be >0')
+
+        start_sizes=dict([(grid,getattr(self,grid)) for grid in _grids])
+        if sizes is None:
+            sizes={}
+        _sizes={}
+        for grid in grids:
+            if grid in sizes:
+                _sizes[grid]=sorted(set([int(s) for s in sizes[grid]]))
+            else:
+                _sizes[grid]=sorted(set([max(10,int(start_sizes[grid]*f)) for f in (0.125,0.25,0.5,1,2,4)]))
+            if len(_sizes[grid])<2:
+                raise RuntimeError('at least two sizes are needed for the grid %s'%grid)
+
+        if nu_range is None:
+            nu_range=(self.nu_min,self.nu_max)
+        nu_log=np.linspace(np.log10(nu_range[0]),np.log10(nu_range[1]),100)
+        comp_names=[c.name for c in self.spectral_components_list]
+
+        def _set_sizes(setting):
+            for grid in _grids:
+                if getattr(self,grid)!=setting[grid]:
+                    setattr(self,grid,setting[grid])
+
+        def _eval_setting(setting,n_runs):
+            _set_sizes(setting)
+            t_eval=None
+            for i in range(max(1,n_runs)):
+                #the repeated runs evaluate all the stages
+                self._blob.dirty_stages=BlazarSED.STAGE_ALL
+                t_start=time.perf_counter()
+                self.eval()
+                t_run=time.perf_counter()-t_start
+                if t_eval is None or t_run<t_eval:
+                    t_eval=t_run
+            seds={}
+            for name in comp_names:
+                x,y=self.get_spectral_component_by_name(name).get_SED_points(log_log=True)
+                msk=np.isfinite(x)
+                seds[name]=np.interp(nu_log,x[msk],y[msk],left=-np.inf,right=-np.inf)
+            return seds,t_eval
+
+        def _errors(seds,seds_ref):
+            errs={}
+            log_lim=np.log10(self.get_emiss_lim())
+            for name in comp_names:
+                y,y_ref=seds[name],seds_ref[name]
+                y_min=max(log_lim,y_ref.max()-dyn_range)
+                msk=(y_ref>y_min)*(y>y_min)
+                if msk.sum()>0:
+                    errs[name]=np.abs(np.power(10.,y[msk]-y_ref[msk])-1).max()
+                else:
+                    errs[name]=0.
+            return errs
+
+        rows=[]
+        def _add_row(tuned,setting,t_eval,errs):
+            row=[tuned]+[setting[grid] for grid in _grids]+[t_eval,max(errs.values())]
+            row+=[errs[name] for name in comp_names]+[False]
+            rows.append(row)
+
+        try:
+            #each grid, with the others at the current size
+            tuned_sizes={}
+            tuned_errs={}
+            for grid in grids:
+                setting=dict(start_sizes)
+                setting[grid]=_sizes[grid][-1]
+                seds_ref,_=_eval_setting(setting,1)
+                for size in _sizes[grid][:-1]:
+                    setting[grid]=size
+                    seds,t_eval=_eval_setting(setting,n_timing)
+                    errs=_errors(seds,seds_ref)
+                    _add_row(grid,setting,t_eval,errs)
+                    if max(errs.values())<=target_rel_error:
+                        break
+                tuned_sizes[grid]=setting[grid]
+                tuned_errs[grid]=errs
+
+            #combined setting, against all the grids at the largest size
+            setting=dict(start_sizes)
+            for grid in grids:
+                setting[grid]=_sizes[grid][-1]
+            seds_ref,t_eval=_eval_setting(setting,1)
+            _add_row('reference',setting,t_eval,_errors(seds_ref,seds_ref))
+            while True:
+                setting=dict(start_sizes)
+                setting.update(tuned_sizes)
+                seds,t_eval=_eval_setting(setting,n_timing)
+                errs=_errors(seds,seds_ref)
+                _add_row('combined',setting,t_eval,errs)
+                if max(errs.values())<=target_rel_error:
+                    break
+                to_move=[grid for grid in grids if tuned_sizes[grid]<_sizes[grid][-1]]
+                if len(to_move)==0:
+                    break
+                worst=max(comp_names,key=lambda name: errs[name])
+                grid=max(to_move,key=lambda g: tuned_errs[g][worst])
+                tuned_sizes[grid]=_sizes[grid][_sizes[grid].index(tuned_sizes[grid])+1]
+                #not known at the new size
+                tuned_errs[grid]=dict([(name,0.) for name in comp_names])
+
+            if max(errs.values())>target_rel_error:
+                warnings.warn('the target relative error is not met by the largest sizes, the largest sizes are selected')
+            rows[-1][-1]=True
+        finally:
+            if apply is True and len(rows)>0 and rows[-1][-1] is True:
+                _set_sizes(setting)
+            else:
+                _set_sizes(start_sizes)
+            self.eval()
+
+        names=['tuned']+_grids+['time (s)','max rel. err.']+['rel. err. %s'%name for name in comp_names]+['selected']
+        report=Table(rows=rows,names=names)
+        report['time (s)'].format='%.4f'
+        for name in names[len(_grids)+2:-1]:
+            report[name].format='%.2e'
+
+        if verbose is True:
+            print("-----------------------------------------------------------------------------------------")
+            print("grids autotune report, target relative error %e:"%target_rel_error)
+            report.pprint_all()
+            print("-----------------------------------------------------------------------------------------")
+
+        return report
+
 
 
     def set_verbosity(self,val):
@@ -2196,15 +2546,13 @@ class Jet(Model):
 
         BlazarSED.Run_SED(self._blob)
 
+        if self._eval_profile_sum is not None:
+            self._eval_profile_sum['n_eval']+=1
+            _add_eval_profile(self._eval_profile_sum,self.last_eval_profile)
 
         if phys_output==True:
             BlazarSED.EnergeticOutput(self._blob)
 
-        nu_sed_sum,nuFnu_sed_sum= self.spectral_components.Sum.get_SED_points()
-        #self.get_SED_points()
-        #print('nu_sed_sum,nuFnu_sed_sum',nu_sed_sum,nuFnu_sed_sum)
-
-
         if fill_SED==True:
             #TODO check if this is not usefule!!!
             #self.SED.fill(nu=nu_sed_sum,nuFnu=nuFnu_sed_sum)
@@ -2219,7 +2567,7 @@ class Jet(Model):
 
         if nu is None:
 
-
+            nu_sed_sum,nuFnu_sed_sum= self.spectral_components.Sum.get_SED_points()
 
             if loglog==True:
 
@@ -2233,51 +2581,144 @@ class Jet(Model):
 
                 nu=array([nu])
 
-            if loglog==False:
-                nu_log=log10(nu)
-            else:
-                nu_log=nu
+            plan=self._get_eval_plan(nu,loglog)
 
+            #only the summed spectrum bracketing the frequencies is needed,
+            #with the emission limit applied as in get_SED_points
+            nuFnu_lo,nuFnu_hi=plan.gather(BlazarSED.get_spectral_array_view(self.spectral_components.Sum.nuFnu_ptr, self._blob))
+            nuFnu_log_msk=plan.blend(self._clip_emiss_log(nuFnu_lo),self._clip_emiss_log(nuFnu_hi))
 
-            nu_sed_log=np.log10(nu_sed_sum)
-            nuFnu_sed_log=np.log10(nuFnu_sed_sum)
-
-            msk= nu_log > nu_sed_log.min()
+            if loglog==False:
+                model=zeros(plan.x_new.size)
 
+                model[plan.msk] = power(10.0,nuFnu_log_msk)
 
-            msk*=  nu_log < nu_sed_log.max()
+            else:
+                model=zeros(plan.x_new.size) + np.log10(self.flux_plot_lim)
 
+                model[plan.msk] = nuFnu_log_msk
 
 
-            if loglog==False:
-                model=zeros(nu_log.size)
+        if plot is not None:
+            if label is None:
+                label= self.name
 
-                nuFnu_log=np.log10(nuFnu_sed_sum)
+            self.plot_model(plot, clean=True, label=label)
 
-                f_interp =interp1d(nu_sed_log,nuFnu_sed_log,bounds_error=True)
 
+        if get_model==True:
+            return model
+        else:
+            return None
 
-                model[msk] = power(10.0,f_interp(nu_log[msk]))
+    def _get_eval_plan(self,nu,loglog,nu_sed=None):
+        """
+        returns the :class:`.EvalPlan` interpolating the summed spectrum at `nu`,
+        the plan is kept, and built again only when `nu` or the frequency grid
+        of the model change, hence evaluating the model repeatedly at the same
+        frequencies (as the minimizers and the MCMC sampler do) does not
+        rebuild the interpolation. `nu_sed` is the frequency grid, by default
+        that of the summed spectrum of the blob.
+        """
+        if nu_sed is None:
+            nu_sed=BlazarSED.get_spectral_array_view(self.spectral_components.Sum.nu_ptr, self._blob)
+        plan=self._eval_plan
+        if plan is None or plan.loglog!=loglog or not np.array_equal(plan.nu,nu) or not np.array_equal(plan.nu_sed,nu_sed):
+            #as in get_SED_points
+            nu_sed_log=np.array(nu_sed)
+            nu_sed_log[np.isnan(nu_sed_log)]=0.
+            nu_sed_log=np.log10(nu_sed_log)
 
+            if loglog==False:
+                nu_log=log10(nu)
             else:
-                model=zeros(nu_log.size) + np.log10(self.flux_plot_lim)
+                nu_log=nu
 
-                f_interp =interp1d(nu_sed_log,nuFnu_sed_log,bounds_error=True)
+            plan=EvalPlan(nu_sed_log,nu_log)
+            plan.nu=np.array(nu)
+            plan.nu_sed=np.array(nu_sed)
+            plan.loglog=loglog
+            self._eval_plan=plan
+        return plan
+
+    def _clip_emiss_log(self,nuFnu):
+        #log10 of the spectrum values with NaN and values below the emission limit set to the limit
+        nuFnu=np.array(nuFnu)
+        nuFnu[np.isnan(nuFnu)]=self.get_emiss_lim()
+        nuFnu[nuFnu<self.get_emiss_lim()]=self.get_emiss_lim()
+        return np.log10(nuFnu)
+
+    def eval_batch(self,theta,nu,loglog=False):
+        """
+        Evaluates the model at the frequencies `nu` for each row of `theta`,
+        the values of the free parameters, in the order of `parameters.par_array`.
+        The loop over the samples runs in the BlazarSED code, and with
+        :attr:`n_threads` > 1 the samples are evaluated in parallel.
+        The parameters values are not changed, and the spectral components
+        are not updated.
+
+        :param theta: (array) of shape (n_samples, n_free_pars)
+        :param nu: (array) frequencies, log10 if `loglog` is True
+        :param loglog: (boolean), as in :meth:`eval`
+
+        :returns: (array) of shape (n_samples, n_nu), each row is equal to
+            the model returned by :meth:`eval` with `get_model=True`
+        """
+        if self.electron_distribution is None:
+            raise  RuntimeError('electron distribution not defined')
 
-                model[msk] = f_interp(nu_log[msk])
+        free_pars=[par for par in self.parameters.par_array if par.frozen==False]
+        theta=np.array(theta,dtype=np.float64,ndmin=2)
+        if theta.ndim!=2 or theta.shape[1]!=len(free_pars):
+            raise ValueError('theta must have shape (n_samples, %d)'%len(free_pars))
+
+        par_index=[]
+        par_vals=np.zeros(theta.shape)
+        z_cosm=self.parameters.z_cosm.val
+        for ID,par in enumerate(free_pars):
+            par_index.append(BlazarSED.get_par_index(par.name))
+            if par_index[-1]<0:
+                raise ValueError('parameter %s can not be evaluated in batch'%par.name)
+
+            if par.val_min is not None and np.any(theta[:,ID]<par.val_min):
+                raise RuntimeError("par=%s out of boundary=%e"%(par.name,par.val_min))
+            if par.val_max is not None and np.any(theta[:,ID]>par.val_max):
+                raise RuntimeError("par=%s out of boundary=%e"%(par.name,par.val_max))
+
+            if par.islog is True:
+                #scalar power, as in JetParameter.assign_val
+                par_vals[:,ID]=[10**val for val in theta[:,ID].tolist()]
+            else:
+                par_vals[:,ID]=theta[:,ID]
+            if par.name=='z_cosm':
+                z_cosm=par_vals[:,ID]
 
+        dist=np.zeros(theta.shape[0]) + self.cosmo.get_DL_cm(z_cosm)
 
-        if plot is not None:
-            if label is None:
-                label= self.name
+        try:
+            nu_sed,nuFnu_sed=BlazarSED.eval_batch(self._blob,par_index,par_vals,dist)
+        finally:
+            #the serial evaluation leaves the blob with the last sample
+            for par in free_pars:
+                par.assign_val(par.name,par.val)
+            self._update_spectral_components()
 
-            self.plot_model(plot, clean=True, label=label)
+        if shape(nu)==():
+            nu=array([nu])
 
+        #the frequency grid does not depend on the parameters
+        plan=self._get_eval_plan(nu,loglog,nu_sed=nu_sed)
+        nuFnu_lo,nuFnu_hi=plan.gather(nuFnu_sed)
+        model_msk=plan.blend(self._clip_emiss_log(nuFnu_lo),self._clip_emiss_log(nuFnu_hi))
 
-        if get_model==True:
-            return model
+        if loglog==False:
+            model=zeros((theta.shape[0],plan.x_new.size))
+            model[:,plan.msk]=power(10.0,model_msk)
         else:
-            return None
+            model=zeros((theta.shape[0],plan.x_new.size)) + np.log10(self.flux_plot_lim)
+            model[:,plan.msk]=model_msk
+
+        return model
 
     @safe_run
     def get_SED_points(self,log_log=False,name='Sum'):
@@ -2289,15 +2730,8 @@ class Jet(Model):
             nuFnu_ptr=spec_comp.nuFnu_ptr
             nu_ptr=spec_comp.nu_ptr
 
-            size=self._blob.nu_grid_size
-            x=zeros(size)
-            y=zeros(size)
-
-            for i in range(size):
-                x[i]=BlazarSED.get_spectral_array(nu_ptr,self._blob,i)
-                y[i]=BlazarSED.get_spectral_array(nuFnu_ptr,self._blob,i)
-
-                #print("%s %e %e"%(name,x[i],y[i]))
+            x=np.array(BlazarSED.get_spectral_array_view(nu_ptr,self._blob))
+            y=np.array(BlazarSED.get_spectral_array_view(nuFnu_ptr,self._blob))
 
             msk_nan=np.isnan(x)
             msk_nan+=np.isnan(y)
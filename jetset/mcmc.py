@@ -5,19 +5,259 @@ from builtins import (bytes, str, open, super, range,
 
 __author__ = "Andrea Tramacere"
 
-from .minimizer import  log_like
+from .minimizer import  log_like, FitObjective
 
 import emcee
 from itertools import cycle
 
 import numpy as np
 import scipy as sp
-from scipy import stats
+import scipy.linalg
+import scipy.optimize
 from .plot_sedfit import  plt
-import corner
 import pickle
+import uuid
+import multiprocessing
+
+__all__=['McmcSampler','GPEmulator']
+
+
+def _log_prior(theta,bounds):
+    _r=0.
+    for pi in range(len(theta)):
+        if bounds[pi][1] is not None:
+            if theta[pi]<bounds[pi][1]:
+                pass
+            else:
+                _r = -np.inf
+        if bounds[pi][0] is not None:
+            if theta[pi]>bounds[pi][0]:
+                pass
+            else:
+                _r=-np.inf
+
+    return _r
+
+
+def _log_like(theta,fit_model,fit_par_free,nu_fit,nuFnu_fit,err_nuFnu_fit,UL,loglog,use_UL):
+    #log-likelihood -chisq/2, as FitObjective.log_like, the chisq itself would be maximized by emcee
+    for pi in range(len(theta)):
+        fit_par_free[pi].set(val=theta[pi])
+
+    _m = fit_model.eval(nu=nu_fit, fill_SED=False, get_model=True, loglog=loglog)
+
+    _res_sum, _res, _res_UL= log_like(nuFnu_fit,
+                    _m,
+                    err_nuFnu_fit,
+                    UL,
+                    use_UL=use_UL)
+
+    return -0.5*_res_sum
+
+
+#log-probabilities of the models shipped to the process, by token
+_worker_log_probs={}
+
+
+def _init_worker(token,state):
+    _worker_log_probs[token]=_WorkerLogProb(state)
+
+
+class _WorkerLogProb(object):
+    """
+    log-probability evaluated in a worker process, on a copy of the model
+    unpickled from the state of the :class:`.McmcSampler`
+    """
+    def __init__(self,state):
+        _state=pickle.loads(state)
+        self.fit_model=_state['fit_model']
+        self.fit_par_free=[self.fit_model.parameters.get_par_by_name(name) for name in _state['fit_par_free']]
+        self.bounds=_state['bounds']
+        self.data=_state['data']
+        self.use_UL=_state['use_UL']
+        nu_fit,nuFnu_fit,err_nuFnu_fit,UL,loglog=self.data
+        self.objective=FitObjective(self.fit_model,self.fit_par_free,nu_fit,nuFnu_fit,err_nuFnu_fit,UL,loglog=loglog,use_UL=self.use_UL)
+
+    def __call__(self,theta):
+        lp = _log_prior(theta,self.bounds)
+        if not np.isfinite(lp):
+            return -np.inf
+        return lp + self.objective.log_like(theta)
+
+
+class _PoolLogProb(object):
+    """
+    picklable log-probability passed to the pool, only the token is pickled
+    when the state has been shipped by the pool initializer, otherwise each
+    process unpickles the model from the state at the first call
+    """
+    def __init__(self,state,shipped=False):
+        self.token=uuid.uuid4().hex
+        if shipped is True:
+            self.state=None
+        else:
+            self.state=state
+
+    def __call__(self,theta):
+        if self.token not in _worker_log_probs:
+            _worker_log_probs[self.token]=_WorkerLogProb(self.state)
+        return _worker_log_probs[self.token](theta)
+
+
+class GPEmulator(object):
+    """
+    Gaussian-process regression of a scalar function of the parameters, used as
+    surrogate of the log-likelihood. The mean is a quadratic form fitted by least
+    squares, the residuals are modelled by a squared-exponential kernel with one
+    length scale for each parameter, the hyperparameters maximize the marginal
+    likelihood. The parameters are standardized by the mean and the standard
+    deviation of the training points, and only the last `max_train` training
+    points are used, hence the emulator follows the points added by the sampler.
+    """
+    def __init__(self,ndim,max_train=200):
+        self.max_train=max_train
+        self.X=np.zeros((0,ndim))
+        self.y=np.zeros(0)
+        self._hyper=None
+
+    def _features(self,u):
+        ndim=u.shape[1]
+        cols=[np.ones(u.shape[0])]+[u[:,i] for i in range(ndim)]
+        cols+=[u[:,i]*u[:,j] for i in range(ndim) for j in range(i,ndim)]
+        return np.column_stack(cols)
+
+    def _kernel(self,u1,u2,amp,length):
+        d=(u1[:,np.newaxis,:]-u2[np.newaxis,:,:])/length
+        return amp*np.exp(-0.5*np.sum(d*d,axis=2))
+
+    def _neg_log_marginal(self,hyper,u,r):
+        amp,noise=np.exp(2*hyper[0]),np.exp(2*hyper[1])
+        K=self._kernel(u,u,amp,np.exp(hyper[2:]))+(noise+1E-10*amp)*np.eye(u.shape[0])
+        if not np.all(np.isfinite(K)):
+            return 1E300
+        try:
+            L=np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            return 1E300
+        alpha=sp.linalg.cho_solve((L,True),r)
+        return 0.5*r.dot(alpha)+np.log(np.diag(L)).sum()
+
+    def add_points(self,X,y):
+        """
+        adds the training points `X` with values `y`, the non finite values are skipped,
+        the emulator is updated by :meth:`fit`
+        """
+        X=np.array(X,dtype=np.float64,ndmin=2)
+        y=np.array(y,dtype=np.float64,ndmin=1)
+        msk=np.isfinite(y)
+        self.X=np.vstack([self.X,X[msk]])[-self.max_train:]
+        self.y=np.concatenate([self.y,y[msk]])[-self.max_train:]
+
+    def fit(self):
+        self.center=self.X.mean(axis=0)
+        self.scale=self.X.std(axis=0)
+        self.scale[self.scale==0]=1.0
+        u=(self.X-self.center)/self.scale
+        F=self._features(u)
+        self._beta=np.linalg.lstsq(F,self.y,rcond=None)[0]
+        r=self.y-F.dot(self._beta)
+
+        r_std=max(np.std(r),1E-10)
+        if self._hyper is None:
+            self._hyper=np.concatenate([[np.log(r_std),np.log(1E-3*r_std)],np.zeros(u.shape[1])])
+        bounds=[(np.log(r_std)-5,np.log(r_std)+5),(np.log(r_std)-12,np.log(r_std)+1)]+[(-5,5)]*u.shape[1]
+        self._hyper=np.clip(self._hyper,[b[0] for b in bounds],[b[1] for b in bounds])
+        res=sp.optimize.minimize(self._neg_log_marginal,self._hyper,args=(u,r),method='L-BFGS-B',bounds=bounds,options={'maxiter':20})
+        if np.isfinite(res.fun) and res.fun<1E300:
+            self._hyper=res.x
+
+        amp,noise=np.exp(2*self._hyper[0]),np.exp(2*self._hyper[1])
+        self._length=np.exp(self._hyper[2:])
+        self._amp=amp
+        K=self._kernel(u,u,amp,self._length)+(noise+1E-10*amp)*np.eye(u.shape[0])
+        self._u=u
+        self._alpha=sp.linalg.cho_solve((np.linalg.cholesky(K),True),r)
+
+    def predict(self,X):
+        u=(np.array(X,dtype=np.float64,ndmin=2)-self.center)/self.scale
+        return self._features(u).dot(self._beta)+self._kernel(u,self._u,self._amp,self._length).dot(self._alpha)
+
+
+class _DelayedAcceptanceMove(emcee.moves.StretchMove):
+    """
+    stretch move with delayed acceptance: each proposal is first accepted or
+    rejected using the log-probability of the emulator, the exact log-probability
+    is evaluated only for the proposals accepted by the emulator, and these are
+    accepted with the ratio of the exact and emulated probabilities.
+    The chain hence samples the exact posterior, for any emulator.
+    During the first `refine_steps` steps the exact evaluations are added to the
+    emulator, that is fitted again each `refine_every` new points.
+    """
+    def __init__(self,emulator,log_prior,refine_steps=0,refine_every=50,**kwargs):
+        super(_DelayedAcceptanceMove,self).__init__(**kwargs)
+        self.emulator=emulator
+        self.log_prior=log_prior
+        self.refine_steps=refine_steps
+        self.refine_every=refine_every
+        self.steps=0
+        self.calls_exact=0
+        self.calls_emulator=0
+        self._n_new=0
+
+    def _emulated_log_prob(self,coords):
+        lp=np.array([self.log_prior(theta) for theta in coords])
+        msk=np.isfinite(lp)
+        if msk.any():
+            lp[msk]+=self.emulator.predict(coords[msk])
+            self.calls_emulator+=msk.sum()
+        return lp
+
+    def propose(self,model,state):
+        nwalkers,ndim=state.coords.shape
+        if nwalkers < 2 * ndim and not self.live_dangerously:
+            raise RuntimeError('It is unadvisable to use a red-blue move with fewer walkers than twice the number of dimensions.')
+
+        accepted=np.zeros(nwalkers,dtype=bool)
+        all_inds=np.arange(nwalkers)
+        inds=all_inds % self.nsplits
+        if self.randomize_split:
+            model.random.shuffle(inds)
+
+        for split in range(self.nsplits):
+            S1=inds==split
+            sets=[state.coords[inds==j] for j in range(self.nsplits)]
+            s=sets[split]
+            c=sets[:split]+sets[split+1:]
+
+            q,factors=self.get_proposal(s,c,model.random)
+
+            #first stage, with the emulator
+            emu_diff=self._emulated_log_prob(q)-self._emulated_log_prob(s)
+            stage_1=factors+emu_diff>np.log(model.random.rand(q.shape[0]))
+
+            new_log_probs=np.full(q.shape[0],-np.inf)
+            if stage_1.any():
+                new_log_probs[stage_1]=model.compute_log_prob_fn(q[stage_1])[0]
+                self.calls_exact+=stage_1.sum()
+                if self.steps<self.refine_steps:
+                    self.emulator.add_points(q[stage_1],new_log_probs[stage_1]-np.array([self.log_prior(theta) for theta in q[stage_1]]))
+                    self._n_new+=stage_1.sum()
+
+            #second stage, exact
+            for i,j in enumerate(all_inds[S1]):
+                if stage_1[i] and new_log_probs[i]-state.log_prob[j]-emu_diff[i]>np.log(model.random.rand()):
+                    accepted[j]=True
+
+            new_state=emcee.State(q,log_prob=new_log_probs)
+            state=self.update(state,new_state,accepted,S1)
+
+        self.steps+=1
+        if self.steps<=self.refine_steps and self._n_new>=self.refine_every:
+            self.emulator.fit()
+            self._n_new=0
+
+        return state,accepted
 
-__all__=['McmcSampler']
 
 class McmcSampler(object):
 
@@ -28,8 +268,31 @@ class McmcSampler(object):
         self._progress_iter = cycle(['|', '/', '-', '\\'])
 
 
-    def run_sampler(self,nwalkers=500,steps=100,pos=None,burnin=50,use_UL=False, threads=8):
-        self.sampler = emcee.EnsembleSampler(nwalkers, self.ndim, self.log_prob,threads=threads)
+    def run_sampler(self,nwalkers=500,steps=100,pos=None,burnin=50,use_UL=False, threads=8, pool=None, n_workers=None,
+                    emulator=False,n_train=None,train_scale=3.0,refine_every=50):
+        """
+        runs the emcee sampler
+
+        :param pool: pool with a `map` method (as :class:`multiprocessing.Pool`) used
+            to evaluate the walkers, the model is pickled with the tasks and unpickled once
+            in each worker
+        :param n_workers: (int) number of processes of a :class:`multiprocessing.Pool` created
+            for the run, the model is shipped to each process once, then only the parameter
+            vectors and the log-probabilities are exchanged
+        :param emulator: (boolean) if True, the log-likelihood is emulated by a :class:`GPEmulator`
+            trained around the best fit, and the walkers are moved with delayed acceptance:
+            the model is evaluated only for the proposals accepted by the emulator, and
+            the samples are drawn from the exact posterior. The emulator is refined with
+            the exact evaluations during the burnin steps, and then kept fixed
+        :param n_train: (int) number of model evaluations to train the emulator, default
+            twice the number of coefficients of the quadratic mean, at least 50
+        :param train_scale: (float) the training points are drawn from a normal distribution
+            centered on the best fit, with sigma `train_scale` times the best-fit errors
+        :param refine_every: (int) number of new exact evaluations between two fits of the emulator
+        """
+        if pool is not None and n_workers is not None:
+            raise RuntimeError('either you provide pool or n_workers')
+
         self.calls=0
         self.calls_OK=0
         self.use_UL=use_UL
@@ -45,7 +308,40 @@ class McmcSampler(object):
         self.calls_tot=nwalkers*steps
         self.labels=[par.name for par in self.model_minimizer.fit_par_free]
         self.labels_units =[par.units for par in self.model_minimizer.fit_par_free]
-        self.sampler.run_mcmc(pos,steps)
+
+        if emulator is True:
+            self.emulator=self._train_emulator(n_train,train_scale)
+            moves=_DelayedAcceptanceMove(self.emulator,self.log_prior,refine_steps=burnin,refine_every=refine_every)
+        else:
+            self.emulator=None
+            moves=None
+
+        if pool is None and n_workers is None:
+            self.sampler = emcee.EnsembleSampler(nwalkers, self.ndim, self.log_prob,threads=threads,moves=moves)
+            self.sampler.run_mcmc(pos,steps)
+        else:
+            state=self._get_worker_state()
+            _pool=pool
+            if n_workers is not None:
+                log_prob=_PoolLogProb(state,shipped=True)
+                _pool=multiprocessing.Pool(n_workers,initializer=_init_worker,initargs=(log_prob.token,state))
+            else:
+                log_prob=_PoolLogProb(state)
+
+            try:
+                self.sampler = emcee.EnsembleSampler(nwalkers, self.ndim, log_prob, pool=_pool,moves=moves)
+                #the walkers are evaluated in the pool, the calls are counted per step,
+                #starting from the evaluation of the initial positions
+                self.calls=nwalkers
+                for _ in self.sampler.sample(pos,iterations=steps):
+                    self.calls=self.calls+nwalkers if moves is None else nwalkers+moves.calls_exact
+                    self.calls_OK=int(self.sampler.backend.accepted.sum())
+                    self._progess_bar(every=1)
+            finally:
+                if n_workers is not None:
+                    _pool.close()
+                    _pool.join()
+
         self.samples = self.sampler.chain[:, burnin:, :].reshape((-1, self.ndim))
 
         self.sampler_out=SamplerOutput(self.samples,
@@ -56,7 +352,67 @@ class McmcSampler(object):
                                        labels=self.labels,
                                        labels_units=self.labels_units)
 
+        if moves is not None:
+            self.calls_emulator=moves.calls_emulator
+            self.calls_exact=moves.calls_exact
+
+        self.model_minimizer.reset_to_best_fit()
+
+    def _train_emulator(self,n_train,train_scale):
+        """
+        returns a :class:`GPEmulator` of the log-likelihood, trained on `n_train`
+        exact evaluations drawn around the best fit, within the fit bounds
+        """
+        fit_par_free=self.model_minimizer.fit_par_free
+        center=np.array([p.best_fit_val for p in fit_par_free])
+        scale=np.array([p.best_fit_err if p.best_fit_err is not None and p.best_fit_err>0 and np.isfinite(p.best_fit_err) else 0.01*abs(p.best_fit_val) for p in fit_par_free])
+        scale[scale==0]=1E-3
+        if n_train is None:
+            n_train=max(50,(self.ndim+1)*(self.ndim+2))
+
+        bounds=[(par.fit_range_min, par.fit_range_max) for par in fit_par_free]
+        rs=np.random.RandomState(0)
+        theta=center+train_scale*scale*rs.standard_normal((n_train,self.ndim))
+        for pi,(b_min,b_max) in enumerate(bounds):
+            theta[:,pi]=np.clip(theta[:,pi],b_min if b_min is not None else -np.inf,b_max if b_max is not None else np.inf)
+        theta=np.vstack([center,theta])
+
+        fit_model=self.model_minimizer.fit_Model
+        nu_fit=self.model_minimizer.nu_fit
+        loglog=self.model_minimizer.loglog
+        try:
+            models=fit_model.eval_batch(theta,nu_fit,loglog=loglog)
+        except ValueError:
+            models=None
+
+        y=np.zeros(theta.shape[0])
+        for i in range(theta.shape[0]):
+            if models is None:
+                y[i]=_log_like(theta[i],fit_model,fit_par_free,nu_fit,self.model_minimizer.nuFnu_fit,
+                               self.model_minimizer.err_nuFnu_fit,self.model_minimizer.UL,loglog,use_UL=self.use_UL)
+            else:
+                y[i]=-0.5*log_like(self.model_minimizer.nuFnu_fit,models[i],self.model_minimizer.err_nuFnu_fit,
+                                   self.model_minimizer.UL,use_UL=self.use_UL)[0]
+
+        emulator=GPEmulator(self.ndim)
+        emulator.add_points(theta,y)
+        emulator.fit()
         self.model_minimizer.reset_to_best_fit()
+        return emulator
+
+    def _get_worker_state(self):
+        _state={}
+        #the blobs are pickled with the computed spectra, hence the workers do not evaluate the model to rebuild it
+        _state['fit_model']=self.model_minimizer.fit_Model
+        _state['fit_par_free']=[par.name for par in self.model_minimizer.fit_par_free]
+        _state['bounds']=[(par.fit_range_min, par.fit_range_max) for par in self.model_minimizer.fit_par_free]
+        _state['data']=(self.model_minimizer.nu_fit,
+                        self.model_minimizer.nuFnu_fit,
+                        self.model_minimizer.err_nuFnu_fit,
+                        self.model_minimizer.UL,
+                        self.model_minimizer.loglog)
+        _state['use_UL']=self.use_UL
+        return pickle.dumps(_state,pickle.HIGHEST_PROTOCOL)
 
     def plot_par(self,p=None,nbins=20,log_plot=False):
         return self.sampler_out.plot_par(p=p,nbins=nbins,log_plot=log_plot)
@@ -71,23 +427,30 @@ class McmcSampler(object):
         self.sampler_out.save(name)
 
     def log_like(self,theta,_warn=False):
-
+        """
+        returns the log-likelihood -chisq/2 of the model for the values `theta`
+        of the free parameters, the chisq includes the UL term if `use_UL` is True
+        """
         for pi in range(len(theta)):
-            self.model_minimizer.fit_par_free[pi].set(val=theta[pi])
             if np.isnan(theta[pi]):
                 _warn=True
 
-
-
-
-
-        _m = self.model_minimizer.fit_Model.eval(nu=self.model_minimizer.nu_fit, fill_SED=False, get_model=True, loglog=self.model_minimizer.loglog)
-
-        _res_sum, _res, _res_UL= log_like(self.model_minimizer.nuFnu_fit,
-                        _m,
-                        self.model_minimizer.err_nuFnu_fit,
-                        self.model_minimizer.UL,
-                        use_UL=self.use_UL)
+        objective=getattr(self.model_minimizer,'objective',None)
+        if objective is not None and _warn==False and objective.matches(self.model_minimizer.fit_par_free,
+                                                                         self.model_minimizer.nu_fit,
+                                                                         self.model_minimizer.fit_Model):
+            self._progess_bar()
+            return objective.log_like(theta,use_UL=self.use_UL)
+
+        _res_sum=_log_like(theta,
+                           self.model_minimizer.fit_Model,
+                           self.model_minimizer.fit_par_free,
+                           self.model_minimizer.nu_fit,
+                           self.model_minimizer.nuFnu_fit,
+                           self.model_minimizer.err_nuFnu_fit,
+                           self.model_minimizer.UL,
+                           self.model_minimizer.loglog,
+                           use_UL=self.use_UL)
 
         self._progess_bar()
         return  _res_sum
@@ -103,24 +466,11 @@ class McmcSampler(object):
         return lp + self.log_like(theta)
 
     def log_prior(self,theta):
-        _r=0.
         bounds = [(par.fit_range_min, par.fit_range_max) for par in self.model_minimizer.fit_par_free]
-        for pi in range(len(theta)):
-            if bounds[pi][1] is not None:
-                if theta[pi]<bounds[pi][1]:
-                    pass
-                else:
-                    _r = -np.inf
-            if bounds[pi][0] is not None:
-                if theta[pi]>bounds[pi][0]:
-                    pass
-                else:
-                    _r=-np.inf
-
-        return _r
-
-    def _progess_bar(self,):
-        if np.mod(self.calls, 10) == 0 and self.calls != 0:
+        return _log_prior(theta,bounds)
+
+    def _progess_bar(self,every=10):
+        if np.mod(self.calls, every) == 0 and self.calls != 0:
             print("\r%s progress=%3.3f%% calls=%d accepted=%d" % (next(self._progress_iter),float(100*self.calls)/(self.calls_tot),self.calls,self.calls_OK), end="")
 
 
@@ -155,6 +505,7 @@ class SamplerOutput(object):
             return pickle.load(input)
 
     def corner_plot(self,labels=None):
+        import corner
         if labels is not None:
             _id=[]
             if type(labels)==list:
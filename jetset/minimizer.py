@@ -6,6 +6,7 @@ from builtins import (bytes, str, open, super, range,
 __author__ = "Andrea Tramacere"
 
 from itertools import cycle
+from collections import OrderedDict, namedtuple
 
 
 import scipy as sp
@@ -16,14 +17,10 @@ import os
 
 import sys
 
-from scipy.stats import chi2
+import importlib.util
 
-try:
-    import iminuit
-    minuit_installed=True
-
-except:
-    minuit_installed=False
+#iminuit is imported by MinutiMinimizer
+minuit_installed=importlib.util.find_spec('iminuit') is not None
 #from iminuit.frontends import ConsoleFrontend
 #from iminuit.frontends import console
 from .plot_sedfit import plt
@@ -34,13 +31,22 @@ from scipy.optimize import least_squares,curve_fit
 
 from leastsqbound.leastsqbound import  leastsqbound
 
-from .output import section_separator,WorkPlace,makedir
+from .output import section_separator,WorkPlace,makedir,get_sub_dir
+
+
 
 
 
+__all__=['FitResults','FitStage','FitObjective','get_fit_data','fit_SED','Minimizer','LSMinimizer','LSBMinimizer','MinutiMinimizer','ModelMinimizer','coarse_to_fine_schedule']
 
 
-__all__=['FitResults','fit_SED','Minimizer','LSMinimizer','LSBMinimizer','MinutiMinimizer','ModelMinimizer']
+FitStage = namedtuple('FitStage', ['sizes', 'calls', 'chisq'])
+
+#grids of the Jet components set by a resolution schedule, see ModelMinimizer.fit
+_schedule_grids=['gamma_grid_size','nu_seed_size','IC_nu_size']
+
+#one coarse stage, with the seed and IC grids used by ObsConstrain, then the full resolution
+coarse_to_fine_schedule=[{'gamma_grid_size':0.25,'nu_seed_size':50,'IC_nu_size':50}]
 
 
 
@@ -62,6 +68,10 @@ class FitResults(object):
     :ivar dof: dof
     :ivar chisq_red: chisq_red
     :ivar null_hyp_sig: null_hyp_sig
+    :ivar eval_profile: dict of the evaluation profiles of the jet components,
+        summed over the minimizer calls, see :attr:`.Jet.last_eval_profile`
+    :ivar stages: list of :class:`FitStage`, the grid sizes, calls and chisq of
+        each stage of a fit with a resolution schedule, the last is the full resolution
     :ivar fit_report: ivar get_report()
     -------
     
@@ -82,7 +92,9 @@ class FitResults(object):
                  chisq_no_UL=None,
                  dof_no_UL=None,
                  chisq_red_no_UL=None,
-                 null_hyp_sig_no_UL=None):
+                 null_hyp_sig_no_UL=None,
+                 eval_profile=None,
+                 stages=None):
 
         self.name=name
         self.parameters=parameters
@@ -100,6 +112,14 @@ class FitResults(object):
         self.chisq_red_no_UL = chisq_red_no_UL
         self.null_hyp_sig_no_UL = null_hyp_sig_no_UL
 
+        if eval_profile is None:
+            eval_profile={}
+        self.eval_profile=eval_profile
+
+        if stages is None:
+            stages=[]
+        self.stages=stages
+
         self.fit_report=self.get_report()
         self.wd=wd
          
@@ -123,6 +143,8 @@ class FitResults(object):
         out.append("")
         out.append("converged=%s"%self.success)
         out.append("calls=%d"%self.calls)
+        for ID,stage in enumerate(self.stages):
+            out.append("stage %d calls=%d chisq=%f sizes=%s"%(ID,stage.calls,stage.chisq,dict((k,dict(v)) for k,v in stage.sizes.items())))
         try:
             out.append("mesg=",self.mesg)
         except:
@@ -167,6 +189,8 @@ class FitResults(object):
     def save_report(self,name=None):
 
         if name is None:
+            if self.wd is None:
+                raise RuntimeError('the fit has no working directory, please provide the file name')
             wd=self.wd
             name = 'best_fit_report_%s' % self.name + '.txt'
 
@@ -229,9 +253,9 @@ class ModelMinimizer(object):
 
         if fit_workplace is None:
             fit_workplace = WorkPlace()
-            out_dir = fit_workplace.out_dir + '/' + fitname + '/'
+            out_dir = get_sub_dir(fit_workplace.out_dir, fitname)
         else:
-            out_dir = fit_workplace.out_dir + '/' + fitname + '/'
+            out_dir = get_sub_dir(fit_workplace.out_dir, fitname)
 
         makedir(out_dir)
 
@@ -239,39 +263,7 @@ class ModelMinimizer(object):
             if model.model_type == 'jet':
                 model.set_path(out_dir)
 
-        if sed_data.data['dnuFnu_data'] is None:
-            sed_data.data['dnuFnu_data'] = np.ones(sed_data.data['nu_data'].size)
-
-        # filter data points
-        msk1 = sed_data.data['nu_data'] > nu_fit_start
-        msk2 = sed_data.data['nu_data'] < nu_fit_stop
-        msk_zero_error = sed_data.data['dnuFnu_data'] > 0.0
-        # msk = s.array([(el>nu_fit_start) and (el<nu_fit_stop) for el in SEDdata.data['nu_data']])
-        # print msk1.size,msk2.size,SEDdata.data['UL'].size
-        if use_UL == True:
-            msk = msk1 * msk2 * msk_zero_error
-
-        else:
-            msk = msk1 * msk2 * msk_zero_error*~sed_data.data['UL']
-
-        UL = sed_data.data['UL'][msk]
-
-        if loglog == False:
-            nu_fit = sed_data.data['nu_data'][msk]
-            nuFnu_fit = sed_data.data['nuFnu_data'][msk]
-            if use_facke_err == False:
-                err_nuFnu_fit = sed_data.data['dnuFnu_data'][msk]
-            else:
-                err_nuFnu_fit = sed_data.data['dnuFnu_facke'][msk]
-        else:
-            nu_fit = sed_data.data['nu_data_log'][msk]
-            nuFnu_fit = sed_data.data['nuFnu_data_log'][msk]
-            err_nuFnu_fit = sed_data.data['dnuFnu_data_log'][msk]
-            if use_facke_err == False:
-                err_nuFnu_fit = sed_data.data['dnuFnu_data_log'][msk]
-            else:
-                err_nuFnu_fit = sed_data.data['dnuFnu_facke_log'][msk]
-
+        nu_fit,nuFnu_fit,err_nuFnu_fit,UL=get_fit_data(sed_data,nu_fit_start,nu_fit_stop,loglog=loglog,use_facke_err=use_facke_err,use_UL=use_UL)
 
         if silent == False:
             print("filtering data in fit range = [%e,%e]" % (nu_fit_start, nu_fit_stop))
@@ -319,6 +311,7 @@ class ModelMinimizer(object):
         self.UL=UL
         self.fit_Model.nu_min_fit = nu_fit_start
         self.fit_Model.nu_max_fit = nu_fit_stop
+        self.objective=FitObjective(fit_Model,fit_par_free,nu_fit,nuFnu_fit,err_nuFnu_fit,UL,loglog=loglog,use_UL=use_UL)
         #print('-->nu_fit_start A %e' % nu_fit_start)
         #print('-->nu_fit_start B %e' % self.fit_Model.nu_min_fit)
 
@@ -334,7 +327,17 @@ class ModelMinimizer(object):
             max_ev=0,
             use_facke_err=False,
             use_UL=False,
-            skip_minimizer=False):
+            skip_minimizer=False,
+            jacobian=None,
+            resolution_schedule=None):
+        """
+        :param resolution_schedule: list of coarse stages, each a dict of the sizes
+            of the grids of the :class:`.Jet` components (`gamma_grid_size`, `nu_seed_size`,
+            `IC_nu_size`), an int is a size, a float a fraction of the current size.
+            The fit is run at each stage, starting from the best fit of the previous one,
+            then at the current sizes, that are restored. True uses :data:`coarse_to_fine_schedule`.
+            The calls of each stage are stored in :attr:`FitResults.stages`
+        """
 
         self.silent=silent
         #print('-->nu_fit_start', nu_fit_start)
@@ -343,15 +346,76 @@ class ModelMinimizer(object):
                      loglog=loglog, silent=silent, get_conf_int=get_conf_int, use_facke_err=use_facke_err,use_UL=use_UL)
 
 
+        #the profiles of the jet evaluations are summed during the minimization,
+        #the evaluations hitting the FitModel cache are not counted
+        profiled_models=[m for m in fit_Model.components_list if hasattr(m,'_start_eval_profile_sum')]
+        self.eval_profile={}
         if skip_minimizer == False:
-            self.minimizer.fit(self,max_ev=max_ev,silent=silent)
+            for model in profiled_models:
+                model._start_eval_profile_sum()
+            try:
+                if resolution_schedule is None or resolution_schedule is False:
+                    self.stages=[]
+                    self.minimizer.fit(self,max_ev=max_ev,silent=silent,jacobian=jacobian)
+                else:
+                    self._fit_schedule(resolution_schedule,max_ev=max_ev,silent=silent,jacobian=jacobian)
+            finally:
+                for model in profiled_models:
+                    self.eval_profile[model.name]=model._stop_eval_profile_sum()
         else:
-            pass
+            self.stages=[]
 
         #print('-->nu_fit_start', nu_fit_start)
 
         return self.get_fit_results(fit_Model,nu_fit_start,nu_fit_stop,fitname,loglog=loglog,silent=silent)
 
+    def _fit_schedule(self,resolution_schedule,max_ev=0,silent=False,jacobian=None):
+        """
+        runs the minimizer at each stage of `resolution_schedule`, and then at the
+        current sizes of the grids, warm-starting each stage from the previous best fit
+        """
+        if resolution_schedule is True:
+            resolution_schedule=coarse_to_fine_schedule
+
+        jet_models=[m for m in self.fit_Model.components_list if m.model_type=='jet']
+        full_sizes=[dict((grid,getattr(m,grid)) for grid in _schedule_grids) for m in jet_models]
+        for stage in resolution_schedule:
+            for grid in stage:
+                if grid not in _schedule_grids:
+                    raise RuntimeError('grid %s not in allowed'%grid,_schedule_grids)
+
+        pinit=self.pinit
+        self.stages=[]
+        calls=0
+        try:
+            for stage in list(resolution_schedule)+[{}]:
+                stage_sizes=OrderedDict()
+                for m,sizes in zip(jet_models,full_sizes):
+                    stage_sizes[m.name]=OrderedDict()
+                    for grid in _schedule_grids:
+                        size=sizes[grid]
+                        if grid in stage:
+                            size=int(stage[grid]) if isinstance(stage[grid],(int,np.integer)) else max(10,int(stage[grid]*size))
+                        if getattr(m,grid)!=size:
+                            setattr(m,grid,size)
+                        stage_sizes[m.name][grid]=size
+
+                self.pinit=pinit
+                self.minimizer.fit(self,max_ev=max_ev,silent=silent,jacobian=jacobian)
+                pinit=list(self.minimizer.pout)
+                calls+=self.minimizer.calls
+                self.stages.append(FitStage(stage_sizes,self.minimizer.calls,self.minimizer.chisq))
+                if silent==False:
+                    print('\rstage %d, sizes=%s calls=%d chisq=%f'%(len(self.stages),dict(stage_sizes),self.minimizer.calls,self.minimizer.chisq))
+        finally:
+            self.pinit=[par.get_fit_initial_value() for par in self.fit_par_free]
+            for m,sizes in zip(jet_models,full_sizes):
+                for grid in _schedule_grids:
+                    if getattr(m,grid)!=sizes[grid]:
+                        setattr(m,grid,sizes[grid])
+
+        self.minimizer.calls=calls
+
     def get_fit_results(self, fit_Model, nu_fit_start, nu_fit_stop, fitname, silent=False, loglog=False):
         self.reset_to_best_fit()
         best_fit = FitResults(fitname,
@@ -368,7 +432,9 @@ class ModelMinimizer(object):
                               chisq_no_UL=self.minimizer.chisq_no_UL,
                               dof_no_UL=self.minimizer.dof_no_UL,
                               chisq_red_no_UL=self.minimizer.chisq_red_no_UL,
-                              null_hyp_sig_no_UL=self.minimizer.null_hyp_sig_no_UL)
+                              null_hyp_sig_no_UL=self.minimizer.null_hyp_sig_no_UL,
+                              eval_profile=getattr(self,'eval_profile',None),
+                              stages=getattr(self,'stages',None))
 
         if silent == False:
             best_fit.show_report()
@@ -423,17 +489,32 @@ class ModelMinimizer(object):
 
 class Minimizer(object):
 
+    #jacobian options accepted by the minimizer, see :meth:`jacobian_Fit`
+    _accepted_jacobian = [None]
+
+    #step and scheme ('2-point' or '3-point') of the finite-difference derivatives,
+    #see :meth:`jacobian_Fit`
+    jac_step = 1E-4
+    jac_method = '2-point'
+
     def __init__(self,model):
         self.model=model
         self._progress_iter = cycle(['|', '/', '-', '\\'])
 
 
-    def fit(self,model,max_ev=None,use_UL=False,silent=False):
+    def fit(self,model,max_ev=None,use_UL=False,silent=False,jacobian=None):
+        if jacobian not in self._accepted_jacobian:
+            raise RuntimeError('jacobian ', jacobian, 'not accepted by this minimizer, please choose among', self._accepted_jacobian)
+
         self.use_UL = use_UL
         self.calls=0
         self.res_check=None
         self.molde=model
         self.silent=silent
+        self.jacobian=jacobian
+        self.objective=getattr(model,'objective',None)
+        self._par_check=None
+        self._model_check=None
         self._fit(max_ev)
         self._fit_stats()
         self._set_fit_errors()
@@ -441,6 +522,7 @@ class Minimizer(object):
 
 
     def _fit_stats(self):
+        from scipy.stats import chi2
         self.dof = len(self.model.nu_fit) - self.model.free_pars
         self.chisq = self.get_chisq()
         self.chisq_red = self.chisq / float(self.dof)
@@ -489,29 +571,38 @@ class Minimizer(object):
                       silent=False):
 
         #hide_cursor()
-        _warn=False
-        for pi in range(len(fit_par)):
-            fit_par[pi].set(val=p[pi])
-            if np.isnan(p[pi]):
-                _warn=True
-                print('warning nan for par',pi,' old paramter value was',self._par_check[pi])
+        objective=getattr(self,'objective',None)
+        if objective is not None and objective.matches(fit_par,nu_data,best_fit_SEDModel) and not np.any(np.isnan(p)):
+            #compiled objective, see FitObjective
+            _res_sum=objective.chisq(p,use_UL=use_UL)
+            _res=objective.res.copy()
+            _res_UL=objective.res_UL
+            model=objective.model.copy()
+        else:
+            _warn=False
+            for pi in range(len(fit_par)):
+                fit_par[pi].set(val=p[pi])
+                if np.isnan(p[pi]):
+                    _warn=True
+                    print('warning nan for par',pi,' old paramter value was',self._par_check[pi])
 
-        if _warn==True:
-            best_fit_SEDModel.show_pars()
-            print('res_sum',self._res_sum_chekc)
-            print('res_chekc', self._res_chekc)
-            print('res_UL_chekc', self._res_UL_chekc)
+            if _warn==True:
+                best_fit_SEDModel.show_pars()
+                print('res_sum',self._res_sum_chekc)
+                print('res_chekc', self._res_chekc)
+                print('res_UL_chekc', self._res_UL_chekc)
 
 
-        model = best_fit_SEDModel.eval(nu=nu_data, fill_SED=False, get_model=True, loglog=loglog)
+            model = best_fit_SEDModel.eval(nu=nu_data, fill_SED=False, get_model=True, loglog=loglog)
 
 
-        _res_sum, _res, _res_UL=log_like(nuFnu_data,model,err_nuFnu_data,UL,use_UL=use_UL)
+            _res_sum, _res, _res_UL=log_like(nuFnu_data,model,err_nuFnu_data,UL,use_UL=use_UL)
 
         self._res_sum_chekc=_res_sum
         self._res_chekc = _res
         self._res_UL_chekc = _res_UL
-        self._par_check=p
+        self._par_check=np.array(p,dtype=np.float64)
+        self._model_check=model
 
         self.calls +=1
 
@@ -529,6 +620,149 @@ class Minimizer(object):
 
         return res
 
+    def jacobian_Fit(self,p,
+                     fit_par,
+                     nu_data,
+                     nuFnu_data,
+                     err_nuFnu_data,
+                     best_fit_SEDModel,
+                     loglog,
+                     UL,
+                     chisq=False,
+                     use_UL=False,
+                     silent=False):
+        """
+        finite-difference Jacobian of the residuals returned by :meth:`residuals_Fit`,
+        with shape (n_data, n_free_pars), forward or central according to `jac_method`,
+        one-sided for the parameters close to the bounds. The models of all the perturbed
+        parameters are evaluated in one :meth:`.FitModel.eval_batch` call, hence in parallel
+        over the blob clones when :attr:`.Jet.n_threads` > 1. The model at `p`, if needed,
+        is taken from the last :meth:`residuals_Fit` call, or evaluated in the same batch.
+        If a parameter can not be evaluated in batch, the models are evaluated one by one
+        """
+        p=np.array(p,dtype=np.float64)
+        n_pars=len(fit_par)
+
+        #rows of theta with the forward and the backward steps, -1 for p
+        steps=np.zeros(n_pars)
+        theta=[]
+        row_fw=np.zeros(n_pars,dtype=int)
+        row_bw=np.zeros(n_pars,dtype=int)
+        for pi in range(n_pars):
+            h=_get_jac_step(fit_par[pi],p[pi],self.jac_step)
+            lower,upper=_get_jac_bounds(fit_par[pi])
+            fw_in=upper is None or p[pi]+h<=upper
+            bw_in=lower is None or p[pi]-h>=lower
+            row_fw[pi]=row_bw[pi]=-1
+            if fw_in and (self.jac_method=='2-point' or bw_in==False):
+                steps[pi]=h
+                row_fw[pi]=len(theta)
+            elif bw_in and (self.jac_method=='2-point' or fw_in==False):
+                steps[pi]=h
+                row_bw[pi]=len(theta)
+            else:
+                steps[pi]=2*h
+                row_fw[pi]=len(theta)
+                row_bw[pi]=len(theta)+1
+            for row,sign in ((row_fw[pi],1),(row_bw[pi],-1)):
+                if row>=0:
+                    theta.append(p.copy())
+                    theta[-1][pi]+=sign*h
+
+        reuse_model=self._par_check is not None and np.array_equal(p,self._par_check)
+        if reuse_model==False and np.any((row_fw<0)|(row_bw<0)):
+            theta.append(p)
+
+        theta=np.array(theta)
+        try:
+            model=best_fit_SEDModel.eval_batch(theta,nu_data,loglog=loglog)
+        except ValueError:
+            model=np.zeros((theta.shape[0],np.size(nu_data)))
+            try:
+                for i in range(theta.shape[0]):
+                    for pi in range(n_pars):
+                        fit_par[pi].set(val=theta[i,pi])
+                    model[i]=best_fit_SEDModel.eval(nu=nu_data, fill_SED=False, get_model=True, loglog=loglog)
+            finally:
+                for pi in range(n_pars):
+                    fit_par[pi].set(val=p[pi])
+
+        if reuse_model==True:
+            model=np.vstack([model,self._model_check])
+
+        #res=(data-model)/err, model[-1] is the model at p
+        jac=np.zeros((np.size(nu_data),n_pars))
+        for pi in range(n_pars):
+            jac[:,pi]=(model[row_bw[pi]]-model[row_fw[pi]])/(steps[pi]*err_nuFnu_data)
+
+        return jac
+
+
+def get_fit_data(sed_data,nu_fit_start,nu_fit_stop,loglog=False,use_facke_err=False,use_UL=False):
+    """
+    returns the frequencies, fluxes, errors and UL flags of the data in the fit range
+    (`nu_fit_start`, `nu_fit_stop`), in log10 if `loglog` is True. The points with
+    null errors are excluded, and the UL only if `use_UL` is False
+    """
+    if sed_data.data['dnuFnu_data'] is None:
+        sed_data.data['dnuFnu_data'] = np.ones(sed_data.data['nu_data'].size)
+
+    # filter data points
+    msk1 = sed_data.data['nu_data'] > nu_fit_start
+    msk2 = sed_data.data['nu_data'] < nu_fit_stop
+    msk_zero_error = sed_data.data['dnuFnu_data'] > 0.0
+    # msk = s.array([(el>nu_fit_start) and (el<nu_fit_stop) for el in SEDdata.data['nu_data']])
+    # print msk1.size,msk2.size,SEDdata.data['UL'].size
+    if use_UL == True:
+        msk = msk1 * msk2 * msk_zero_error
+
+    else:
+        msk = msk1 * msk2 * msk_zero_error*~sed_data.data['UL']
+
+    UL = sed_data.data['UL'][msk]
+
+    if loglog == False:
+        nu_fit = sed_data.data['nu_data'][msk]
+        nuFnu_fit = sed_data.data['nuFnu_data'][msk]
+        if use_facke_err == False:
+            err_nuFnu_fit = sed_data.data['dnuFnu_data'][msk]
+        else:
+            err_nuFnu_fit = sed_data.data['dnuFnu_facke'][msk]
+    else:
+        nu_fit = sed_data.data['nu_data_log'][msk]
+        nuFnu_fit = sed_data.data['nuFnu_data_log'][msk]
+        err_nuFnu_fit = sed_data.data['dnuFnu_data_log'][msk]
+        if use_facke_err == False:
+            err_nuFnu_fit = sed_data.data['dnuFnu_data_log'][msk]
+        else:
+            err_nuFnu_fit = sed_data.data['dnuFnu_facke_log'][msk]
+
+    return nu_fit,nuFnu_fit,err_nuFnu_fit,UL
+
+
+def _get_jac_step(par,val,jac_step):
+    """
+    step of the finite-difference derivative along `par` at `val`: `jac_step`
+    for the log parameters, `jac_step`*|val| for the linear ones
+    """
+    if par.islog is True:
+        return jac_step
+    elif val!=0:
+        return jac_step*np.fabs(val)
+    elif par.fit_range_min is not None and par.fit_range_max is not None:
+        return jac_step*(par.fit_range_max-par.fit_range_min)
+    else:
+        return jac_step
+
+
+def _get_jac_bounds(par):
+    """
+    bounds of the finite-difference steps along `par`, None if not bounded
+    """
+    lower=[b for b in (par.fit_range_min,par.val_min) if b is not None]
+    upper=[b for b in (par.fit_range_max,par.val_max) if b is not None]
+    return (max(lower) if len(lower)>0 else None, min(upper) if len(upper)>0 else None)
+
 
 def log_like(data,model,data_error,UL,use_UL=False):
     res_no_UL = (data[~UL] - model[~UL]) / (data_error[~UL])
@@ -548,14 +782,181 @@ def UL_log_like(y_UL,y_model,y_err):
 
 
 
+def _get_par_setter(par):
+    """
+    returns a function writing a value of `par` directly to its model component,
+    and updating its `val_last_call`, without the boundary checks of
+    :meth:`.ModelParameter.set`, that are done by the caller.
+    Parameters with `allowed_values` are set by :meth:`.ModelParameter.set`
+    """
+    _val=par._val
+    if getattr(par,'allowed_values',None) is not None:
+        return lambda val: par.set(val=val)
+
+    if hasattr(par,'_blob'):
+        #as JetParameter.assign_val
+        blob=par._blob
+        name=par.name
+        b=getattr(blob,name)
+        if type(b)==int:
+            cast=int
+        elif type(b)==float:
+            cast=float
+        else:
+            return lambda val: par.set(val=val)
+
+        def setter(val):
+            _val._val=val
+            par.val_last_call=val
+            if _val._islog is True:
+                val=10**val
+            setattr(blob,name,cast(val))
+        return setter
+
+    elif hasattr(par,'assign_val'):
+        name=par.name
+
+        def setter(val):
+            _val._val=val
+            par.val_last_call=val
+            par.assign_val(name,val)
+        return setter
+
+    else:
+        return lambda val: par.set(val=val)
+
+
+class FitObjective(object):
+    """
+    Fit objective compiled from a :class:`.FitModel` and the data in the fit range,
+    as returned by :meth:`.FitModel.compile_objective`, and shared by the minimizers
+    and by the :class:`.McmcSampler`.
+    The frequencies, the inverse errors and the UL masks are computed once, the model
+    and the residuals are computed in preallocated buffers, and the values of
+    the free parameters are written directly to the model components: the
+    physical boundaries are checked on the whole vector, and the fit ranges are
+    left to the caller. When the :class:`.FitModel` evaluation cache is enabled,
+    the model is evaluated by :meth:`.FitModel.eval`, and the cache is used.
+
+    Calling the objective returns the residuals, or the chisq if `chisq` is True
+    """
+    def __init__(self,fit_model,fit_par,nu_data,nuFnu_data,err_nuFnu_data,UL,loglog=False,use_UL=False,chisq=False):
+        self.fit_model=fit_model
+        self.fit_par=fit_par
+        self.nu_data=nu_data
+        self.nuFnu_data=nuFnu_data
+        self.err_nuFnu_data=err_nuFnu_data
+        self.loglog=loglog
+        self.use_UL=use_UL
+        self.return_chisq=chisq
+        self.calls=0
+
+        #lin or log10 frequencies, as passed to the components
+        nu=np.array(nu_data,dtype=np.float64,ndmin=1)
+        self._comp_nu=nu
+
+        self._data=np.array(nuFnu_data,dtype=np.float64,ndmin=1)
+        self._inv_err=1.0/np.array(err_nuFnu_data,dtype=np.float64,ndmin=1)
+        UL=np.array(UL,dtype=bool,ndmin=1)
+        self._UL=UL
+        self._w_no_UL=(~UL).astype(np.float64)
+        self._data_UL=self._data[UL]
+        self._inv_err_UL=self._inv_err[UL]/np.sqrt(2)
+
+        self.model=np.zeros(nu.size)
+        self.res=np.zeros(nu.size)
+        self._buf=np.zeros(nu.size)
+
+        self._setters=[_get_par_setter(par) for par in fit_par]
+        self._val_min=np.array([-np.inf if par.val_min is None else par.val_min for par in fit_par],dtype=np.float64)
+        self._val_max=np.array([np.inf if par.val_max is None else par.val_max for par in fit_par],dtype=np.float64)
+
+    def matches(self,fit_par,nu_data,fit_model):
+        return fit_par is self.fit_par and nu_data is self.nu_data and fit_model is self.fit_model
+
+    def set_pars(self,theta):
+        if len(theta)!=len(self._setters):
+            raise ValueError('theta must have size %d'%len(self._setters))
+        theta_arr=np.asarray(theta,dtype=np.float64)
+        if np.any(theta_arr<self._val_min) or np.any(theta_arr>self._val_max):
+            ID=np.argmax((theta_arr<self._val_min)|(theta_arr>self._val_max))
+            raise RuntimeError("par=%s  = %e out of boundary=[%e,%e]"%(self.fit_par[ID].name,theta_arr[ID],self._val_min[ID],self._val_max[ID]))
+        for setter,val in zip(self._setters,theta_arr.tolist()):
+            setter(val)
+
+    def eval_model(self,theta):
+        """
+        returns the model at the data frequencies, in the :attr:`model` buffer
+        """
+        self.set_pars(theta)
+        self.calls+=1
+        model=self.model
+        if self.fit_model._eval_cache is not None:
+            model[:]=self.fit_model.eval(nu=self._comp_nu,fill_SED=False,get_model=True,loglog=self.loglog)
+            return model
+
+        model.fill(0.)
+        for model_comp in self.fit_model.components_list:
+            comp_model=model_comp.eval(nu=self._comp_nu,fill_SED=False,get_model=True,loglog=self.loglog)
+            if self.loglog==True:
+                np.power(10.,comp_model,out=self._buf)
+                model+=self._buf
+            else:
+                model+=comp_model
+
+        if self.loglog==True:
+            np.log10(model,out=model)
+
+        return model
+
+    def residuals(self,theta):
+        """
+        returns the residuals (data-model)/error of all the points, in the :attr:`res` buffer
+        """
+        model=self.eval_model(theta)
+        np.subtract(self._data,model,out=self.res)
+        self.res*=self._inv_err
+        return self.res
+
+    def chisq(self,theta,use_UL=None):
+        """
+        returns the chisq of the points that are not UL, minus twice the log-likelihood
+        of the UL, if `use_UL` (default :attr:`use_UL`) is True, as :func:`log_like`
+        """
+        res=self.residuals(theta)
+        np.multiply(res,res,out=self._buf)
+        res_sum=self._buf.dot(self._w_no_UL)
+        if use_UL is None:
+            use_UL=self.use_UL
+        self.res_UL=[0]
+        if use_UL==True and self._data_UL.size>0:
+            x=0.5*(1.0+sp.special.erf((self._data_UL-self.model[self._UL])*self._inv_err_UL))
+            x[x==0]=1E-200
+            self.res_UL=np.log(x)
+            res_sum-=2.0*np.sum(self.res_UL)
+        return res_sum
+
+    def log_like(self,theta,use_UL=None):
+        return -0.5*self.chisq(theta,use_UL=use_UL)
+
+    def __call__(self,theta):
+        if self.return_chisq==True:
+            return self.chisq(theta)
+        else:
+            return self.residuals(theta).copy()
+
+
 class LSBMinimizer(Minimizer):
 
+    _accepted_jacobian = [None, 'batch']
+
     def __init__(self, model):
         super(LSBMinimizer, self).__init__(model)
 
     def _fit(self, max_ev,):
         bounds = [(par.fit_range_min, par.fit_range_max) for par in self.model.fit_par_free]
         max_nfev = 0 if (max_ev == 0 or max_ev == None) else max_ev
+        Dfun = self.jacobian_Fit if self.jacobian == 'batch' else None
         pout, covar, info, mesg, success = leastsqbound(self.residuals_Fit,
                                                         self.model.pinit,
                                                         args=(self.model.fit_par_free,
@@ -568,6 +969,7 @@ class LSBMinimizer(Minimizer):
                                                               False,
                                                               False,
                                                               self.silent),
+                                                        Dfun=Dfun,
                                                         xtol=5.0E-8,
                                                         ftol=5.0E-8,
                                                         full_output=1,
@@ -586,6 +988,9 @@ class LSBMinimizer(Minimizer):
 
 class LSMinimizer(Minimizer):
 
+    _accepted_jacobian = [None, 'batch']
+    jac_method = '3-point'
+
     def __init__(self,model ):
         super(LSMinimizer, self).__init__(model)
 
@@ -610,7 +1015,7 @@ class LSMinimizer(Minimizer):
 
                             xtol=1.0E-8,
                             ftol=1.0E-8,
-                            jac='3-point',
+                            jac=self.jacobian_Fit if self.jacobian == 'batch' else '3-point',
                             loss='linear',
                             f_scale=0.01,
                             bounds=bounds,
@@ -658,6 +1063,7 @@ class MinutiMinimizer(Minimizer):
 
 
     def _set_minuit_func(self, p_init, bounds,p_error=None):
+        import iminuit
         #print('=>Hi')
         if p_error==None:
             p_error=[0.1]*len(p_init)
@@ -888,7 +1294,8 @@ class MinutiMinimizer(Minimizer):
         return bound
 
 def fit_SED(fit_Model, sed_data, nu_fit_start, nu_fit_stop, fitname=None, fit_workplace=None, loglog=False, silent=False,
-            get_conf_int=False, max_ev=0, use_facke_err=False, minimizer='lsb', use_UL=False):
+            get_conf_int=False, max_ev=0, use_facke_err=False, minimizer='lsb', use_UL=False, jacobian=None,
+            resolution_schedule=None):
     mm = ModelMinimizer(minimizer)
     #print('-->nu_fit_start',nu_fit_start)
     return mm,mm.fit(fit_Model,
@@ -902,4 +1309,6 @@ def fit_SED(fit_Model, sed_data, nu_fit_start, nu_fit_stop, fitname=None, fit_wo
                   get_conf_int=get_conf_int,
                   max_ev=max_ev,
                   use_facke_err=use_facke_err,
-                  use_UL=use_UL)
+                  use_UL=use_UL,
+                  jacobian=jacobian,
+                  resolution_schedule=resolution_schedule)
@@ -34,8 +34,12 @@ import copy
 
 import  pickle
 
+from collections import OrderedDict, namedtuple
+
 __all__=['FitModel']
 
+EvalCacheInfo=namedtuple('EvalCacheInfo',['hits','misses','max_size','size'])
+
 class ModelComoponentContainer(object):
 
     def __init__(self):
@@ -59,6 +63,8 @@ class FitModel(Model):
     :param elec_distr_type: (str)  name of the electron distribution model
         
     :param template: (:class:`.spectral_shapes.template` object)
+
+    :param table_model: (:class:`.TableModel` object)
     
     
     Members
@@ -72,7 +78,7 @@ class FitModel(Model):
   
     """
     
-    def __init__(self,elec_distr=None,jet=None,name='no-name',out_dir=None,flag=None,template=None,loglog_poly=None,analytical=None,nu_size=100,cosmo=None,  **keywords):
+    def __init__(self,elec_distr=None,jet=None,name='no-name',out_dir=None,flag=None,template=None,loglog_poly=None,analytical=None,nu_size=100,cosmo=None,table_model=None,  **keywords):
  
         """
         Constructor
@@ -144,6 +150,11 @@ class FitModel(Model):
         if analytical is not None:
             self.add_component(analytical)
 
+        if table_model is not None:
+            self.add_component(table_model)
+
+        self.set_eval_cache(None)
+
 
 
 
@@ -318,10 +329,92 @@ class FitModel(Model):
     
     
     
+    def set_eval_cache(self,max_size=128):
+        """
+        enables an LRU cache of the model evaluations, keyed by the parameter
+        values, the frequencies and the grids setup of the components.
+        Only the evaluations returning the model without filling the SED
+        (as those of the minimizers and of the MCMC sampler) are cached,
+        on a hit the components are not evaluated.
+        The cache has to be cleared with :meth:`clear_eval_cache` if the model
+        is changed other than through its parameters
+
+        :param max_size: (int), maximum number of stored evaluations,
+            None or 0 disables the cache
+        """
+        if max_size is not None and max_size>0:
+            self._eval_cache=OrderedDict()
+        else:
+            self._eval_cache=None
+        self._eval_cache_max_size=max_size
+        self._eval_cache_hits=0
+        self._eval_cache_misses=0
+
+    def __getstate__(self):
+        state=super(FitModel,self).__getstate__()
+        #the cached evaluations are not pickled
+        if state.get('_eval_cache') is not None:
+            state['_eval_cache']=OrderedDict()
+        return state
+
+    def __setstate__(self, state):
+        #models pickled before the evaluation cache
+        self.set_eval_cache(None)
+        super(FitModel,self).__setstate__(state)
+
+    def clear_eval_cache(self):
+        if self._eval_cache is not None:
+            self._eval_cache.clear()
+        self._eval_cache_hits=0
+        self._eval_cache_misses=0
+
+    def eval_cache_info(self):
+        """
+        returns the hits, misses, maximum size and current size of the evaluation cache
+        """
+        if self._eval_cache is None:
+            return EvalCacheInfo(self._eval_cache_hits,self._eval_cache_misses,0,0)
+
+        return EvalCacheInfo(self._eval_cache_hits,self._eval_cache_misses,self._eval_cache_max_size,len(self._eval_cache))
+
+    def _get_eval_cache_key(self,nu,loglog):
+        nu=np.asarray(nu)
+        config=[]
+        for model_comp in self.components_list:
+            if hasattr(model_comp,'_get_eval_config'):
+                config.append(model_comp._get_eval_config())
+            else:
+                config.append((model_comp.nu_size,model_comp.nu_min,model_comp.nu_max))
+
+        return (tuple(par.val for par in self.parameters.par_array),
+                nu.dtype.str,
+                nu.shape,
+                nu.tobytes(),
+                loglog,
+                tuple(config))
+
     def eval(self,nu=None,fill_SED=True,get_model=False,loglog=False,label=None,phys_output=False):
         """
         evaluates the SED for the current parameters and fills the :class:`.SED` member
         """
+
+        if self._eval_cache is not None and nu is not None and fill_SED==False and get_model==True and phys_output==False:
+            key=self._get_eval_cache_key(nu,loglog)
+            if key in self._eval_cache:
+                self._eval_cache.move_to_end(key)
+                self._eval_cache_hits+=1
+                return self._eval_cache[key].copy()
+
+            self._eval_cache_misses+=1
+            model=self._eval(nu=nu,fill_SED=fill_SED,get_model=get_model,loglog=loglog,label=label,phys_output=phys_output)
+            self._eval_cache[key]=model.copy()
+            if len(self._eval_cache)>self._eval_cache_max_size:
+                self._eval_cache.popitem(last=False)
+            return model
+
+        return self._eval(nu=nu,fill_SED=fill_SED,get_model=get_model,loglog=loglog,label=label,phys_output=phys_output)
+
+    def _eval(self,nu=None,fill_SED=True,get_model=False,loglog=False,label=None,phys_output=False):
         
         
         if nu is None:
@@ -387,13 +480,98 @@ class FitModel(Model):
             
             return None
 
+    def compile_objective(self,sed_data,nu_min,nu_max,loglog=False,use_UL=False,use_facke_err=False,chisq=False):
+        """
+        returns a :class:`.minimizer.FitObjective`, a callable `f(theta)` returning
+        the residuals (or the chisq if `chisq` is True) of the model against the data
+        of `sed_data` in the fit range, for the values `theta` of the free parameters,
+        in the order of `parameters.par_array`. The data are filtered as in :func:`.minimizer.fit_SED`.
+        The free parameters are those at the time of the call, the values are
+        written by the objective without the fit range checks
+
+        :param sed_data: (:class:`.ObsData`)
+        :param nu_min: minimum frequency of the fit range
+        :param nu_max: maximum frequency of the fit range
+        """
+        nu_fit,nuFnu_fit,err_nuFnu_fit,UL=minimizer.get_fit_data(sed_data,nu_min,nu_max,loglog=loglog,use_facke_err=use_facke_err,use_UL=use_UL)
+        fit_par=[par for par in self.parameters.par_array if par.frozen == False]
+        return minimizer.FitObjective(self,fit_par,nu_fit,nuFnu_fit,err_nuFnu_fit,UL,loglog=loglog,use_UL=use_UL,chisq=chisq)
+
+    def eval_batch(self,theta,nu,loglog=False):
+        """
+        evaluates the model at the frequencies `nu` for each row of `theta`,
+        the values of the free parameters, in the order of `parameters.par_array`.
+        The components providing `eval_batch` (as :class:`.Jet`) evaluate all the
+        samples in one call, the other components are evaluated sample by sample.
+        The parameters values are not changed, and the :class:`.SED` is not filled
+
+        :param theta: (array) of shape (n_samples, n_free_pars)
+        :param nu: (array) frequencies, log10 if `loglog` is True
+        :param loglog: (boolean), as in :meth:`eval`
+
+        :returns: (array) of shape (n_samples, n_nu), each row is equal to
+            the model returned by :meth:`eval` with `get_model=True`
+        """
+        free_pars=[par for par in self.parameters.par_array if par.frozen == False]
+        theta=np.array(theta,dtype=np.float64,ndmin=2)
+        if theta.ndim!=2 or theta.shape[1]!=len(free_pars):
+            raise ValueError('theta must have shape (n_samples, %d)'%len(free_pars))
+
+        if np.shape(nu)==():
+            nu=np.array([nu])
+
+        if loglog==True:
+            lin_nu=np.power(10.,nu)
+            log_nu=nu
+        else:
+            log_nu=np.log10(nu)
+            lin_nu=nu
+
+        model=np.zeros((theta.shape[0],np.size(lin_nu)))
+
+        for model_comp in self.components_list:
+            comp_pars=[ID for par in model_comp.parameters.par_array for ID,free_par in enumerate(free_pars) if par is free_par]
+
+            if loglog==False:
+                comp_nu=lin_nu
+            else:
+                comp_nu=log_nu
+
+            if hasattr(model_comp,'eval_batch'):
+                comp_model=model_comp.eval_batch(theta[:,comp_pars],comp_nu,loglog=loglog)
+            else:
+                comp_model=np.zeros(model.shape)
+                vals=[free_pars[ID].val for ID in comp_pars]
+                try:
+                    for i in range(theta.shape[0]):
+                        for ID in comp_pars:
+                            free_pars[ID].set(val=theta[i,ID])
+                        comp_model[i]=model_comp.eval(nu=comp_nu,fill_SED=False,get_model=True,loglog=loglog)
+                finally:
+                    for ID,val in zip(comp_pars,vals):
+                        free_pars[ID].set(val=val)
+
+            if loglog==False:
+                model+=comp_model
+            else:
+                model+=np.power(10.,comp_model)
+
+        if loglog==True:
+            model=np.log10(model)
+
+        return model
+
 
 
     @classmethod
     def _build_serializable(cls):
         return cls()
 
-    def save_model(self,file_name):
+    def _serialize_model(self):
+        """
+        returns a picklable copy of the model, with the :class:`.Jet` components
+        serialized by :meth:`.Jet._serialize_model`, to be rebuilt by :meth:`_decode_model`
+        """
         c=self._build_serializable()
 
         c._serialized_model_list=[]
@@ -425,19 +603,20 @@ class FitModel(Model):
         for km in _keep_member_list:
             setattr(c,km,getattr(self,km))
 
+        return c
 
-        pickle.dump(c, open(file_name, 'wb'), protocol=pickle.HIGHEST_PROTOCOL)
+    def save_model(self,file_name):
+        pickle.dump(self._serialize_model(), open(file_name, 'wb'), protocol=pickle.HIGHEST_PROTOCOL)
 
         #self.components = _components
         #self.components_list = _components_list
 
-    @classmethod
-    def load_model(cls, file_name):
-        #c=cls()
-        c = pickle.load(open(file_name, "rb"))
+    @staticmethod
+    def _decode_model(c):
+        """
+        rebuilds the components of a model returned by :meth:`_serialize_model`
+        """
         for _m in c._serialized_model_list:
-
-            print(_m)
             if _m[1]=='jet':
                 j = Jet()
                 j._decode_model(_m[0])
@@ -445,5 +624,14 @@ class FitModel(Model):
                 c.add_component(j)
             else:
                 c.add_component(_m[0])
+        return c
+
+    @classmethod
+    def load_model(cls, file_name):
+        #c=cls()
+        c = pickle.load(open(file_name, "rb"))
+        for _m in c._serialized_model_list:
+            print(_m)
+        c=cls._decode_model(c)
         c.eval()
         return c
\ No newline at end of file
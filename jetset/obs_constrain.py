@@ -37,7 +37,7 @@ from .jet_model import Jet
 
 from .sed_shaper import index_array,peak_values
 
-from .output import section_separator,WorkPlace,makedir
+from .output import section_separator,WorkPlace,makedir,get_sub_dir
 
 from .utils import *
 
@@ -215,7 +215,7 @@ class ObsConstrain(object):
         if name is None:
             name=self.distr_e
             
-        out_dir='%s/obs_constrain_%s/'%(self.out_dir,name)
+        out_dir=get_sub_dir(self.out_dir,'obs_constrain_%s'%name)
         makedir(out_dir)
         
         if jet_model is None:
@@ -12,7 +12,7 @@ import shutil
 
 __author__ = "Andrea Tramacere"
 
-__all__=['clean_dir','makedir','section_separator', 'WorkPlace']
+__all__=['clean_dir','makedir','get_sub_dir','section_separator', 'WorkPlace']
 
 
 
@@ -24,8 +24,11 @@ def clean_dir(dir_name):
 
 def makedir(out_dir,clean_work_dir=True):
     """
-    creates a directory
+    creates a directory, nothing is done if `out_dir` is None
     """
+    if out_dir is None:
+        return
+
     if os.path.isdir(out_dir):
         Warning ("directory %s already existing"%(out_dir))
         if clean_work_dir==True:
@@ -42,6 +45,16 @@ def makedir(out_dir,clean_work_dir=True):
             Warning ('the directory %s has been created'%(out_dir))
 
 
+def get_sub_dir(out_dir,name):
+    """
+    returns the path of the sub directory `name` of `out_dir`,
+    or None if `out_dir` is None
+    """
+    if out_dir is None:
+        return None
+    return out_dir + '/' + name + '/'
+
+
 class WorkPlace(object):
     """
     Class to set the working place
@@ -49,12 +62,22 @@ class WorkPlace(object):
     
     Variables
     
-    :ivar out_dir: directory name (default=./) 
+    :ivar out_dir: directory name (default=./jet_wd), None for no directory
     :ivar flag: flag name (default=sed-fit-tests)
+
+    With `out_dir=None`, or with the class member ``WorkPlace.no_work_dir=True``
+    for all the work places, no directory is created: the jets and the fits
+    using the work place do not touch the filesystem, and their results are
+    only returned (as arrays, tables and :class:`.FitResults` objects).
     
     
     """
+    no_work_dir=False
+
     def __init__(self,out_dir='./jet_wd',flag='sed-fit-tests',clean=False):
+        if WorkPlace.no_work_dir==True:
+            out_dir=None
+
         self.out_dir=out_dir
         self.flag=flag
 
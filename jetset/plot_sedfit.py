@@ -7,22 +7,40 @@ __author__ = "Andrea Tramacere"
 
 #NOPYLAB=True
 
-try:
-    
-    from matplotlib import  pyplot as plt
-   
-except:
+def _import_pyplot():
     try:
-        from matplotlib import pylab as plt
+
+        from matplotlib import  pyplot as plt
 
     except:
         try:
-           import  pylab as plt
+            from matplotlib import pylab as plt
 
         except:
-            raise RuntimeError('Unable to import pylab/pyplot from matplotlib')
+            try:
+               import  pylab as plt
+
+            except:
+                raise RuntimeError('Unable to import pylab/pyplot from matplotlib')
+
+    return plt
+
+
+class _LazyPyplot(object):
+    """
+    pyplot, imported at the first attribute access, so that matplotlib is not
+    imported with the package
+    """
+    _plt = None
+
+    def __getattr__(self, name):
+        if _LazyPyplot._plt is None:
+            _LazyPyplot._plt = _import_pyplot()
+
+        return getattr(_LazyPyplot._plt, name)
+
 
-from matplotlib import gridspec
+plt = _LazyPyplot()
 
 
 from collections import namedtuple
@@ -103,6 +121,7 @@ class  PlotSED (object):
         
 
 
+        from matplotlib import gridspec
         self.gs = gridspec.GridSpec(2, 1, height_ratios=[4, 1])
             
         
@@ -591,6 +610,8 @@ class  PlotSED (object):
 
 
         if filename is None:
+            if self.out_dir is None:
+                raise RuntimeError('the plot has no working directory, please provide the file name')
             wd=self.out_dir
             filename = 'jetset_fig.png'
 
@@ -0,0 +1,392 @@
+from __future__ import absolute_import, division, print_function
+from builtins import (bytes, str, open, super, range,
+                      zip, round, input, int, pow, object, map, zip)
+
+__author__ = "Andrea Tramacere"
+
+
+import os
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+from .spectral_shapes import SED
+from .plot_sedfit import PlotSED
+from .model_parameters import ModelParameter,ModelParameterArray
+from .base_model import  Model, EvalPlan
+from . import __version__
+
+__all__=['TableModel','build_table_model']
+
+
+#files of a table model directory
+_cube_file='table_model_cube.npy'
+_meta_file='table_model.json'
+_jet_file='table_model_jet.pkl'
+
+
+def build_table_model(jet,grid,table_dir,name=None,nu_min=None,nu_max=None,nu_size=None,batch_size=100,overwrite=False):
+    """
+    Sweeps the :class:`.Jet` `jet` over the hypercube of the parameters values in
+    `grid`, and stores the observed-frame SEDs in `table_dir`, to be loaded by
+    :class:`TableModel`:
+
+    - `table_model_cube.npy`, log10(nuFnu) with shape (n_1,...,n_k,nu_size),
+      read as a memory-mapped array
+    - `table_model.json`, the frequency grid and the parameters grids and
+      metadata, and the values of the other parameters of `jet`
+    - `table_model_jet.pkl`, `jet` saved by :meth:`.Jet.save_model`
+
+    The SEDs are evaluated by :meth:`.Jet.eval_batch`, `batch_size` at a time,
+    hence in parallel with :attr:`.Jet.n_threads` > 1, the parameters that can
+    not be evaluated in batch are evaluated one by one. The parameters of `jet`
+    are not changed.
+
+    :param jet: (:class:`.Jet`)
+    :param grid: (dict) parameter name: increasing values, the order of the
+        items is the order of the axes of the cube
+    :param table_dir: (str) directory of the table model
+    :param name: (str) name of the table model, default the name of `jet`
+    :param nu_min: (float) default `jet.nu_min`
+    :param nu_max: (float) default `jet.nu_max`
+    :param nu_size: (int) size of the frequency grid, log-spaced, default `jet.nu_size`
+    :param batch_size: (int) number of SEDs evaluated in each batch
+    :param overwrite: (boolean) overwrites an existing table model in `table_dir`
+
+    :returns: (:class:`TableModel`)
+    """
+    grid=OrderedDict((par_name,np.array(vals,dtype=np.float64)) for par_name,vals in grid.items())
+    if len(grid)==0:
+        raise ValueError('the grid has no parameters')
+
+    for par_name,vals in grid.items():
+        par=jet.parameters.get_par_by_name(par_name)
+        if par is None:
+            raise ValueError('parameter %s not in the jet parameters'%par_name)
+        if vals.ndim!=1 or vals.size<2 or np.any(np.diff(vals)<=0):
+            raise ValueError('the grid of %s must have at least two increasing values'%par_name)
+        if par.val_min is not None and vals[0]<par.val_min:
+            raise ValueError("par=%s grid out of boundary=%e"%(par_name,par.val_min))
+        if par.val_max is not None and vals[-1]>par.val_max:
+            raise ValueError("par=%s grid out of boundary=%e"%(par_name,par.val_max))
+
+    if os.path.isfile(os.path.join(table_dir,_meta_file)) and overwrite==False:
+        raise RuntimeError('a table model exists in %s, use overwrite=True to replace it'%table_dir)
+
+    if not os.path.isdir(table_dir):
+        os.makedirs(table_dir)
+
+    if nu_min is None:
+        nu_min=jet.nu_min
+    if nu_max is None:
+        nu_max=jet.nu_max
+    if nu_size is None:
+        nu_size=jet.nu_size
+
+    log_nu=np.linspace(np.log10(nu_min),np.log10(nu_max),nu_size)
+
+    shape=tuple(vals.size for vals in grid.values())
+    n_points=int(np.prod(shape))
+    cube=np.lib.format.open_memmap(os.path.join(table_dir,_cube_file),mode='w+',dtype=np.float64,shape=shape+(nu_size,))
+    cube_flat=cube.reshape(n_points,nu_size)
+
+    frozen=[par.frozen for par in jet.parameters.par_array]
+    try:
+        #the free parameters of the batch are the parameters of the grid
+        for par in jet.parameters.par_array:
+            par.frozen=par.name not in grid
+        free_pars=[par for par in jet.parameters.par_array if par.frozen==False]
+        axes=[list(grid).index(par.name) for par in free_pars]
+
+        for start in range(0,n_points,batch_size):
+            stop=min(start+batch_size,n_points)
+            ids=np.unravel_index(np.arange(start,stop),shape)
+            theta=np.column_stack([grid[par.name][ids[axis]] for par,axis in zip(free_pars,axes)])
+            cube_flat[start:stop]=_eval_jet(jet,free_pars,theta,log_nu)
+    finally:
+        for par,par_frozen in zip(jet.parameters.par_array,frozen):
+            par.frozen=par_frozen
+
+    cube.flush()
+    del cube,cube_flat
+
+    meta=OrderedDict()
+    meta['name']=jet.name if name is None else name
+    meta['jet_name']=jet.name
+    meta['electron_distribution']=jet.get_electron_distribution_name()
+    meta['jetset_version']=__version__
+    meta['log_nu_min']=log_nu[0]
+    meta['log_nu_max']=log_nu[-1]
+    meta['nu_size']=nu_size
+    meta['flux_plot_lim']=jet.flux_plot_lim
+    meta['parameters']=[]
+    for par_name,vals in grid.items():
+        par=jet.parameters.get_par_by_name(par_name)
+        meta['parameters'].append(OrderedDict([('name',par.name),
+                                               ('par_type',par.par_type),
+                                               ('units',str(par.units).rstrip('*')),
+                                               ('log',par.islog),
+                                               ('val',par.val),
+                                               ('grid',vals.tolist())]))
+    meta['fixed_parameters']=OrderedDict((par.name,par.val) for par in jet.parameters.par_array if par.name not in grid)
+
+    with open(os.path.join(table_dir,_meta_file),'w') as f:
+        json.dump(meta,f,indent=1)
+
+    jet.save_model(os.path.join(table_dir,_jet_file))
+
+    return TableModel(table_dir)
+
+
+def _eval_jet(jet,free_pars,theta,log_nu):
+    """
+    log10(nuFnu) of `jet` at `log_nu`, for each row of `theta`
+    """
+    try:
+        return jet.eval_batch(theta,log_nu,loglog=True)
+    except ValueError:
+        pass
+
+    model=np.zeros((theta.shape[0],log_nu.size))
+    vals=[par.val for par in free_pars]
+    try:
+        for i in range(theta.shape[0]):
+            for par,val in zip(free_pars,theta[i]):
+                par.val=val
+            model[i]=jet.eval(nu=log_nu,fill_SED=False,get_model=True,loglog=True)
+    finally:
+        for par,val in zip(free_pars,vals):
+            par.val=val
+        jet.eval()
+
+    return model
+
+
+
+class TableModel(Model):
+    """
+    Class to handle a table model, the SEDs of a :class:`.Jet` precomputed over a
+    grid of parameters values by :func:`build_table_model`.
+    The model is interpolated in log10(nuFnu), multilinearly in the parameters,
+    and linearly in log10 of the frequency. The parameters with a positive grid,
+    and not already in log scale, are interpolated in log10 of their values.
+    The parameters have the names, types, units and scale of the :class:`.Jet`
+    parameters, and are bounded by their grids. The cube is memory-mapped,
+    hence only the SEDs bracketing the parameters values are read.
+    """
+    def __init__(self,table_dir,name=None,nu_size=100):
+        """
+        :param table_dir: (str) directory written by :func:`build_table_model`
+        :param name: (str) default the name stored in the table model
+        """
+        super(TableModel, self).__init__(nu_size=nu_size)
+
+        self.table_dir=table_dir
+
+        self.model_type='table'
+
+        self._scale='log-log'
+
+        self._load_table()
+
+        meta=self.meta
+
+        self.name=meta['name'] if name is None else name
+
+        self.SED = SED(name=self.name)
+
+        self.parameters = ModelParameterArray()
+        for par_meta in meta['parameters']:
+            grid=par_meta['grid']
+            val=par_meta['val']
+            if val is None or val<grid[0] or val>grid[-1]:
+                val=grid[len(grid)//2]
+            self.parameters.add_par(ModelParameter(name=par_meta['name'],
+                                                   par_type=par_meta['par_type'],
+                                                   units=par_meta['units'],
+                                                   log=par_meta['log'],
+                                                   val=val,
+                                                   val_min=grid[0],
+                                                   val_max=grid[-1],
+                                                   fit_range=[grid[0],grid[-1]]))
+
+        self.log_nu_table=np.linspace(meta['log_nu_min'],meta['log_nu_max'],meta['nu_size'])
+        self.nu_min=10**meta['log_nu_min']
+        self.nu_max=10**meta['log_nu_max']
+        self.flux_plot_lim=meta['flux_plot_lim']
+        self._eval_plan=None
+
+    def _load_table(self):
+        with open(os.path.join(self.table_dir,_meta_file)) as f:
+            self.meta=json.load(f,object_pairs_hook=OrderedDict)
+
+        self._cube=np.load(os.path.join(self.table_dir,_cube_file),mmap_mode='r')
+        n_axes=len(self.meta['parameters'])
+        shape=self._cube.shape
+        self._cube_flat=self._cube.reshape(int(np.prod(shape[:-1])),shape[-1])
+
+        #interpolation axes, and flat offsets and bits of the corners of a cell
+        self._axes=[]
+        for par_meta in self.meta['parameters']:
+            grid=np.array(par_meta['grid'])
+            if par_meta['log'] is False and grid[0]>0:
+                self._axes.append((True,np.log10(grid)))
+            else:
+                self._axes.append((False,grid))
+
+        strides=np.cumprod((shape[1:-1]+(1,))[::-1])[::-1]
+        self._corner_bits=np.array([[(c>>(n_axes-1-i))&1 for i in range(n_axes)] for c in range(2**n_axes)],dtype=bool)
+        self._corner_offsets=self._corner_bits.dot(strides)
+        self._strides=strides
+
+    def __getstate__(self):
+        state=super(TableModel,self).__getstate__()
+        #the cube is mapped again from the table directory
+        for k in ['meta','_cube','_cube_flat','_axes','_corner_bits','_corner_offsets','_strides','_eval_plan']:
+            state.pop(k,None)
+        return state
+
+    def __setstate__(self, state):
+        super(TableModel,self).__setstate__(state)
+        self._eval_plan=None
+        self._load_table()
+
+    def show_model(self):
+        self.parameters.show_pars()
+
+    def plot_model(self,plot_obj=None,clean=False,label=None,sed_data=None,color=None):
+        if plot_obj is None:
+            plot_obj=PlotSED(sed_data=sed_data)
+
+        if clean==True:
+            plot_obj.clean_model_lines()
+
+        if label is None:
+            label=self.name
+
+        plot_obj.add_model_plot(self.SED, line_style='-', label=label, flim=self.flux_plot_lim,color=color)
+
+        return plot_obj
+
+    def get_table_SED(self):
+        """
+        returns log10(nuFnu) on the frequency grid of the table
+        (:attr:`log_nu_table`), interpolated at the current parameters values
+        """
+        base=0
+        t=np.zeros(len(self._axes))
+        for ID,(par,(log_axis,axis)) in enumerate(zip(self.parameters.par_array,self._axes)):
+            x=np.log10(par.val) if log_axis else par.val
+            i=min(max(np.searchsorted(axis,x,side='right')-1,0),axis.size-2)
+            t[ID]=min(max((x-axis[i])/(axis[i+1]-axis[i]),0.),1.)
+            base+=i*self._strides[ID]
+
+        weights=np.where(self._corner_bits,t,1.0-t).prod(axis=1)
+        return weights.dot(self._cube_flat[base+self._corner_offsets])
+
+    def _get_table_SED_batch(self,theta):
+        """
+        as :meth:`get_table_SED`, for each row of `theta`, the values of all
+        the parameters, in the order of `parameters.par_array`
+        """
+        base=np.zeros(theta.shape[0],dtype=np.int64)
+        t=np.zeros(theta.shape)
+        for ID,(log_axis,axis) in enumerate(self._axes):
+            x=np.log10(theta[:,ID]) if log_axis else theta[:,ID]
+            i=(np.searchsorted(axis,x,side='right')-1).clip(0,axis.size-2)
+            t[:,ID]=((x-axis[i])/(axis[i+1]-axis[i])).clip(0.,1.)
+            base+=i*self._strides[ID]
+
+        #(n_samples, n_corners)
+        weights=np.where(self._corner_bits[np.newaxis],t[:,np.newaxis],1.0-t[:,np.newaxis]).prod(axis=2)
+        corners=self._cube_flat[(base[:,np.newaxis]+self._corner_offsets).ravel()]
+        return np.einsum('ij,ijk->ik',weights,corners.reshape(weights.shape+(-1,)))
+
+    def eval_batch(self,theta,nu,loglog=False):
+        """
+        evaluates the table model at the frequencies `nu` for each row of `theta`,
+        the values of the free parameters, in the order of `parameters.par_array`,
+        as :meth:`.FitModel.eval_batch`. The parameters values are not changed,
+        and the :class:`.SED` is not filled
+
+        :returns: (array) of shape (n_samples, n_nu)
+        """
+        free_pars=[par for par in self.parameters.par_array if par.frozen==False]
+        theta=np.array(theta,dtype=np.float64,ndmin=2)
+        if theta.ndim!=2 or theta.shape[1]!=len(free_pars):
+            raise ValueError('theta must have shape (n_samples, %d)'%len(free_pars))
+
+        if np.shape(nu)==():
+            nu=np.array([nu])
+
+        nu_log=np.asarray(nu) if loglog==True else np.log10(nu)
+
+        all_theta=np.tile([par.val for par in self.parameters.par_array],(theta.shape[0],1))
+        free_IDs=[ID for ID,par in enumerate(self.parameters.par_array) if par.frozen==False]
+        all_theta[:,free_IDs]=theta
+
+        model=np.zeros((theta.shape[0],nu_log.size)) + np.log10(self.flux_plot_lim)
+
+        plan=self._eval_plan
+        if plan is None or not np.array_equal(plan.x_new,nu_log):
+            plan=EvalPlan(self.log_nu_table,nu_log)
+            self._eval_plan=plan
+
+        model[:,plan.msk]=plan.interp(self._get_table_SED_batch(all_theta))
+
+        if loglog==False:
+            model=np.power(10.,model)
+
+        return model
+
+    def log_func(self,nu_log):
+
+        if np.shape(nu_log)==():
+            nu_log=np.array([nu_log])
+
+        model=np.zeros(nu_log.size) + np.log10(self.flux_plot_lim)
+
+        #the plan changes only with the frequencies
+        plan=self._eval_plan
+        if plan is None or not np.array_equal(plan.x_new,nu_log):
+            plan=EvalPlan(self.log_nu_table,nu_log)
+            self._eval_plan=plan
+
+        model[plan.msk]=plan.interp(self.get_table_SED())
+
+        return model
+
+    def lin_func(self,nu):
+        return np.power(10.,self.log_func(np.log10(nu)))
+
+    def eval(self,fill_SED=True,nu=None,get_model=False,loglog=False,label=None):
+        """
+        Evaluates the table model for the current parameters values
+        """
+        if nu is None:
+            nu=np.logspace(np.log10(self.nu_min),np.log10(self.nu_max),self.nu_size)
+            if loglog==True:
+                nu=np.log10(nu)
+
+        if loglog==False:
+            log_nu=np.log10(nu)
+            lin_nu=nu
+        else:
+            log_nu=nu
+            lin_nu=np.power(10.,log_nu)
+
+        log_model=self.log_func(log_nu)
+
+        model=np.power(10.,log_model)
+
+        if fill_SED==True:
+            self.SED.fill(nu=lin_nu, nuFnu=model)
+
+        if get_model==True:
+            if loglog==False:
+                return model
+            else:
+                return log_model
+        else:
+            return None
@@ -22,7 +22,7 @@ from .spectral_shapes import SED
 from  .plot_sedfit import PlotSED,PlotSpecComp
 
 from .model_parameters import ModelParameter,ModelParameterArray
-from .base_model import  Model
+from .base_model import  Model, EvalPlan
 
 __all__=['Template','TemplateParameter']
 
@@ -109,6 +109,8 @@ class Template(Model):
 
         self.DL=self.cosmo.get_DL_cm(self.z)
         self.flux_plot_lim=1E-30
+        self._eval_plan=None
+        self._last_x_log=None
 
 
         
@@ -166,6 +168,21 @@ class Template(Model):
     
 
 
+    def __getstate__(self):
+        state=super(Template,self).__getstate__()
+        #rebuilt from the template arrays
+        state.pop('interp_func',None)
+        state.pop('_eval_plan',None)
+        state.pop('_last_x_log',None)
+        return state
+
+    def __setstate__(self, state):
+        super(Template,self).__setstate__(state)
+        self._eval_plan=None
+        self._last_x_log=None
+        if hasattr(self,'nu_template'):
+            self.interp_func=interp1d(self.nu_template,self.nuFnu_template)
+
     def show_model(self):
         self.parameters.show_pars()
 
@@ -254,7 +271,15 @@ class Template(Model):
         
    
     def log_func(self,nu_log):
-        
+        """
+        returns the log10 of the template at the log10 frequencies `nu_log`,
+        -20 outside of the template grid.
+        The points are shifted by `nu_scale` on the template grid, hence an
+        :class:`.EvalPlan` is only valid for given frequencies and `nu_scale`:
+        it is built when the same points are interpolated twice in a row, and
+        otherwise, e.g. in a fit with `nu_scale` free, the points are
+        interpolated directly
+        """
         x_shift=getattr(self,self.x_scale)
         y_shift=getattr(self,self.y_scale)
         if shape(nu_log)==():
@@ -264,13 +289,22 @@ class Template(Model):
         x_log=nu_log-x_shift
 
         model=ones(x_log.size)*-20.0 
-            
-        msk = x_log >self.nu_template.min() 
-        msk*= x_log <self.nu_template.max()
-            
-        
-        model[msk] = self.interp_func(x_log[msk])+y_shift
-        
+
+        plan=self._eval_plan
+        if plan is not None and plan.x is self.nu_template and np.array_equal(plan.x_new,x_log):
+            model[plan.msk] = plan.interp(self.nuFnu_template)+y_shift
+
+        elif self._last_x_log is not None and np.array_equal(self._last_x_log,x_log):
+            plan=EvalPlan(self.nu_template,x_log)
+            self._eval_plan=plan
+            model[plan.msk] = plan.interp(self.nuFnu_template)+y_shift
+
+        else:
+            #as EvalPlan, the template grid is sorted
+            msk=(x_log>self.nu_template[0])*(x_log<self.nu_template[-1])
+            model[msk] = np.interp(x_log[msk],self.nu_template,self.nuFnu_template)+y_shift
+
+        self._last_x_log=np.array(x_log)
         return model
     
     
@@ -126,6 +126,33 @@ def test_build_bessel():
     Jet().eval()
 
 
+def test_shared_bessel_table():
+    from jetset.jet_model import Jet
+    j1=Jet()
+    j2=Jet()
+    j1.eval()
+    j2.eval()
+    assert j1._blob.bessel_table.this == j2._blob.bessel_table.this
+
+
+def test_shared_KN_table():
+    import pickle
+    import numpy as np
+    from jetset.jet_model import Jet
+    j1=Jet()
+    j1.set_IC_mode('tabulated')
+    j2=Jet()
+    j1.eval()
+    j2.eval()
+    assert j1._blob.KN_A_table == j2._blob.KN_A_table
+    #attached again by the first Init of a blob built from a state
+    j3=pickle.loads(pickle.dumps(j1))
+    j3.eval()
+    assert j3._blob.KN_A_table == j1._blob.KN_A_table
+    assert np.array_equal(np.array(j3.spectral_components.SSC.SED.nuFnu.value),
+                          np.array(j1.spectral_components.SSC.SED.nuFnu.value))
+
+
 def test_jet():
     from jetset.jet_model import Jet
     j=Jet()
@@ -133,6 +160,657 @@ def test_jet():
     j.energetic_report()
 
 
+def test_spectral_array_views():
+    import numpy as np
+    from jetset.jet_model import Jet, BlazarSED
+    j=Jet()
+    j.eval()
+    c=j.spectral_components.Sync
+    view=BlazarSED.get_spectral_array_view(c.nu_ptr,j._blob)
+    assert view.flags.writeable is False
+    assert view.size == j.nu_size
+    for i in (0,j.nu_size//2,j.nu_size-1):
+        assert view[i] == BlazarSED.get_spectral_array(c.nu_ptr,j._blob,i)
+    g=BlazarSED.get_elec_array_view(j.electron_distribution.gamma_ptr,j._blob)
+    assert np.array_equal(g,j.electron_distribution.gamma)
+    assert g.flags.writeable is False
+    #the views keep the blob alive
+    blob=BlazarSED.MakeBlob()
+    ptr,size=blob.nu_grid,blob.nu_grid_size
+    blob_view=BlazarSED.get_spectral_array_view(ptr,blob)
+    del blob
+    assert blob_view.size == size
+    assert blob_view[0] == BlazarSED.get_spectral_array(ptr,blob_view.base._owner,0)
+    #the electron views are bounded by the allocated size of the arrays
+    j._blob.gamma_grid_size+=10
+    try:
+        BlazarSED.get_elec_array_view(j.electron_distribution.gamma_ptr,j._blob)
+        assert False
+    except IndexError:
+        pass
+    j._blob.gamma_grid_size-=10
+    #the size is bounded by the allocation of the group of the array
+    j.nu_size=1000
+    j.nu_seed_size=100
+    j.eval()
+    for ptr,size in ((j._blob.nu_Sync,j.nu_seed_size),
+                     (j._blob.nu_SSC,j._blob.nu_IC_size),
+                     (j._blob.nu_grid,j.nu_size)):
+        assert BlazarSED.get_spectral_array_view(ptr,j._blob,size).size == size
+        try:
+            BlazarSED.get_spectral_array_view(ptr,j._blob,size+1)
+            assert False
+        except IndexError:
+            pass
+
+
+def test_spectral_arrays_allocation_error():
+    import numpy as np
+    from jetset.jet_model import Jet, BlazarSED
+    j=Jet()
+    j.eval()
+    nuFnu=np.array(j.spectral_components.Sum.SED.nuFnu.value)
+    nu_grid,size=j._blob.nu_grid,j._blob.nu_grid_size
+    j._blob.nu_grid_size=2**60
+    try:
+        BlazarSED.Run_SED(j._blob)
+        assert False
+    except MemoryError:
+        pass
+    #the old arrays are kept
+    assert j._blob.nu_grid == nu_grid
+    assert j._blob.nu_grid_size_alloc == size
+    j._blob.nu_grid_size=size
+    j.eval()
+    assert np.array_equal(np.array(j.spectral_components.Sum.SED.nuFnu.value),nuFnu)
+
+
+def test_IC_mode_tabulated():
+    import numpy as np
+    from jetset.jet_model import Jet
+    j=Jet()
+    j.eval()
+    nuFnu=np.array(j.spectral_components.SSC.SED.nuFnu.value)
+    j.set_IC_mode('tabulated')
+    assert j.get_IC_mode() == 'tabulated'
+    j.eval()
+    nuFnu_tab=np.array(j.spectral_components.SSC.SED.nuFnu.value)
+    m=nuFnu>nuFnu.max()*1E-6
+    assert np.allclose(nuFnu_tab[m],nuFnu[m],rtol=1E-4,atol=0)
+
+
+def test_n_threads():
+    import numpy as np
+    from jetset.jet_model import Jet
+    j=Jet()
+    j.add_EC_component(['EC_BLR'])
+    j.eval()
+    nuFnu=[np.array(c.SED.nuFnu.value) for c in j.spectral_components_list]
+    j.n_threads=3
+    j.eval()
+    for c,f in zip(j.spectral_components_list,nuFnu):
+        assert np.array_equal(np.array(c.SED.nuFnu.value),f)
+
+
+def test_kernel_errors_and_threads():
+    import numpy as np
+    from concurrent.futures import ThreadPoolExecutor
+    from jetset.jet_model import Jet, BlazarSED, set_str_attr
+    j=Jet()
+    j.eval()
+    c=j.spectral_components.Sync
+    try:
+        BlazarSED.get_spectral_array(c.nu_ptr,j._blob,j.nu_size)
+        assert False
+    except IndexError:
+        pass
+    set_str_attr(j._blob,'BEAMING_EXPR','wrong')
+    try:
+        BlazarSED.SetBeaming(j._blob)
+        assert False
+    except RuntimeError:
+        pass
+    set_str_attr(j._blob,'BEAMING_EXPR','delta')
+
+    jets=[Jet() for i in range(3)]
+    for ID,jet in enumerate(jets):
+        jet.parameters.B.val=0.1*(ID+1)
+        jet.eval()
+    nuFnu=[np.array(jet.spectral_components.Sum.SED.nuFnu.value) for jet in jets]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        list(executor.map(lambda jet: jet.eval(),jets))
+    for jet,f in zip(jets,nuFnu):
+        assert np.array_equal(np.array(jet.spectral_components.Sum.SED.nuFnu.value),f)
+
+
+def test_dirty_stages():
+    import numpy as np
+    from jetset.jet_model import Jet
+    j=Jet()
+    j.add_EC_component(['EC_BLR','EC_Disk'])
+    j.eval()
+    assert j._blob.dirty_stages == 0
+    for name,val in [('L_Disk',1E46),('beam_obj',20),('B',0.2),('z_cosm',0.2)]:
+        j.parameters.get_par_by_name(name).val=val
+        j.eval()
+        j_full=Jet()
+        j_full.add_EC_component(['EC_BLR','EC_Disk'])
+        for p in j.parameters.par_array:
+            j_full.parameters.get_par_by_name(p.name).val=p.val
+        j_full.eval()
+        for c,c_full in zip(j.spectral_components_list,j_full.spectral_components_list):
+            assert np.array_equal(np.array(c.SED.nuFnu.value),np.array(c_full.SED.nuFnu.value))
+
+
+def test_eval_cache():
+    import numpy as np
+    from jetset.jet_model import Jet
+    from jetset.model_manager import FitModel
+    fit_model=FitModel(jet=Jet(),name='test')
+    fit_model.set_eval_cache(max_size=2)
+    nu=np.logspace(10,25,20)
+    m=fit_model.eval(nu=nu,fill_SED=False,get_model=True)
+    m_cached=fit_model.eval(nu=nu,fill_SED=False,get_model=True)
+    assert np.array_equal(m,m_cached)
+    assert fit_model.eval_cache_info()[:2] == (1,1)
+    fit_model.set_par('B',0.2)
+    m_B=fit_model.eval(nu=nu,fill_SED=False,get_model=True)
+    assert not np.array_equal(m,m_B)
+    fit_model.set_par('B',0.1)
+    fit_model.eval(nu=nu,fill_SED=False,get_model=True)
+    assert fit_model.eval_cache_info() == (2,2,2,2)
+    #state of a model pickled before the evaluation cache
+    state=fit_model.__getstate__()
+    for k in ('_eval_cache','_eval_cache_max_size','_eval_cache_hits','_eval_cache_misses'):
+        del state[k]
+    old_model=FitModel.__new__(FitModel)
+    old_model.__setstate__(state)
+    assert np.array_equal(old_model.eval(nu=nu,fill_SED=False,get_model=True),m)
+    assert old_model.eval_cache_info() == (0,0,0,0)
+
+
+def test_eval_batch():
+    import numpy as np
+    from jetset.jet_model import Jet
+    j=Jet()
+    for p in j.parameters.par_array:
+        p.frozen=p.name not in ('B','beam_obj')
+    theta=np.array([[0.1,10],[0.2,10],[0.2,20]])
+    nu=np.logspace(10,25,20)
+    m=j.eval_batch(theta,nu)
+    assert m.shape == (3,20)
+    j.n_threads=2
+    assert np.array_equal(j.eval_batch(theta,nu),m)
+    for row,(B,beam_obj) in zip(m,theta):
+        j.parameters.B.val=B
+        j.parameters.beam_obj.val=beam_obj
+        assert np.array_equal(j.eval(nu=nu,fill_SED=False,get_model=True),row)
+
+
+def test_clone_and_pickle():
+    import pickle
+    import numpy as np
+    from jetset.jet_model import Jet
+    j=Jet()
+    j.add_EC_component(['EC_BLR'])
+    j.eval()
+    nuFnu=np.array(j.spectral_components.Sum.SED.nuFnu.value)
+    for c in (j.clone(),pickle.loads(pickle.dumps(j))):
+        assert c._blob.this != j._blob.this
+        assert c._blob.dirty_stages == 0
+        assert np.array_equal(np.array(c.spectral_components.Sum.SED.nuFnu.value),nuFnu)
+        c.parameters.B.val=0.2
+        c.eval()
+        j_full=Jet()
+        j_full.add_EC_component(['EC_BLR'])
+        j_full.parameters.B.val=0.2
+        j_full.eval()
+        assert np.array_equal(np.array(c.spectral_components.Sum.SED.nuFnu.value),
+                              np.array(j_full.spectral_components.Sum.SED.nuFnu.value))
+    j.eval()
+    assert np.array_equal(np.array(j.spectral_components.Sum.SED.nuFnu.value),nuFnu)
+
+
+def test_eval_plan():
+    import numpy as np
+    from scipy.interpolate import interp1d
+    from jetset.jet_model import Jet
+    j=Jet()
+    nu=np.logspace(8,28,50)
+    for B in (0.1,0.2):
+        j.parameters.B.val=B
+        model=j.eval(nu=nu,get_model=True,fill_SED=False)
+        plan=j._eval_plan
+        j.eval()
+        nu_sed,nuFnu_sed=j.spectral_components.Sum.get_SED_points()
+        f_interp=interp1d(np.log10(nu_sed),np.log10(nuFnu_sed))
+        assert np.array_equal(model[plan.msk],np.power(10.0,f_interp(np.log10(nu[plan.msk]))))
+    #same frequencies and grid, the plan is reused
+    j.eval(nu=nu,get_model=True,fill_SED=False)
+    assert j._eval_plan is plan
+
+
+def test_template_eval_plan():
+    import numpy as np
+    from scipy.interpolate import interp1d
+    from jetset.template_model import Template
+    from jetset.cosmo_tools import Cosmo
+    t=Template('host-galaxy',Cosmo())
+    nu_log=np.linspace(12,16,50)
+    f_interp=interp1d(t.nu_template,t.nuFnu_template)
+    #nu_scale free, the points are interpolated directly
+    for nu_scale in (0.0,0.1,-0.2):
+        t.parameters.nu_scale.val=nu_scale
+        model=t.eval(nu=nu_log,loglog=True,get_model=True,fill_SED=False)
+        x_log=nu_log-nu_scale
+        msk=(x_log>t.nu_template.min())*(x_log<t.nu_template.max())
+        assert np.array_equal(model[msk],f_interp(x_log[msk])+t.nuFnu_p_host)
+        assert np.all(model[~msk]==-20)
+    assert t._eval_plan is None
+    #same frequencies and nu_scale, the plan is built and then reused
+    t.eval(nu=nu_log,loglog=True,get_model=True,fill_SED=False)
+    plan=t._eval_plan
+    assert plan is not None
+    assert np.array_equal(t.eval(nu=nu_log,loglog=True,get_model=True,fill_SED=False),model)
+    assert t._eval_plan is plan
+
+
+def test_no_work_dir():
+    import os
+    from jetset.jet_model import Jet
+    from jetset.output import WorkPlace
+    wp=WorkPlace(out_dir=None)
+    assert wp.out_dir is None
+    j=Jet(name='no_wd_test',jet_workplace=wp)
+    assert j.get_path() is None
+    assert j._blob.WRITE_TO_FILE==0
+    j.eval()
+    assert os.path.isdir('./jet_wd/no_wd_test_jet_prod/') is False
+
+
+def test_IC_adaptive_grid():
+    import numpy as np
+    from jetset.jet_model import Jet
+    j=Jet(electron_distribution='lppl',beaming_expr='delta')
+    j.add_EC_component(['EC_BLR','EC_DT'])
+    j.eval()
+    nuFnu=j.spectral_components.Sum.SED.nuFnu.value.copy()
+    j.IC_adaptive_tol=0.01
+    assert j.IC_adaptive_tol==0.01
+    assert j._blob.IC_adaptive_tol==0.01
+    j.eval()
+    nuFnu_ad=j.spectral_components.Sum.SED.nuFnu.value
+    msk=(nuFnu>nuFnu.max()*1E-4)*(nuFnu_ad>nuFnu_ad.max()*1E-4)
+    assert np.abs(np.log10(nuFnu_ad[msk]/nuFnu[msk])).max()<0.05
+
+
+def test_autotune_grids():
+    from jetset.jet_model import Jet
+    j=Jet()
+    report=j.autotune_grids(target_rel_error=0.1,grids=['IC_nu_size'],sizes={'IC_nu_size':[25,50,100]},apply=False,verbose=False)
+    assert j.IC_nu_size==50
+    selected=report[report['selected']]
+    assert len(selected)==1
+    assert selected['max rel. err.'][0]<=0.1
+    j.autotune_grids(target_rel_error=0.1,grids=['IC_nu_size'],sizes={'IC_nu_size':[25,50,100]},verbose=False)
+    assert j.IC_nu_size==selected['IC_nu_size'][0]
+
+
+def test_eval_profile():
+    import numpy as np
+    from jetset.jet_model import Jet
+    from jetset.model_manager import FitModel
+    j=Jet()
+    j.do_profile=True
+    j.eval()
+    profile=j.last_eval_profile
+    assert profile['calls']['spettro_compton']==1
+    assert profile['time']['spettro_compton']>0
+    assert profile['n_IC_integrand']>0 and profile['n_Sync_integrand']>0
+    fit_model=FitModel(jet=j,name='test')
+    fit_model.set_eval_cache(max_size=2)
+    nu=np.logspace(10,25,20)
+    j._start_eval_profile_sum()
+    fit_model.eval(nu=nu,fill_SED=False,get_model=True)
+    fit_model.eval(nu=nu,fill_SED=False,get_model=True)
+    profile_sum=j._stop_eval_profile_sum()
+    assert profile_sum['n_eval']==1
+    assert profile_sum['calls']==j.last_eval_profile['calls']
+
+
+def test_batch_jacobian():
+    import numpy as np
+    from jetset.jet_model import Jet
+    from jetset.model_manager import FitModel
+    from jetset.minimizer import ModelMinimizer
+    j=Jet()
+    for p in j.parameters.par_array:
+        p.frozen=p.name not in ('N','B','beam_obj')
+    fit_model=FitModel(jet=j,name='test')
+    fit_par=[p for p in fit_model.parameters.par_array if p.frozen==False]
+    nu=np.logspace(10,25,20)
+    model=fit_model.eval(nu=nu,fill_SED=False,get_model=True)
+    args=(fit_par,nu,model*1.1,model*0.1,fit_model,False,np.zeros(nu.size,dtype=bool),False,False,True)
+    minimizer=ModelMinimizer('lsb').minimizer
+    minimizer.calls=0
+    minimizer._par_check=None
+    p0=np.array([p.val for p in fit_par])
+    jac=minimizer.jacobian_Fit(p0,*args)
+    assert [p.val for p in fit_par]==p0.tolist()
+    res=minimizer.residuals_Fit(p0,*args)
+    assert np.array_equal(minimizer.jacobian_Fit(p0,*args),jac)
+    for pi in range(len(fit_par)):
+        p1=p0.copy()
+        p1[pi]+=minimizer.jac_step*p0[pi]
+        assert np.allclose(jac[:,pi],(minimizer.residuals_Fit(p1,*args)-res)/(p1[pi]-p0[pi]))
+
+
+def test_batch_jacobian_fit():
+    import numpy as np
+    from jetset.jet_model import Jet
+    from jetset.data_loader import ObsData, Data
+    from jetset.loglog_poly_model import LogParabolaEp
+    from jetset.model_manager import FitModel
+    from jetset.minimizer import ModelMinimizer
+    #b is fitted at its upper bound
+    nu=np.logspace(12,18,30)
+    lp=LogParabolaEp()
+    lp.parameters.Ep.val=15
+    lp.parameters.Sp.val=-11
+    lp.parameters.b.val=-0.2
+    nuFnu=lp.eval(nu=nu,fill_SED=False,get_model=True)
+    data=Data(n_rows=nu.size,meta_data={'z':0.1,'restframe':'obs','data_scale':'lin-lin'})
+    data.table['x']=nu
+    data.table['y']=nuFnu*(1+0.1*np.random.RandomState(1).standard_normal(nu.size))
+    data.table['dy']=0.1*nuFnu
+    sed_data=ObsData(data_table=data)
+    fit_model=FitModel(loglog_poly=lp,name='test')
+    lp.parameters.b.fit_range=[-1,-0.199]
+    for minimizer in ('lsb','ls'):
+        best_fit={}
+        for jacobian in (None,'batch'):
+            lp.parameters.Ep.val=14.8
+            lp.parameters.Sp.val=-11.1
+            lp.parameters.b.val=-0.25
+            model_minimizer=ModelMinimizer(minimizer)
+            model_minimizer.fit(fit_model,sed_data,1E11,1E19,silent=True,jacobian=jacobian)
+            best_fit[jacobian]=np.array([p.best_fit_val for p in model_minimizer.fit_par_free])
+        assert np.allclose(best_fit['batch'],best_fit[None],rtol=1E-5,atol=0)
+        assert np.isclose(best_fit['batch'][0],-0.199,rtol=1E-5,atol=0)
+
+    #Jet model, B with an upper bound close to the best fit. The reference is the ls
+    #3-point default, the lsb default step is too small for the numerical noise of the model
+    j=Jet()
+    nu=np.logspace(9,27,40)
+    nuFnu=j.eval(nu=nu,fill_SED=False,get_model=True)
+    msk=nuFnu>1E-20
+    data=Data(n_rows=msk.sum(),meta_data={'z':j.parameters.z_cosm.val,'restframe':'obs','data_scale':'lin-lin'})
+    data.table['x']=nu[msk]
+    data.table['y']=nuFnu[msk]*(1+0.05*np.random.RandomState(2).standard_normal(msk.sum()))
+    data.table['dy']=0.1*nuFnu[msk]
+    sed_data=ObsData(data_table=data)
+    for p in j.parameters.par_array:
+        p.frozen=p.name not in ('B','N','beam_obj')
+    j.parameters.B.fit_range=[0.05,0.105]
+    fit_model=FitModel(jet=j,name='test')
+    #as set by the fit, so that all the fits use the same grid
+    fit_model.set_nu_grid(nu_min=1E8,nu_max=1E28)
+    best_fit={}
+    for minimizer,jacobian in (('ls',None),('ls','batch'),('lsb','batch')):
+        j.parameters.B.val=0.104
+        j.parameters.N.val=120
+        j.parameters.beam_obj.val=9.5
+        model_minimizer=ModelMinimizer(minimizer)
+        model_minimizer.fit(fit_model,sed_data,1E8,1E28,silent=True,jacobian=jacobian)
+        best_fit[(minimizer,jacobian)]=np.array([p.best_fit_val for p in model_minimizer.fit_par_free])
+    for key in (('ls','batch'),('lsb','batch')):
+        assert np.allclose(best_fit[key],best_fit[('ls',None)],rtol=1E-3,atol=0)
+
+
+def test_table_model(tmp_path):
+    import pickle
+    import numpy as np
+    from jetset.jet_model import Jet
+    from jetset.table_model import TableModel,build_table_model
+    from jetset.model_manager import FitModel
+    j=Jet()
+    table_dir=str(tmp_path)
+    table_model=build_table_model(j,{'B':[0.05,0.1,0.2],'gmax':[1E5,1E6]},table_dir,nu_size=80,batch_size=4)
+    assert table_model._cube.shape == (3,2,80)
+    assert table_model.parameters.B.val_max == 0.2
+    #on the grid nodes the table is the SED of the jet
+    table_model.parameters.B.val=0.1
+    table_model.parameters.gmax.val=1E6
+    assert np.allclose(table_model.get_table_SED(),j.eval(nu=table_model.log_nu_table,fill_SED=False,get_model=True,loglog=True))
+    fit_model=FitModel(table_model=table_model,name='test')
+    nu=np.logspace(10,25,20)
+    theta=np.array([[0.07,3E5],[0.1,1E6],[0.15,2E5]])
+    m=fit_model.eval_batch(theta,nu)
+    for row,(B,gmax) in zip(m,theta):
+        table_model.parameters.B.val=B
+        table_model.parameters.gmax.val=gmax
+        assert np.allclose(fit_model.eval(nu=nu,fill_SED=False,get_model=True),row)
+    c=pickle.loads(pickle.dumps(table_model))
+    assert np.array_equal(c.eval(nu=nu,fill_SED=False,get_model=True),table_model.eval(nu=nu,fill_SED=False,get_model=True))
+    assert np.array_equal(TableModel(table_dir).log_nu_table,table_model.log_nu_table)
+
+
+def test_mcmc_emulator():
+    import numpy as np
+    from jetset.data_loader import ObsData, Data
+    from jetset.loglog_poly_model import LogParabolaEp
+    from jetset.model_manager import FitModel
+    from jetset.minimizer import ModelMinimizer
+    from jetset.mcmc import McmcSampler
+    nu=np.logspace(12,18,30)
+    lp=LogParabolaEp()
+    lp.parameters.Ep.val=15
+    lp.parameters.Sp.val=-11
+    lp.parameters.b.val=-0.2
+    nuFnu=lp.eval(nu=nu,fill_SED=False,get_model=True)
+    data=Data(n_rows=nu.size,meta_data={'z':0.1,'restframe':'obs','data_scale':'lin-lin'})
+    data.table['x']=nu
+    data.table['y']=nuFnu*(1+0.1*np.random.RandomState(1).standard_normal(nu.size))
+    data.table['dy']=0.1*nuFnu
+    sed_data=ObsData(data_table=data)
+    fit_model=FitModel(loglog_poly=lp,name='test')
+    model_minimizer=ModelMinimizer('lsb')
+    model_minimizer.fit(fit_model,sed_data,1E11,1E19,silent=True)
+    samples=[]
+    for emulator in (False,True):
+        np.random.seed(1)
+        mcmc=McmcSampler(model_minimizer)
+        mcmc.run_sampler(nwalkers=20,steps=150,burnin=50,threads=None,emulator=emulator)
+        samples.append(mcmc.samples)
+    assert mcmc.calls_exact < 20*150
+    assert np.all(np.abs(samples[1].mean(axis=0)-samples[0].mean(axis=0)) < samples[0].std(axis=0))
+
+
+def test_mcmc_n_workers():
+    import numpy as np
+    from jetset.jet_model import Jet
+    from jetset.data_loader import ObsData, Data
+    from jetset.model_manager import FitModel
+    from jetset.minimizer import ModelMinimizer
+    from jetset.mcmc import McmcSampler
+    j=Jet()
+    nu=np.logspace(9,27,40)
+    nuFnu=j.eval(nu=nu,fill_SED=False,get_model=True)
+    msk=nuFnu>1E-20
+    data=Data(n_rows=msk.sum(),meta_data={'z':j.parameters.z_cosm.val,'restframe':'obs','data_scale':'lin-lin'})
+    data.table['x']=nu[msk]
+    data.table['y']=nuFnu[msk]
+    data.table['dy']=0.1*nuFnu[msk]
+    sed_data=ObsData(data_table=data)
+    for p in j.parameters.par_array:
+        p.frozen=p.name not in ('B','N')
+    fit_model=FitModel(jet=j,name='test')
+    model_minimizer=ModelMinimizer('lsb')
+    model_minimizer.fit(fit_model,sed_data,1E8,1E28,silent=True)
+    chains=[]
+    for n_workers in (None,2):
+        np.random.seed(1)
+        mcmc=McmcSampler(model_minimizer)
+        mcmc.run_sampler(nwalkers=8,steps=10,burnin=2,threads=None,n_workers=n_workers)
+        assert mcmc.sampler.chain.shape == (8,10,2)
+        assert mcmc.calls == 8*11
+        chains.append((mcmc.sampler.chain,mcmc.sampler.lnprobability))
+    assert np.all(np.isfinite(chains[1][1]))
+    assert np.allclose(chains[1][0],chains[0][0])
+    assert np.allclose(chains[1][1],chains[0][1])
+
+
+def test_mcmc_log_like():
+    import numpy as np
+    from jetset.data_loader import ObsData, Data
+    from jetset.loglog_poly_model import LogParabolaEp
+    from jetset.model_manager import FitModel
+    from jetset.minimizer import ModelMinimizer, log_like
+    from jetset.mcmc import McmcSampler, _WorkerLogProb
+    nu=np.logspace(12,18,30)
+    lp=LogParabolaEp()
+    lp.parameters.Ep.val=15
+    lp.parameters.Sp.val=-11
+    lp.parameters.b.val=-0.2
+    nuFnu=lp.eval(nu=nu,fill_SED=False,get_model=True)
+    data=Data(n_rows=nu.size,meta_data={'z':0.1,'restframe':'obs','data_scale':'lin-lin'})
+    data.table['x']=nu
+    data.table['y']=nuFnu*(1+0.1*np.random.RandomState(1).standard_normal(nu.size))
+    data.table['dy']=0.1*nuFnu
+    sed_data=ObsData(data_table=data)
+    fit_model=FitModel(loglog_poly=lp,name='test')
+    model_minimizer=ModelMinimizer('lsb')
+    model_minimizer.fit(fit_model,sed_data,1E11,1E19,silent=True)
+    mcmc=McmcSampler(model_minimizer)
+    mcmc.run_sampler(nwalkers=6,steps=2,burnin=0,threads=None)
+    best_fit=np.array([p.best_fit_val for p in model_minimizer.fit_par_free])
+    for theta in (best_fit,best_fit+0.01):
+        for p,v in zip(model_minimizer.fit_par_free,theta):
+            p.set(val=v)
+        model=fit_model.eval(nu=model_minimizer.nu_fit,fill_SED=False,get_model=True)
+        chisq=log_like(model_minimizer.nuFnu_fit,model,model_minimizer.err_nuFnu_fit,model_minimizer.UL)[0]
+        #compiled objective, model evaluation, and worker process
+        assert np.isclose(mcmc.log_like(theta),-0.5*chisq)
+        objective=model_minimizer.objective
+        model_minimizer.objective=None
+        assert np.isclose(mcmc.log_like(theta),-0.5*chisq)
+        #an objective compiled for other data is not used
+        model_minimizer.objective=fit_model.compile_objective(sed_data,1E13,1E15)
+        assert np.isclose(mcmc.log_like(theta),-0.5*chisq)
+        model_minimizer.objective=objective
+        worker_log_prob=_WorkerLogProb(mcmc._get_worker_state())
+        assert np.isclose(worker_log_prob(theta),mcmc.log_prob(theta))
+    assert mcmc.log_prob(best_fit) > mcmc.log_prob(best_fit+0.01)
+
+
+def test_resolution_schedule():
+    import numpy as np
+    from jetset.jet_model import Jet
+    from jetset.data_loader import ObsData, Data
+    from jetset.model_manager import FitModel
+    from jetset.minimizer import ModelMinimizer
+    j=Jet()
+    nu=np.logspace(9,27,40)
+    nuFnu=j.eval(nu=nu,fill_SED=False,get_model=True)
+    msk=nuFnu>1E-20
+    data=Data(n_rows=msk.sum(),meta_data={'z':j.parameters.z_cosm.val,'restframe':'obs','data_scale':'lin-lin'})
+    data.table['x']=nu[msk]
+    data.table['y']=nuFnu[msk]
+    data.table['dy']=0.1*nuFnu[msk]
+    sed_data=ObsData(data_table=data)
+    for p in j.parameters.par_array:
+        p.frozen=p.name not in ('B','N')
+    j.parameters.B.val=0.2
+    sizes=(j.gamma_grid_size,j.nu_seed_size,j.IC_nu_size)
+    fit_model=FitModel(jet=j,name='test')
+    model_minimizer=ModelMinimizer('lsb')
+    schedule=[{'gamma_grid_size':0.25,'nu_seed_size':30,'IC_nu_size':30}]
+    fit_results=model_minimizer.fit(fit_model,sed_data,1E8,1E28,silent=True,resolution_schedule=schedule)
+    assert (j.gamma_grid_size,j.nu_seed_size,j.IC_nu_size) == sizes
+    assert len(fit_results.stages) == 2
+    assert fit_results.stages[0].sizes[j.name]['nu_seed_size'] == 30
+    assert fit_results.stages[0].sizes[j.name]['gamma_grid_size'] == sizes[0]//4
+    assert fit_results.stages[1].sizes[j.name]['IC_nu_size'] == sizes[2]
+    assert fit_results.calls == sum(stage.calls for stage in fit_results.stages)
+    assert fit_results.chisq == fit_results.stages[1].chisq
+
+
+def test_compile_objective():
+    import numpy as np
+    import pytest
+    from jetset.jet_model import Jet
+    from jetset.loglog_poly_model import LogParabolaEp
+    from jetset.data_loader import ObsData, Data
+    from jetset.model_manager import FitModel
+    from jetset.minimizer import log_like, _get_par_setter
+    j=Jet()
+    nu=np.logspace(9,27,40)
+    nuFnu=j.eval(nu=nu,fill_SED=False,get_model=True)
+    msk=nuFnu>1E-20
+    data=Data(n_rows=msk.sum(),meta_data={'z':j.parameters.z_cosm.val,'restframe':'obs','data_scale':'lin-lin'})
+    data.table['x']=nu[msk]
+    data.table['y']=nuFnu[msk]
+    data.table['dy']=0.1*nuFnu[msk]
+    data.table['UL'][0]=True
+    sed_data=ObsData(data_table=data)
+    for p in j.parameters.par_array:
+        p.frozen=p.name not in ('B','N')
+    fit_model=FitModel(jet=j,name='test')
+    for loglog in (False,True):
+        objective=fit_model.compile_objective(sed_data,1E8,1E28,loglog=loglog,use_UL=True)
+        theta=[dict(B=0.2,N=50)[par.name] for par in objective.fit_par]
+        res=objective(theta).copy()
+        assert j.parameters.B.val == 0.2
+        assert j.parameters.N.val == 50
+        assert j.parameters.N.val_last_call == 50
+        model=fit_model.eval(nu=objective.nu_data,fill_SED=False,get_model=True,loglog=loglog)
+        data_err=np.array(objective.err_nuFnu_data)
+        res_sum,res_check,_=log_like(np.array(objective.nuFnu_data),model,data_err,objective._UL,use_UL=True)
+        assert np.allclose(res,res_check)
+        assert np.isclose(objective.chisq(theta),res_sum)
+        assert np.isclose(objective.log_like(theta),-0.5*res_sum)
+    with pytest.raises(RuntimeError):
+        objective([-1,-1])
+    #the allowed values are checked
+    b=LogParabolaEp().parameters.b
+    b.allowed_values=[-0.2,-0.1]
+    setter=_get_par_setter(b)
+    setter(-0.1)
+    assert b.val == -0.1 and b.val_last_call == -0.1
+    with pytest.raises(RuntimeError):
+        setter(-0.3)
+    assert b.val == -0.1
+
+
+def test_cosmo_DL_cache():
+    import pickle
+    import numpy as np
+    from jetset.cosmo_tools import Cosmo
+    c=Cosmo()
+    z=np.logspace(-3,0.5,50)
+    DL=c._eval_DL_cm(z)
+    assert c.get_DL_cm(0.1) == c._eval_DL_cm(0.1)
+    assert 0.1 in c._DL_cache
+    c.build_DL_table(z_min=1E-3,z_max=5,size=1000)
+    assert len(c._DL_cache) == 0
+    assert np.allclose(c.get_DL_cm(z),DL,rtol=1E-5,atol=0)
+    assert np.allclose([c.get_DL_cm(_z) for _z in z],DL,rtol=1E-5,atol=0)
+    assert c.get_DL_cm(10.) == c._eval_DL_cm(10.)
+    c=pickle.loads(pickle.dumps(c))
+    assert np.isclose(c.get_DL_cm(0.1),c._eval_DL_cm(0.1),rtol=1E-5,atol=0)
+    assert Cosmo(DL_cm=1E27).get_DL_cm(0.1) == 1E27
+
+
+def test_lazy_imports():
+    import subprocess
+    code="import sys,jetset;" \
+         "assert 'jetset.jet_model' not in sys.modules;" \
+         "jetset.model_manager;" \
+         "print([m for m in ('matplotlib','iminuit','emcee','corner','scipy.stats') if m in sys.modules])"
+    out=subprocess.check_output([sys.executable,'-c',code],universal_newlines=True)
+    assert out.split('\n')[-2] == '[]'
+
+
 def test_full():
     from jetset.plot_sedfit import plt
     plt.ioff()
@@ -10,7 +10,7 @@ __author__ = "Andrea Tramacere"
 
 import warnings
 
-from numpy import array, take, eye, triu, transpose, dot
+from numpy import array, take, eye, triu, transpose, dot, newaxis
 from numpy import empty_like, sqrt, cos, sin, arcsin
 from scipy.optimize.minpack import _check_func
 from scipy.optimize import _minpack, leastsq
@@ -282,10 +282,15 @@ def leastsqbound(func, x0, args=(), bounds=None, Dfun=None, full_output=0,
         if (maxfev == 0):
             maxfev = 100 * (n + 1)
 
-        def wDfun(x, *args):  # wrapped Dfun
-            return Dfun(i2e(x), *args)
+        # wrapped Dfun, with the derivatives with respect to the internal
+        # parameters
+        def wDfun(x, *args):
+            grad = _internal2external_grad(x, bounds)
+            if col_deriv:
+                return Dfun(i2e(x), *args) * grad[:, newaxis]
+            return Dfun(i2e(x), *args) * grad
 
-        retval = _minpack._lmder(func, wDfun, i0, args, full_output,
+        retval = _minpack._lmder(wfunc, wDfun, i0, args, full_output,
                 col_deriv, ftol, xtol, gtol, maxfev, factor, diag)
 
     errors = {0: ["Improper input parameters.", TypeError],
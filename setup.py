@@ -125,12 +125,29 @@ if  os.getenv('USE_PIP')=='TRUE':
 else:
     install_req=None
 
+def get_openmp_flags():
+    #OpenMP is used for the parallel frequency loops of jetkernel
+    #enabled by default on linux, it can be forced with JETSETOPENMP=TRUE/FALSE
+    use_openmp=os.getenv('JETSETOPENMP')
+    if use_openmp is None:
+        use_openmp=sys.platform.startswith('linux')
+    else:
+        use_openmp=use_openmp=='TRUE'
+    if use_openmp:
+        return ['-fopenmp'],['-fopenmp']
+    else:
+        return [],[]
+
+openmp_compile_args,openmp_link_args=get_openmp_flags()
+
 src_files=['jetkernel/jetkernel.i']
 src_files.extend(glob.glob ('jetkernel_src/src/*.c'))
 _module=Extension('jetkernel/_jetkernel',
                   sources=src_files,
                   #extra_compile_options='-fPIC  -v  -c -m64 -I',
                   #extra_link_options='-suppress',
+                  extra_compile_args=openmp_compile_args,
+                  extra_link_args=openmp_link_args,
                   swig_opts=['-v',],
                   include_dirs=['jetkernel_src/include'])
 